@@ -1,11 +1,42 @@
+import os
+import time
+import threading
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, Depends
 from pydantic import BaseModel
 from typing import List, Optional
 import pandas as pd
 from pipelines.utils import get_db_engine
+from ml.features.online_store import OnlineFeatureStore, FEATURE_COLUMNS
+from ml.elasticity.catalog import ElasticityCatalog
+from ml.simulation.joint_simulator import SimulatorCache
 from sqlalchemy import text
 
-app = FastAPI(title="PIRO Pricing API", version="1.0.0")
+# In-memory snapshots are checked for a new version this often (seconds)
+REFRESH_INTERVAL = int(os.getenv("PIRO_API_REFRESH_SECONDS", "30"))
+
+feature_store = OnlineFeatureStore(min_refresh_interval=REFRESH_INTERVAL)
+elasticity_catalog = ElasticityCatalog(min_refresh_interval=REFRESH_INTERVAL)
+joint_simulators = SimulatorCache(min_refresh_interval=REFRESH_INTERVAL)
+
+def _refresh_loop():
+    while True:
+        try:
+            feature_store.refresh()
+        except Exception as e:
+            print(f"Online feature store refresh failed: {e}")
+        try:
+            elasticity_catalog.refresh()
+        except Exception as e:
+            print(f"Elasticity catalog refresh failed: {e}")
+        time.sleep(REFRESH_INTERVAL)
+
+@asynccontextmanager
+async def lifespan(app):
+    threading.Thread(target=_refresh_loop, daemon=True).start()
+    yield
+
+app = FastAPI(title="PIRO Pricing API", version="1.0.0", lifespan=lifespan)
 
 # Database Dependency
 def get_engine():
@@ -22,6 +53,38 @@ class ElasticityResponse(BaseModel):
     ci_lower: float
     ci_upper: float
     promo_lift: float
+    model_version: Optional[str] = None
+
+class FeatureKey(BaseModel):
+    store_id: int
+    upc_id: int
+
+class FeatureResponse(BaseModel):
+    store_id: int
+    upc_id: int
+    week_id: int
+    feat_log_price: float
+    feat_avg_price_4w: Optional[float]
+    feat_lag_price_1w: Optional[float]
+    feat_competitor_price_ratio: float
+    feat_month_of_year: float
+    log_sales: float
+    sales_units: float
+
+class JointSimulationRequest(BaseModel):
+    category_id: str
+    upc_ids: List[int]
+    candidates: List[List[float]] # one price per upc_id in each candidate
+    per_upc: bool = False
+
+class JointSimulationResponse(BaseModel):
+    revenue: List[float]
+    profit: List[float]
+    revenue_index: List[float]
+    profit_index: List[float]
+    best_candidate: int # highest profit
+    upc_ids: Optional[List[int]] = None # responding UPCs, if per_upc
+    quantity_index: Optional[List[List[float]]] = None
 
 class OptimizationResponse(BaseModel):
     upc_id: int
@@ -35,26 +98,55 @@ def health_check():
     return {"status": "ok", "service": "piro-pricing-engine"}
 
 @app.post("/v1/elasticity/lookup", response_model=ElasticityResponse)
-def lookup_elasticity(req: ElasticityRequest, engine=Depends(get_engine)):
-    query = text("""
-        SELECT upc_id, elasticity, ci_lower, ci_upper, promo_lift
-        FROM elasticity_catalog
-        WHERE category_id = :cat AND upc_id = :upc
-    """)
-    
-    with engine.connect() as conn:
-        result = conn.execute(query, {"cat": req.category_id, "upc": req.upc_id}).fetchone()
-        
-    if not result:
+def lookup_elasticity(req: ElasticityRequest):
+    if not elasticity_catalog.loaded:
+        raise HTTPException(status_code=503, detail="Elasticity catalog is still loading")
+    row = elasticity_catalog.get(req.category_id, req.upc_id)
+    if row is None:
         raise HTTPException(status_code=404, detail="Elasticity not found for UPC")
-        
-    return ElasticityResponse(
-        upc_id=result[0],
-        elasticity=result[1],
-        ci_lower=result[2],
-        ci_upper=result[3],
-        promo_lift=result[4]
-    )
+    return ElasticityResponse(upc_id=req.upc_id, **row)
+
+def _nan_to_none(features):
+    return {k: (None if v != v else v) for k, v in features.items()}
+
+def _require_feature_store():
+    if not feature_store.loaded:
+        raise HTTPException(status_code=503, detail="Online feature store is still loading")
+
+@app.get("/v1/features/{store_id}/{upc_id}", response_model=FeatureResponse)
+def get_online_features(store_id: int, upc_id: int):
+    _require_feature_store()
+    features = feature_store.get(store_id, upc_id)
+    if features is None:
+        raise HTTPException(status_code=404, detail="No features for (store_id, upc_id)")
+    return FeatureResponse(store_id=store_id, upc_id=upc_id, **_nan_to_none(features))
+
+@app.post("/v1/features/batch", response_model=List[Optional[FeatureResponse]])
+def get_online_features_batch(keys: List[FeatureKey]):
+    _require_feature_store()
+    values, found, week_id = feature_store.get_batch([k.store_id for k in keys], [k.upc_id for k in keys],
+                                                     with_week=True)
+    out = []
+    for k, row, hit, week in zip(keys, values.tolist(), found.tolist(), week_id.tolist()):
+        features = dict(zip(FEATURE_COLUMNS, row), week_id=week)
+        out.append(FeatureResponse(store_id=k.store_id, upc_id=k.upc_id, **_nan_to_none(features)) if hit else None)
+    return out
+
+@app.post("/v1/simulate/joint", response_model=JointSimulationResponse)
+def simulate_joint(req: JointSimulationRequest):
+    try:
+        simulator = joint_simulators.get(req.category_id)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    try:
+        res = simulator.simulate(req.candidates, req.upc_ids, per_upc=req.per_upc)
+    except (KeyError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    out = {k: res[k].tolist() for k in ('revenue', 'profit', 'revenue_index', 'profit_index')}
+    if req.per_upc:
+        out['upc_ids'] = simulator.upc_ids.tolist()
+        out['quantity_index'] = res['quantity_index'].tolist()
+    return JointSimulationResponse(best_candidate=int(res['profit'].argmax()), **out)
 
 @app.get("/v1/optimize/{category_id}", response_model=List[OptimizationResponse])
 def get_optimization_results(category_id: str, engine=Depends(get_engine)):
@@ -0,0 +1,101 @@
+"""
+pd.read_sql vs the Arrow fetch paths (pipelines/arrow_fetch.py) on a large
+synthetic panel shaped like elasticity_ready_panel.
+
+    python benchmarks/bench_fetch.py --rows 5000000
+
+Each method runs in a fresh process so its peak RSS is its own.
+"""
+import os
+import json
+import time
+import argparse
+import multiprocessing as mp
+import pandas as pd
+from sqlalchemy import text
+from pipelines.utils import get_db_engine, peak_rss_mb
+from pipelines import arrow_fetch
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+TABLE = "bench_fetch_panel"
+QUERY = f"select * from {TABLE}"
+
+def create_panel(engine, rows):
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+        conn.execute(text(f"""
+            CREATE UNLOGGED TABLE {TABLE} AS
+            SELECT
+                (i % 90)::int + 2 AS store_id,
+                (1000000 + (i / 90) % 5000)::bigint AS upc_id,
+                (i / 450000)::int + 1 AS week_id,
+                'sdr'::text AS category_id,
+                (date '1989-09-14' + ((i / 450000)::int * 7)) AS start_date,
+                ln(1.0 + random() * 4)::float8 AS log_price,
+                ln(1.0 + random() * 50)::float8 AS log_sales,
+                (random() < 0.2)::int AS is_promo,
+                (1.0 + random() * 4)::float8 AS lag_price_1w_clean,
+                (1.0 + random() * 4)::float8 AS max_price_8w,
+                (random() * 0.3)::float8 AS promo_depth
+            FROM generate_series(0, :n - 1) AS i
+        """), {"n": rows})
+        conn.execute(text(f"ANALYZE {TABLE}"))
+
+def _run(method):
+    engine = get_db_engine()
+    start = time.perf_counter()
+    if method == "read_sql":
+        df = pd.read_sql(QUERY, engine)
+    else:
+        df = arrow_fetch.fetch_frame(QUERY, engine, backend=method)
+    elapsed = time.perf_counter() - start
+    return {
+        "seconds": elapsed,
+        "rows": len(df),
+        "peak_rss_mb": peak_rss_mb(),
+        "checksum": float(df["log_price"].sum() + df["log_sales"].sum()),
+    }
+
+def run_benchmark(rows, methods, keep=False):
+    engine = get_db_engine()
+    print(f"Creating {TABLE} with {rows:,} rows...")
+    create_panel(engine, rows)
+    results = {}
+    ctx = mp.get_context("spawn")
+    try:
+        for method in methods:
+            with ctx.Pool(1) as pool:
+                res = pool.apply(_run, (method,))
+            results[method] = res
+            print(f"{method:<10} {res['seconds']:>8.2f} s  {res['rows'] / res['seconds']:>12,.0f} rows/s  "
+                  f"peak RSS {res['peak_rss_mb']:>8.0f} MB")
+    finally:
+        if not keep:
+            with engine.begin() as conn:
+                conn.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+
+    checksums = {round(r["checksum"], 3) for r in results.values()}
+    if len(checksums) > 1:
+        print(f"WARNING: methods disagree on the data: {checksums}")
+    base = results.get("read_sql")
+    if base:
+        for method, res in results.items():
+            if method != "read_sql":
+                print(f"{method}: {base['seconds'] / res['seconds']:.1f}x faster than read_sql")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=5_000_000)
+    parser.add_argument("--methods", nargs="+", default=None,
+                        help="Subset of read_sql, copy, adbc (default: all available)")
+    parser.add_argument("--keep", action="store_true", help=f"Keep {TABLE} after the run")
+    parser.add_argument("--label", default="latest")
+    args = parser.parse_args()
+
+    methods = args.methods or ["read_sql", "copy"] + (["adbc"] if arrow_fetch.adbc_pg else [])
+    res = run_benchmark(args.rows, methods, keep=args.keep)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    with open(os.path.join(RESULTS_DIR, f"fetch_{args.label}.json"), "w") as f:
+        json.dump({"rows": args.rows, "results": res}, f, indent=2)
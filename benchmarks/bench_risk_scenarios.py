@@ -0,0 +1,77 @@
+"""
+Monte Carlo scenario blocks (ml/simulation/risk_scenarios.py) on synthetic
+UPCs and interval-based samples; no database or draw store needed.
+
+    python benchmarks/bench_risk_scenarios.py --upcs 10000 --draws 1000 --steps 20
+
+The position-based percentiles are checked against np.percentile on the
+first block, and that np.percentile call is timed for comparison.
+"""
+import os
+import json
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from ml.simulation import risk_scenarios, scenario_engine
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+def synthetic_inputs(n_upcs, seed=0):
+    rng = np.random.default_rng(seed)
+    elasticity = rng.normal(-2.0, 0.8, n_upcs)
+    half_width = rng.uniform(0.1, 0.8, n_upcs)
+    return pd.DataFrame({
+        'upc_id': np.arange(1_000_000, 1_000_000 + n_upcs, dtype=np.int64),
+        'current_price': rng.uniform(0.5, 10.0, n_upcs),
+        'elasticity': elasticity,
+        'ci_lower': elasticity - half_width,
+        'ci_upper': elasticity + half_width,
+    })
+
+def run_benchmark(n_upcs, n_draws, steps, block_upcs):
+    inputs = synthetic_inputs(n_upcs)
+    pct_grid = scenario_engine.price_grid(-0.2, 0.2, steps)
+
+    start = time.perf_counter()
+    points = sum(len(b['upc_id']) for b in risk_scenarios.iter_risk_blocks(
+        'sdr', inputs, pct_grid, n_draws, block_upcs=block_upcs, seed=0))
+    seconds = time.perf_counter() - start
+
+    # Reference percentiles on the first block, with the full sort
+    block = inputs.iloc[:block_upcs]
+    samples = np.sort(risk_scenarios.ci_samples(block['elasticity'], block['ci_lower'], block['ci_upper'],
+                                                n_draws, np.random.default_rng(0)), axis=0)
+    cost = scenario_engine.unit_costs(block['current_price'].to_numpy(), block['upc_id'].to_numpy())
+    ratio = 1.0 + pct_grid
+    profit_index = ((block['current_price'].to_numpy()[:, None] * ratio - cost[:, None])
+                    / (block['current_price'].to_numpy() - cost)[:, None] * np.exp(samples[:, :, None] * np.log(ratio)))
+    start = time.perf_counter()
+    reference = np.percentile(profit_index, risk_scenarios.PERCENTILES, axis=0)
+    sort_seconds = time.perf_counter() - start
+    fast = risk_scenarios.monotone_percentiles(profit_index)
+    max_abs_diff = float(np.abs(reference - fast).max())
+
+    evaluated = points * n_draws
+    print(f"{n_upcs:,} UPCs x {n_draws} draws x {steps} price points: {seconds:.2f} s "
+          f"({evaluated / seconds:,.0f} draw-points/s)")
+    print(f"np.percentile on one block of {block_upcs} UPCs: {sort_seconds:.2f} s; "
+          f"max |diff| of positional percentiles: {max_abs_diff:.2e}")
+    return {"upcs": n_upcs, "draws": n_draws, "points": points, "seconds": seconds,
+            "draw_points_per_sec": evaluated / seconds, "block_sort_seconds": sort_seconds,
+            "max_abs_diff_vs_percentile": max_abs_diff}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--upcs", type=int, default=10_000)
+    parser.add_argument("--draws", type=int, default=1000)
+    parser.add_argument("--steps", type=int, default=20)
+    parser.add_argument("--block-upcs", type=int, default=500)
+    parser.add_argument("--label", default="latest")
+    args = parser.parse_args()
+
+    res = run_benchmark(args.upcs, args.draws, args.steps, args.block_upcs)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    with open(os.path.join(RESULTS_DIR, f"risk_scenarios_{args.label}.json"), "w") as f:
+        json.dump(res, f, indent=2)
@@ -0,0 +1,126 @@
+"""
+The previous row-by-row scenario loop vs the vectorized scenario engine
+(ml/simulation/scenario_engine.py) on synthetic UPCs; no database needed.
+
+    python benchmarks/bench_scenario_engine.py --upcs 100000 --steps 200
+
+The loop is timed on --legacy-upcs UPCs and reported per scenario point;
+both implementations are checked to agree on those UPCs.
+"""
+import os
+import json
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from pipelines.utils import binary_copy_buffer
+from ml.simulation import scenario_engine
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+def legacy_simulation(merged, category_id, min_change_pct, max_change_pct, steps):
+    """The original run_simulation loop (iterrows over UPCs, Python loop over the grid)."""
+    scenario_results = []
+    for _, row in merged.iterrows():
+        upc = row['upc_id']
+        curr_price = row['current_price']
+        elasticity = row['elasticity']
+        price_grid = np.linspace(curr_price * (1 + min_change_pct), curr_price * (1 + max_change_pct), steps)
+        for p_sim in price_grid:
+            pct_change_price = (p_sim - curr_price) / curr_price
+            revenue_index = (p_sim / curr_price) ** (1 + elasticity)
+            cost = 0.7 * curr_price
+            base_margin = curr_price - cost
+            sim_margin = p_sim - cost
+            if base_margin <= 0: base_margin = 0.01
+            profit_index = (sim_margin / base_margin) * ((p_sim / curr_price) ** elasticity)
+            scenario_results.append({
+                'category_id': category_id,
+                'upc_id': upc,
+                'current_price': curr_price,
+                'simulated_price': p_sim,
+                'price_change_pct': pct_change_price,
+                'elasticity': elasticity,
+                'revenue_index': revenue_index,
+                'profit_index': profit_index
+            })
+    return pd.DataFrame(scenario_results)
+
+def synthetic_inputs(n_upcs, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'upc_id': np.arange(1_000_000, 1_000_000 + n_upcs, dtype=np.int64),
+        'current_price': rng.uniform(0.5, 10.0, n_upcs),
+        'elasticity': rng.normal(-2.0, 0.8, n_upcs),
+    })
+
+def vectorized_simulation(merged, category_id, min_change_pct, max_change_pct, steps, block_upcs):
+    """Vectorized engine, block by block as run_simulation does; returns the blocks' columns."""
+    pct_grid = scenario_engine.price_grid(min_change_pct, max_change_pct, steps)
+    upc_ids = merged['upc_id'].to_numpy(np.int64)
+    current_price = merged['current_price'].to_numpy(float)
+    elasticity = merged['elasticity'].to_numpy(float)
+    cost = scenario_engine.unit_costs(current_price, upc_ids)
+    blocks = []
+    for start in range(0, len(merged), block_upcs):
+        block = slice(start, start + block_upcs)
+        blocks.append(scenario_engine.scenario_columns(category_id, upc_ids[block], current_price[block],
+                                                       elasticity[block], cost[block], pct_grid))
+    return blocks
+
+def run_benchmark(n_upcs, steps, legacy_upcs, block_upcs, encode):
+    merged = synthetic_inputs(n_upcs)
+    results = {}
+
+    subset = merged.iloc[:legacy_upcs]
+    start = time.perf_counter()
+    legacy = legacy_simulation(subset, 'sdr', -0.2, 0.2, steps)
+    seconds = time.perf_counter() - start
+    results['legacy_loop'] = {"upcs": legacy_upcs, "points": len(legacy), "seconds": seconds,
+                              "points_per_sec": len(legacy) / seconds}
+
+    check = vectorized_simulation(subset, 'sdr', -0.2, 0.2, steps, block_upcs)
+    numeric = [c for c in scenario_engine.RESULT_COLUMNS if c != 'category_id']
+    max_abs_diff = max(float(np.abs(np.concatenate([b[c] for b in check]) - legacy[c].to_numpy(float)).max())
+                       for c in numeric)
+
+    start = time.perf_counter()
+    blocks = vectorized_simulation(merged, 'sdr', -0.2, 0.2, steps, block_upcs)
+    seconds = time.perf_counter() - start
+    points = sum(len(b['upc_id']) for b in blocks)
+    results['vectorized'] = {"upcs": n_upcs, "points": points, "seconds": seconds,
+                             "points_per_sec": points / seconds, "max_abs_diff_vs_legacy": max_abs_diff}
+
+    if encode:
+        # The binary COPY payload run_simulation streams to Postgres
+        start = time.perf_counter()
+        payload = sum(len(binary_copy_buffer(b)) for b in blocks)
+        results['vectorized']['copy_encode_seconds'] = time.perf_counter() - start
+        results['vectorized']['copy_mb'] = payload / 1e6
+
+    speedup = results['vectorized']['points_per_sec'] / results['legacy_loop']['points_per_sec']
+    print(f"legacy loop : {results['legacy_loop']['points']:>12,} points in {results['legacy_loop']['seconds']:8.2f} s "
+          f"({results['legacy_loop']['points_per_sec']:>14,.0f} points/s)")
+    print(f"vectorized  : {points:>12,} points in {seconds:8.2f} s ({points / seconds:>14,.0f} points/s)")
+    if encode:
+        print(f"Binary COPY encoding: {results['vectorized']['copy_encode_seconds']:.2f} s "
+              f"({results['vectorized']['copy_mb']:,.0f} MB)")
+    print(f"Speedup per point: {speedup:,.0f}x; max |diff| vs legacy on {legacy_upcs} UPCs: {max_abs_diff:.2e}")
+    results['speedup_per_point'] = speedup
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--upcs", type=int, default=100_000)
+    parser.add_argument("--steps", type=int, default=200)
+    parser.add_argument("--legacy-upcs", type=int, default=500, help="UPCs run through the legacy loop")
+    parser.add_argument("--block-upcs", type=int, default=10000)
+    parser.add_argument("--no-encode", action="store_true", help="Skip timing the COPY encoding")
+    parser.add_argument("--label", default="latest")
+    args = parser.parse_args()
+
+    res = run_benchmark(args.upcs, args.steps, args.legacy_upcs, args.block_upcs, encode=not args.no_encode)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    with open(os.path.join(RESULTS_DIR, f"scenario_engine_{args.label}.json"), "w") as f:
+        json.dump({"upcs": args.upcs, "steps": args.steps, "results": res}, f, indent=2)
@@ -0,0 +1,118 @@
+"""
+Latency of the warehouse queries issued by the ML jobs and the API.
+
+Run once before and once after applying the partitioning / index post-hooks
+(`dbt run --full-refresh --select marts`), then compare:
+
+    python benchmarks/bench_warehouse_queries.py --label before
+    dbt run --full-refresh --select marts --profiles-dir dbt --project-dir dbt
+    python benchmarks/bench_warehouse_queries.py --label after --compare before
+"""
+import os
+import json
+import time
+import argparse
+import statistics
+from sqlalchemy import text
+from pipelines.utils import get_db_engine
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+# name -> SQL, as issued by the job that owns it (category filter bound to :cat)
+QUERIES = {
+    "train_model.panel": """
+        select * from elasticity_ready_panel where category_id = :cat
+    """,
+    "scenario_engine.latest_price": """
+        select distinct on (upc_id) upc_id, exp(log_price) as current_price
+        from elasticity_ready_panel
+        where category_id = :cat
+        order by upc_id, week_id desc
+    """,
+    "optimize_profit.base": """
+        select upc_id, exp(avg(log_sales)) as base_units, exp(avg(log_price)) as base_price
+        from elasticity_ready_panel
+        where category_id = :cat
+        group by 1
+    """,
+    "train_forecast.panel": """
+        select store_id, upc_id, start_date as ds, exp(log_sales) as y
+        from elasticity_ready_panel
+        where category_id = :cat
+        order by store_id, upc_id, start_date
+    """,
+    "cross_elasticity.top_upcs": """
+        select upc_id, sum(sales_units) from fact_movement_weekly
+        where category_id = :cat
+        group by 1 order by 2 desc limit 5
+    """,
+    "fact.store_week_totals": """
+        select week_id, store_id, sum(sales_units) from fact_movement_weekly
+        where category_id = :cat and week_id between 100 and 152
+        group by 1, 2
+    """,
+    "api.elasticity_lookup": """
+        select upc_id, elasticity, ci_lower, ci_upper, promo_lift
+        from elasticity_catalog
+        where category_id = :cat and upc_id = :upc
+    """,
+    "api.optimization_results": """
+        select upc_id, current_price, recommended_price, price_change_pct, predicted_profit
+        from optimization_results
+        where category_id = :cat
+    """,
+}
+
+def _sample_upc(conn, category_id):
+    try:
+        return conn.execute(text(
+            "select upc_id from elasticity_catalog where category_id = :cat limit 1"
+        ), {"cat": category_id}).scalar()
+    except Exception:
+        return None
+
+def run_benchmark(category_id="sdr", repeats=5):
+    engine = get_db_engine()
+    results = {}
+    with engine.connect() as conn:
+        params = {"cat": category_id, "upc": _sample_upc(conn, category_id)}
+        for name, sql in QUERIES.items():
+            timings = []
+            try:
+                for _ in range(repeats):
+                    start = time.perf_counter()
+                    conn.execute(text(sql), params).fetchall()
+                    timings.append(time.perf_counter() - start)
+            except Exception as e:
+                conn.rollback()
+                print(f"{name:<32} skipped ({type(e).__name__})")
+                continue
+            results[name] = {"median_ms": statistics.median(timings) * 1000,
+                             "min_ms": min(timings) * 1000}
+            print(f"{name:<32} median {results[name]['median_ms']:>10.1f} ms")
+    return results
+
+def compare(before, after):
+    print(f"\n{'query':<32} {'before ms':>10} {'after ms':>10} {'speedup':>8}")
+    for name in QUERIES:
+        if name in before and name in after:
+            b, a = before[name]["median_ms"], after[name]["median_ms"]
+            print(f"{name:<32} {b:>10.1f} {a:>10.1f} {b / a if a else float('inf'):>7.1f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--label", required=True, help="Name of this run, e.g. before / after")
+    parser.add_argument("--compare", default=None, help="Label of an earlier run to compare with")
+    parser.add_argument("--category", default="sdr")
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    res = run_benchmark(category_id=args.category, repeats=args.repeats)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    with open(os.path.join(RESULTS_DIR, f"warehouse_queries_{args.label}.json"), "w") as f:
+        json.dump(res, f, indent=2)
+
+    if args.compare:
+        with open(os.path.join(RESULTS_DIR, f"warehouse_queries_{args.compare}.json")) as f:
+            compare(json.load(f), res)
@@ -46,10 +46,11 @@ with DAG(
         python_callable=check_psi,
     )
 
-    # 3a. Retrain Model (Conditional)
+    # 3a. Retrain Model (Conditional) - all categories in parallel, catalogs written as one set.
+    # Incremental: warm-start from the stored posterior, refit from scratch on drift.
     t3_train = BashOperator(
         task_id='trigger_retraining',
-        bash_command='python /app/ml/elasticity/train_model.py',
+        bash_command='cd /app && python -m ml.elasticity.train_all --mode incremental',
     )
 
     # 3b. Skip
@@ -68,10 +69,16 @@ with DAG(
     # 5. Optimize
     t5_optimize = BashOperator(
         task_id='run_optimizer',
-        bash_command='python /app/ml/optimizer/optimize.py --category sdr',
+        bash_command='cd /app && python ml/optimization/optimize_profit.py --category sdr',
+    )
+
+    # 6. Scenario risk: revenue/profit percentiles and loss probabilities from the posterior draws
+    t6_risk = BashOperator(
+        task_id='run_risk_scenarios',
+        bash_command='cd /app && python -m ml.simulation.risk_scenarios --category sdr --draws 1000',
     )
 
     # Flow
     t1_dbt >> t2_drift_check
     t2_drift_check >> [t3_train, t3_skip]
-    [t3_train, t3_skip] >> t4_fs >> t5_optimize
+    [t3_train, t3_skip] >> t4_fs >> [t5_optimize, t6_risk]
@@ -0,0 +1,13 @@
+{#
+    Lower week_id bound for incremental runs of the weekly models.
+
+    Rows with week_id > max(week_id) - incremental_lookback_weeks are rebuilt on
+    every run (late-arriving movement rows). Models with window features also pass
+    `context_weeks` so their windows are computed over enough history; the extra
+    context rows are read but not written. The windows are ROWS-based, so a series
+    with a gap longer than the context sees a shorter history on incremental runs;
+    `dbt run --full-refresh` rebuilds everything exactly.
+#}
+{% macro incremental_week_floor(context_weeks=0) %}
+    (select coalesce(max(week_id), 0) from {{ this }}) - {{ var('incremental_lookback_weeks') + context_weeks }}
+{% endmacro %}
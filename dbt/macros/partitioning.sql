@@ -0,0 +1,45 @@
+{#
+    Convert {{ this }} into a LIST-partitioned table on category_id, one partition
+    per category plus a default. A no-op once the table is partitioned, so it is
+    safe as a post-hook on incremental models. Use through after_commit(): dbt
+    drops its __dbt_backup relation (and that relation's partitions) only after
+    the in-transaction hooks have run.
+#}
+{% macro list_partition_by_category(categories=['sdr', 'cer', 'lnd', 'sna']) %}
+    {%- set unpartitioned = this.identifier ~ '__unpartitioned' -%}
+    do $$
+    begin
+        if exists (
+            select 1 from pg_class c
+            join pg_namespace n on n.oid = c.relnamespace
+            where n.nspname = '{{ this.schema }}'
+              and c.relname = '{{ this.identifier }}'
+              and c.relkind = 'r'
+        ) then
+            alter table {{ this }} rename to {{ unpartitioned }};
+            create table {{ this }} (like {{ this.schema }}.{{ unpartitioned }} including defaults)
+                partition by list (category_id);
+            {% for cat in categories %}
+            create table {{ this.schema }}.{{ this.identifier }}_{{ cat }}
+                partition of {{ this }} for values in ('{{ cat }}');
+            {% endfor %}
+            create table {{ this.schema }}.{{ this.identifier }}_default
+                partition of {{ this }} default;
+            insert into {{ this }} select * from {{ this.schema }}.{{ unpartitioned }};
+            drop table {{ this.schema }}.{{ unpartitioned }};
+        end if;
+    end $$;
+    analyze {{ this }};
+{% endmacro %}
+
+{#
+    BRIN on week_id (rows arrive in week order, so the index stays tiny) and a
+    B-tree on the given access keys. On a partitioned table both cascade to
+    every partition.
+#}
+{% macro create_access_indexes(keys, week_column='week_id') %}
+    create index if not exists {{ this.identifier }}_{{ week_column }}_brin
+        on {{ this }} using brin ({{ week_column }});
+    create index if not exists {{ this.identifier }}_{{ keys | join('_') }}_idx
+        on {{ this }} ({{ keys | join(', ') }});
+{% endmacro %}
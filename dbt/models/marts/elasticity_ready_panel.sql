@@ -1,26 +1,18 @@
--- Select high-velocity items to ensure stable elasticity estimates.
--- Filtering for Top 20 UPCs per category by total revenue to keep MCMC sampling fast for this sprint.
-with top_upcs as (
-    select 
-        category_id, 
-        upc_id,
-        sum(sales_units * price) as total_rev
-    from {{ ref('fact_movement_weekly') }}
-    group by 1, 2
-    order by 1, 3 desc
-),
+{{ config(
+    materialized='incremental',
+    unique_key='week_id',
+    incremental_strategy='delete+insert',
+    post_hook=[
+        after_commit("{{ list_partition_by_category() }}"),
+        after_commit("{{ create_access_indexes(['upc_id', 'store_id', 'week_id']) }}")
+    ]
+) }}
 
-ranked as (
-    select *,
-        row_number() over (partition by category_id order by total_rev desc) as rnk
-    from top_upcs
-),
-
-filtered_upcs as (
-    select upc_id, category_id from ranked where rnk <= 20
-),
+-- Every UPC of the category: the collapsed elasticity likelihood and the
+-- cross-elasticity / substitute screens scale with (store, upc) pairs, not rows.
+-- Consumers that need a bounded panel read elasticity_ready_panel_top instead.
 
-filtered_fact as (
+with filtered_fact as (
     select 
         f.store_id,
         f.upc_id,
@@ -31,9 +23,11 @@ filtered_fact as (
         f.price,
         f.is_promo
     from {{ ref('fact_movement_weekly') }} f
-    inner join filtered_upcs u on f.upc_id = u.upc_id
     where f.sales_units > 0 
       and f.price > 0
+    {% if is_incremental() %}
+      and f.week_id > {{ incremental_week_floor(var('window_context_weeks')) }}
+    {% endif %}
 ),
 
 features as (
@@ -64,3 +58,6 @@ select
     end as promo_depth
 from features
 where log_price is not null
+{% if is_incremental() %}
+  and week_id > {{ incremental_week_floor() }}
+{% endif %}
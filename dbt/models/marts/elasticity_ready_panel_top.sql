@@ -0,0 +1,40 @@
+{{ config(
+    materialized='table',
+    post_hook=[
+        after_commit("{{ list_partition_by_category() }}"),
+        after_commit("{{ create_access_indexes(['upc_id', 'store_id', 'week_id']) }}")
+    ]
+) }}
+
+-- elasticity_ready_panel restricted to the top `panel_top_upcs` UPCs per
+-- category by total revenue, for the consumers whose cost grows with the
+-- number of UPCs (forecasting, optimizer, scenarios, regression moments).
+{% set top_n = var('panel_top_upcs', 20) %}
+
+with panel as (
+    select * from {{ ref('elasticity_ready_panel') }}
+),
+
+upc_revenue as (
+    select
+        category_id,
+        upc_id,
+        sum(exp(log_price + log_sales)) as total_rev
+    from panel
+    group by 1, 2
+),
+
+ranked as (
+    select *,
+        row_number() over (partition by category_id order by total_rev desc) as rnk
+    from upc_revenue
+)
+
+select p.*
+from panel p
+inner join ranked r
+    on p.category_id = r.category_id
+   and p.upc_id = r.upc_id
+{% if top_n %}
+where r.rnk <= {{ top_n }}
+{% endif %}
@@ -1,3 +1,13 @@
+{{ config(
+    materialized='incremental',
+    unique_key='week_id',
+    incremental_strategy='delete+insert',
+    post_hook=[
+        after_commit("{{ list_partition_by_category() }}"),
+        after_commit("{{ create_access_indexes(['upc_id', 'store_id', 'week_id']) }}")
+    ]
+) }}
+
 with movement as (
     select * from {{ ref('int_movement_union') }}
 ),
@@ -21,3 +31,6 @@ select
 from movement m
 left join calendar c on m.week_id = c.week_id
 where m.sales_units >= 0 and m.unit_price_raw > 0
+{% if is_incremental() %}
+  and m.week_id > {{ incremental_week_floor() }}
+{% endif %}
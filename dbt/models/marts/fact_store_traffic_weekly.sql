@@ -0,0 +1,36 @@
+{{ config(
+    materialized='table',
+    post_hook=[
+        "create unique index if not exists {{ this.name }}_store_week_idx on {{ this }} (store_id, week_id)"
+    ]
+) }}
+
+-- Weekly store traffic at the same (store_id, week_id) grain as fact_movement_weekly,
+-- so customer-count features join without scanning the daily ccount data.
+with daily as (
+    select
+        store_id,
+        traffic_date,
+        traffic_count,
+        -- Same week numbering as dim_calendar (week 1 starts 1989-09-14). Floor, not
+        -- integer division: the latter truncates toward zero and folds the 6 days
+        -- before the start into week 1.
+        floor((traffic_date - '1989-09-14'::date) / 7.0)::int + 1 as week_id
+    from {{ ref('stg_store_traffic') }}
+    where traffic_date is not null
+),
+
+calendar as (
+    select * from {{ ref('dim_calendar') }}
+)
+
+select
+    d.store_id,
+    d.week_id,
+    c.start_date,
+    sum(d.traffic_count) as traffic_count,
+    avg(d.traffic_count) as avg_daily_traffic,
+    count(*) as days_observed
+from daily d
+inner join calendar c on d.week_id = c.week_id
+group by 1, 2, 3
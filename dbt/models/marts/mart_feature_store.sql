@@ -1,8 +1,15 @@
-{{ config(materialized='table') }}
+{{ config(
+    materialized='incremental',
+    unique_key='week_id',
+    incremental_strategy='delete+insert',
+    post_hook=[
+        after_commit("{{ create_access_indexes(['store_id', 'upc_id', 'event_timestamp']) }}")
+    ]
+) }}
 
 -- Feature Store: Centralized definition of features for Training and Serving
 -- Offline Store: This table
--- Online Store: A view on top of this (e.g., SELECT * FROM ... WHERE week_id = (SELECT MAX(week_id) ...))
+-- Online Store: mart_feature_store_online (latest row per store/upc), served in-process by ml/features/online_store.py
 
 WITH base AS (
     SELECT
@@ -32,6 +39,9 @@ WITH base AS (
         EXTRACT(MONTH FROM start_date) as feat_month_of_year
 
     FROM {{ ref('mart_weekly_pricing_features') }}
+    {% if is_incremental() %}
+    WHERE week_id > {{ incremental_week_floor() }}
+    {% endif %}
 )
 
 SELECT * FROM base
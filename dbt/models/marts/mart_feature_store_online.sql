@@ -0,0 +1,8 @@
+{{ config(materialized='view') }}
+
+-- Online Store: latest feature row per (store_id, upc_id).
+-- Served from memory by ml/features/online_store.py, which reloads it when
+-- mart_feature_store changes.
+SELECT DISTINCT ON (store_id, upc_id) *
+FROM {{ ref('mart_feature_store') }}
+ORDER BY store_id, upc_id, week_id DESC
@@ -0,0 +1,42 @@
+-- Sufficient statistics for linear models on elasticity_ready_panel_top.
+-- One row per (category_id, upc_id, store_id) with the count, sums and all
+-- pairwise cross-products of the modelling variables, so OLS fits (see
+-- ml/stats/ols_moments.py) never need the row-level panel. Moments are
+-- additive: summing rows gives the moments of any coarser grouping.
+{% set moment_vars = ['log_price', 'promo_depth', 'is_promo', 'log_sales'] %}
+
+with panel as (
+    select
+        category_id,
+        upc_id,
+        store_id,
+        log_price,
+        promo_depth,
+        is_promo::double precision as is_promo,
+        log_sales
+    from {{ ref('elasticity_ready_panel_top') }}
+    where log_price is not null
+      and promo_depth is not null
+      and log_sales is not null
+)
+
+select
+    category_id,
+    upc_id,
+    store_id,
+    count(*) as n_obs,
+    {%- for a in moment_vars %}
+    sum({{ a }}) as sum_{{ a }},
+    {%- endfor %}
+    {%- for i in range(moment_vars | length) %}
+    {%- for j in range(i, moment_vars | length) %}
+    {%- set a = moment_vars[i] %}
+    {%- set b = moment_vars[j] %}
+    sum({{ a }} * {{ b }}) as {{ 'sum_' ~ a ~ '_sq' if i == j else 'sum_' ~ a ~ '_x_' ~ b }},
+    {%- endfor %}
+    {%- endfor %}
+    -- Average promo depth while on promotion (used for lift estimates)
+    count(*) filter (where promo_depth > 0) as n_promo_depth_pos,
+    coalesce(sum(promo_depth) filter (where promo_depth > 0), 0) as sum_promo_depth_pos
+from panel
+group by 1, 2, 3
@@ -1,5 +1,18 @@
+{{ config(
+    materialized='incremental',
+    unique_key='week_id',
+    incremental_strategy='delete+insert',
+    post_hook=[
+        after_commit("{{ list_partition_by_category() }}"),
+        after_commit("{{ create_access_indexes(['upc_id', 'store_id', 'week_id']) }}")
+    ]
+) }}
+
 with base as (
     select * from {{ ref('fact_movement_weekly') }}
+    {% if is_incremental() %}
+    where week_id > {{ incremental_week_floor(var('window_context_weeks')) }}
+    {% endif %}
 ),
 
 windowed as (
@@ -32,3 +45,6 @@ select
     coalesce(lag_price_1w, price) as lag_price_1w_clean
 from windowed
 where price > 0
+{% if is_incremental() %}
+  and week_id > {{ incremental_week_floor() }}
+{% endif %}
@@ -6,6 +6,8 @@ renamed as (
     select
         store as store_id,
         date,
+        -- DFF dates are YYMMDD (890914 = 1989-09-14)
+        to_date(lpad(date::text, 6, '0'), 'YYMMDD') as traffic_date,
         custcoun as traffic_count
     from source
 )
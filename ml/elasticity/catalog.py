@@ -0,0 +1,183 @@
+"""
+Versioned elasticity catalog.
+
+Every training run writes its catalog under a model_version (the draw store
+version of the fit) and run_ts into elasticity_catalog_versions, then
+promotes it: elasticity_model_registry points the category at the version
+and elasticity_catalog is replaced with that version's rows, in the same
+transaction. elasticity_catalog therefore always holds exactly one
+(current) row per (category_id, upc_id) for the SQL readers, and the API
+serves an in-memory snapshot of it (ElasticityCatalog) that is reloaded
+when the registry changes.
+"""
+import time
+import threading
+import pandas as pd
+from sqlalchemy import text
+from pipelines.utils import get_db_engine, ensure_index, copy_dataframe
+
+CATALOG_COLUMNS = ['category_id', 'upc_id', 'elasticity', 'ci_lower', 'ci_upper', 'promo_lift']
+VALUE_COLUMNS = ['elasticity', 'ci_lower', 'ci_upper', 'promo_lift']
+
+VERSIONS_TABLE = 'elasticity_catalog_versions'
+REGISTRY_TABLE = 'elasticity_model_registry'
+
+CATALOG_DDL = """
+    CREATE TABLE IF NOT EXISTS elasticity_catalog (
+        category_id text,
+        upc_id bigint,
+        elasticity double precision,
+        ci_lower double precision,
+        ci_upper double precision,
+        promo_lift double precision
+    );
+    -- Tables created before versioning
+    ALTER TABLE elasticity_catalog ADD COLUMN IF NOT EXISTS model_version text;
+    ALTER TABLE elasticity_catalog ADD COLUMN IF NOT EXISTS run_ts timestamptz;
+"""
+
+VERSIONS_DDL = f"""
+    CREATE TABLE IF NOT EXISTS {VERSIONS_TABLE} (
+        category_id text NOT NULL,
+        model_version text NOT NULL,
+        run_ts timestamptz NOT NULL,
+        upc_id bigint NOT NULL,
+        elasticity double precision,
+        ci_lower double precision,
+        ci_upper double precision,
+        promo_lift double precision
+    )
+"""
+
+REGISTRY_DDL = f"""
+    CREATE TABLE IF NOT EXISTS {REGISTRY_TABLE} (
+        category_id text PRIMARY KEY,
+        model_version text NOT NULL,
+        run_ts timestamptz NOT NULL,
+        promoted_at timestamptz NOT NULL DEFAULT now()
+    )
+"""
+
+def ensure_tables(conn):
+    for ddl in (CATALOG_DDL, VERSIONS_DDL, REGISTRY_DDL):
+        conn.execute(text(ddl))
+
+def write_catalog(conn, catalog_df, category_id, model_version, run_ts, promote_now=True):
+    """
+    Store a category's catalog as model_version inside the caller's
+    transaction and (by default) make it the current version.
+    Rewriting an existing version replaces its rows.
+    """
+    ensure_tables(conn)
+    rows = catalog_df[['upc_id'] + VALUE_COLUMNS].copy()
+    rows.insert(0, 'run_ts', pd.Timestamp(run_ts).isoformat())
+    rows.insert(0, 'model_version', model_version)
+    rows.insert(0, 'category_id', category_id)
+    conn.execute(text(f"DELETE FROM {VERSIONS_TABLE} WHERE category_id = :cat AND model_version = :ver"),
+                 {"cat": category_id, "ver": model_version})
+    copy_dataframe(conn, rows, VERSIONS_TABLE)
+    if promote_now:
+        promote(conn, category_id, model_version)
+
+def promote(conn, category_id, model_version):
+    """
+    Make a stored version current (also used to roll back): point the
+    registry at it and rebuild the category's elasticity_catalog rows.
+    """
+    run_ts = conn.execute(text(f"""
+        SELECT max(run_ts) FROM {VERSIONS_TABLE} WHERE category_id = :cat AND model_version = :ver
+    """), {"cat": category_id, "ver": model_version}).scalar()
+    if run_ts is None:
+        raise ValueError(f"No catalog version {model_version} for {category_id}")
+    conn.execute(text("DELETE FROM elasticity_catalog WHERE category_id = :cat"), {"cat": category_id})
+    conn.execute(text(f"""
+        INSERT INTO elasticity_catalog ({', '.join(CATALOG_COLUMNS)}, model_version, run_ts)
+        SELECT {', '.join(CATALOG_COLUMNS)}, model_version, run_ts
+        FROM {VERSIONS_TABLE}
+        WHERE category_id = :cat AND model_version = :ver
+    """), {"cat": category_id, "ver": model_version})
+    conn.execute(text(f"""
+        INSERT INTO {REGISTRY_TABLE} (category_id, model_version, run_ts, promoted_at)
+        VALUES (:cat, :ver, :run_ts, now())
+        ON CONFLICT (category_id) DO UPDATE
+        SET model_version = EXCLUDED.model_version, run_ts = EXCLUDED.run_ts, promoted_at = EXCLUDED.promoted_at
+    """), {"cat": category_id, "ver": model_version, "run_ts": run_ts})
+
+def ensure_catalog_indexes(engine):
+    ensure_index(engine, 'elasticity_catalog', ['category_id', 'upc_id'])
+    ensure_index(engine, VERSIONS_TABLE, ['category_id', 'model_version'])
+
+def current_versions(engine):
+    """{category_id: model_version} of the promoted catalogs ({} before the first run)."""
+    with engine.connect() as conn:
+        if not conn.execute(text("SELECT to_regclass(:t) IS NOT NULL"), {"t": REGISTRY_TABLE}).scalar():
+            return {}
+        rows = conn.execute(text(f"SELECT category_id, model_version FROM {REGISTRY_TABLE}")).fetchall()
+    return {cat: ver for cat, ver in rows}
+
+def load_current(engine):
+    """The promoted catalog rows of every category, with their model_version."""
+    with engine.connect() as conn:
+        return pd.read_sql(text(f"""
+            SELECT v.category_id, v.upc_id, {', '.join('v.' + c for c in VALUE_COLUMNS)}, v.model_version
+            FROM {VERSIONS_TABLE} v
+            JOIN {REGISTRY_TABLE} r USING (category_id, model_version)
+        """), conn)
+
+class _Snapshot:
+    """Immutable copy of the current catalogs: (category_id, upc_id) -> row dict."""
+
+    def __init__(self, versions, df):
+        self.versions = dict(versions)
+        rows = df[VALUE_COLUMNS].astype(float).to_dict('records')
+        self.rows = {
+            (cat, int(upc)): {**row, 'model_version': ver}
+            for cat, upc, ver, row in zip(df['category_id'], df['upc_id'], df['model_version'], rows)
+        }
+
+class ElasticityCatalog:
+    """
+    In-process view of the promoted elasticity catalogs, reloaded when
+    elasticity_model_registry changes. Lookups read the current snapshot,
+    which is swapped atomically on refresh, so they never query Postgres.
+    """
+
+    def __init__(self, engine=None, min_refresh_interval=30):
+        self.engine = engine or get_db_engine()
+        self.min_refresh_interval = min_refresh_interval
+        self._snapshot = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def versions(self):
+        snap = self._snapshot
+        return dict(snap.versions) if snap else {}
+
+    @property
+    def loaded(self):
+        return self._snapshot is not None
+
+    def refresh(self, force=False):
+        """Reload if a new version was promoted. Returns True if a new snapshot was loaded."""
+        now = time.monotonic()
+        if not force and self._snapshot is not None and now - self._last_check < self.min_refresh_interval:
+            return False
+        with self._lock:
+            self._last_check = now
+            versions = current_versions(self.engine)
+            if not force and self._snapshot is not None and versions == self._snapshot.versions:
+                return False
+            df = load_current(self.engine) if versions else pd.DataFrame(
+                columns=['category_id', 'upc_id'] + VALUE_COLUMNS + ['model_version'])
+            self._snapshot = _Snapshot(versions, df)
+            print(f"Elasticity catalog loaded {len(df)} UPCs at versions {versions}.")
+            return True
+
+    def get(self, category_id, upc_id):
+        """Catalog row for (category_id, upc_id) as a dict, or None if unknown."""
+        snap = self._snapshot
+        if snap is None:
+            raise RuntimeError("Elasticity catalog has not been loaded yet.")
+        row = snap.rows.get((category_id, int(upc_id)))
+        return dict(row) if row is not None else None
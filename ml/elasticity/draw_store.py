@@ -0,0 +1,201 @@
+"""
+Versioned store of posterior draws, for consumers that need more than the
+catalog's mean and interval (risk-adjusted pricing, Monte Carlo).
+
+Layout, one directory per category and version:
+
+    {root}/{category_id}/{version}/index.json
+    {root}/{category_id}/{version}/beta_price.f32    float32 (draws x upc)
+    {root}/{category_id}/{version}/alpha_store.f32   float32 (draws x store)
+    {root}/{category_id}/{version}/beta_promo.f32    float32 (draws,)
+    {root}/{category_id}/LATEST                      name of the published version
+
+Arrays are raw little-endian float32 and opened with np.memmap, so readers
+never load the InferenceData: a range of draws is a contiguous read, and a
+set of UPCs is gathered column-wise from the mapped file.
+"""
+import os
+import json
+import uuid
+import shutil
+import datetime
+import numpy as np
+
+DRAW_PARAMS = {'beta_price': 'upc', 'alpha_store': 'store', 'beta_promo': None}
+DTYPE = np.dtype('<f4')
+
+def store_root():
+    root = os.getenv("PIRO_DRAW_STORE_DIR")
+    if root:
+        return root
+    return "/app/data/draws" if os.path.isdir("/app/data") else "data/draws"
+
+def new_version():
+    """Sortable, unique run id, e.g. 20240107T031500Z-1a2b3c4d."""
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return f"{now:%Y%m%dT%H%M%SZ}-{uuid.uuid4().hex[:8]}"
+
+def draws_from_trace(trace, upc_labels, store_labels, max_draws=None):
+    """{param: float32 array (draws x labels)} plus labels, chains flattened into draws."""
+    post = trace.posterior
+    n_total = post.sizes['chain'] * post.sizes['draw']
+    keep = slice(None)
+    if max_draws and n_total > max_draws:
+        keep = np.linspace(0, n_total - 1, max_draws).round().astype(int)
+    arrays = {}
+    for name, dim in DRAW_PARAMS.items():
+        values = post[name].values.reshape(n_total, -1) if dim else post[name].values.reshape(n_total)
+        arrays[name] = values[keep].astype(DTYPE)
+    return {
+        'arrays': arrays,
+        'upc_ids': np.asarray(upc_labels, dtype=np.int64),
+        'store_ids': np.asarray(store_labels, dtype=np.int64),
+    }
+
+def fill_from_state(draws, state, seed=None):
+    """
+    Add the UPCs / stores of a PosteriorState that the trace did not cover
+    (incremental fits only see labels with new weeks), drawing them from the
+    state's Normal approximation.
+    """
+    rng = np.random.default_rng(seed)
+    n = len(draws['arrays']['beta_promo'])
+    for name, key in (('beta_price', 'upc_ids'), ('alpha_store', 'store_ids')):
+        table = state.vectors[name]
+        missing = table[~table['label'].isin(draws[key])]
+        if missing.empty:
+            continue
+        extra = rng.normal(missing['mean'].to_numpy(), missing['sd'].to_numpy(), size=(n, len(missing)))
+        draws['arrays'][name] = np.hstack([draws['arrays'][name], extra.astype(DTYPE)])
+        draws[key] = np.concatenate([draws[key], missing['label'].to_numpy(np.int64)])
+    return draws
+
+def write_draws(category_id, draws, version=None, root=None, publish=True, metadata=None):
+    """
+    Write one version. The directory appears atomically (written under a
+    temporary name, then renamed); publish=False leaves LATEST alone so the
+    caller can publish together with the catalog.
+    """
+    root = root or store_root()
+    version = version or new_version()
+    base = os.path.join(root, category_id)
+    final_dir = os.path.join(base, version)
+    tmp_dir = f"{final_dir}.tmp-{os.getpid()}"
+    os.makedirs(tmp_dir, exist_ok=True)
+
+    index = {
+        'category_id': category_id,
+        'version': version,
+        'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'n_draws': int(len(draws['arrays']['beta_promo'])),
+        'upc_ids': [int(u) for u in draws['upc_ids']],
+        'store_ids': [int(s) for s in draws['store_ids']],
+        'arrays': {},
+        'metadata': metadata or {},
+    }
+    for name, arr in draws['arrays'].items():
+        arr = np.ascontiguousarray(arr, dtype=DTYPE)
+        arr.tofile(os.path.join(tmp_dir, f"{name}.f32"))
+        index['arrays'][name] = {'shape': list(arr.shape), 'dtype': DTYPE.str}
+    with open(os.path.join(tmp_dir, "index.json"), "w") as f:
+        json.dump(index, f)
+
+    os.replace(tmp_dir, final_dir)
+    if publish:
+        publish_version(category_id, version, root=root)
+    return version
+
+def publish_version(category_id, version, root=None):
+    """Point LATEST at a written version (atomic rename)."""
+    base = os.path.join(root or store_root(), category_id)
+    if not os.path.isdir(os.path.join(base, version)):
+        raise FileNotFoundError(f"No draw store version {version} for {category_id}")
+    tmp = os.path.join(base, f"LATEST.tmp-{os.getpid()}")
+    with open(tmp, "w") as f:
+        f.write(version)
+    os.replace(tmp, os.path.join(base, "LATEST"))
+
+def latest_version(category_id, root=None):
+    path = os.path.join(root or store_root(), category_id, "LATEST")
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return f.read().strip()
+
+def list_versions(category_id, root=None):
+    base = os.path.join(root or store_root(), category_id)
+    if not os.path.isdir(base):
+        return []
+    return sorted(d for d in os.listdir(base)
+                  if ".tmp-" not in d and os.path.exists(os.path.join(base, d, "index.json")))
+
+def prune(category_id, keep=5, root=None):
+    """Delete all but the newest `keep` versions; the published one is always kept."""
+    root = root or store_root()
+    latest = latest_version(category_id, root)
+    versions = list_versions(category_id, root)
+    removed = []
+    for version in versions[:max(0, len(versions) - keep)]:
+        if version != latest:
+            shutil.rmtree(os.path.join(root, category_id, version), ignore_errors=True)
+            removed.append(version)
+    return removed
+
+class DrawStore:
+    """Read-only, memory-mapped view of one version of a category's draws."""
+
+    def __init__(self, category_id, version=None, root=None):
+        root = root or store_root()
+        version = version or latest_version(category_id, root)
+        if version is None:
+            raise FileNotFoundError(f"No published draw store for {category_id}")
+        self.path = os.path.join(root, category_id, version)
+        with open(os.path.join(self.path, "index.json")) as f:
+            self.index = json.load(f)
+        self.category_id = category_id
+        self.version = version
+        self.n_draws = self.index['n_draws']
+        self.upc_ids = np.asarray(self.index['upc_ids'], dtype=np.int64)
+        self.store_ids = np.asarray(self.index['store_ids'], dtype=np.int64)
+        self._upc_col = {int(u): i for i, u in enumerate(self.upc_ids)}
+        self._store_col = {int(s): i for i, s in enumerate(self.store_ids)}
+        self._maps = {}
+
+    def _array(self, name):
+        arr = self._maps.get(name)
+        if arr is None:
+            spec = self.index['arrays'][name]
+            arr = np.memmap(os.path.join(self.path, f"{name}.f32"), dtype=np.dtype(spec['dtype']),
+                            mode='r', shape=tuple(spec['shape']))
+            self._maps[name] = arr
+        return arr
+
+    def columns(self, upc_ids):
+        """Column of each upc_id; raises KeyError for UPCs without draws."""
+        missing = [u for u in upc_ids if int(u) not in self._upc_col]
+        if missing:
+            raise KeyError(f"No draws for UPCs {missing[:10]} in {self.category_id}/{self.version}")
+        return np.array([self._upc_col[int(u)] for u in upc_ids], dtype=np.int64)
+
+    def _select(self, name, draws, cols):
+        """Rows `draws` (slice, index array or None) x columns `cols` (None: all) of a mapped array."""
+        arr = self._array(name)
+        rows = slice(None) if draws is None else draws
+        if cols is None:
+            return np.asarray(arr[rows])
+        if isinstance(rows, slice):
+            # Slicing the memmap is a view; only the gathered columns are copied
+            return np.asarray(arr[rows][:, cols])
+        # One gather of rows x cols, without copying the rows across every column first
+        return np.asarray(arr[np.ix_(np.asarray(rows), cols)])
+
+    def beta_price(self, upc_ids=None, draws=None):
+        """float32 (draws x upc) for upc_ids (all UPCs if None); draws: slice or index array."""
+        return self._select('beta_price', draws, None if upc_ids is None else self.columns(upc_ids))
+
+    def alpha_store(self, store_ids=None, draws=None):
+        cols = None if store_ids is None else [self._store_col[int(s)] for s in store_ids]
+        return self._select('alpha_store', draws, cols)
+
+    def beta_promo(self, draws=None):
+        return np.asarray(self._array('beta_promo')[slice(None) if draws is None else draws])
@@ -0,0 +1,152 @@
+from dataclasses import dataclass, field
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from pipelines.utils import copy_dataframe
+
+STATE_TABLE = 'elasticity_posterior_state'
+
+# Positive parameters are moment-matched on the log scale (LogNormal priors)
+POSITIVE_PARAMS = ['sigma_elasticity', 'sigma_alpha', 'sigma_y']
+SCALAR_PARAMS = ['mu_elasticity', 'beta_promo'] + POSITIVE_PARAMS
+# Per-label parameters and the model dimension they are indexed by
+VECTOR_PARAMS = {'beta_price': 'upc', 'alpha_store': 'store'}
+
+STATE_DDL = f"""
+    CREATE TABLE IF NOT EXISTS {STATE_TABLE} (
+        category_id text NOT NULL,
+        param text NOT NULL,
+        label bigint,
+        mean double precision,
+        sd double precision,
+        last_week_id integer,
+        n_obs bigint,
+        incremental_runs integer,
+        fitted_at timestamptz DEFAULT now()
+    )
+"""
+
+@dataclass
+class PosteriorState:
+    """
+    Compact posterior of one category's fit: an independent Normal per
+    parameter (LogNormal for the scale parameters), matched to the posterior
+    mean and sd. Correlations between parameters are not kept.
+    """
+    category_id: str
+    last_week_id: int
+    n_obs: int
+    incremental_runs: int = 0
+    scalars: dict = field(default_factory=dict)   # name -> (mean, sd)
+    vectors: dict = field(default_factory=dict)   # name -> DataFrame(label, mean, sd)
+
+    def scalar_prior(self, name, prior_scale=1.0):
+        mean, sd = self.scalars[name]
+        return {"mu": mean, "sigma": sd * prior_scale}
+
+    def vector_prior(self, name, labels, prior_scale=1.0):
+        """(mean, sd, known) aligned to labels; unknown labels get mean 0, sd 1."""
+        table = self.vectors[name].set_index('label').reindex(np.asarray(labels, dtype=np.int64))
+        known = table['mean'].notna().to_numpy()
+        mean = table['mean'].fillna(0.0).to_numpy()
+        sd = table['sd'].fillna(1.0).to_numpy() * prior_scale
+        return mean, sd, known
+
+def summarize(trace, category_id, store_labels, upc_labels, last_week_id, n_obs, incremental_runs=0):
+    """Moment-match a trace into a PosteriorState."""
+    post = trace.posterior.stack(draws=("chain", "draw"))
+    scalars = {}
+    for name in SCALAR_PARAMS:
+        values = post[name].values
+        if name in POSITIVE_PARAMS:
+            values = np.log(values)
+        scalars[name] = (float(values.mean()), float(values.std()))
+    vectors = {}
+    for name, labels in (('beta_price', upc_labels), ('alpha_store', store_labels)):
+        values = post[name].values   # (label, draws)
+        vectors[name] = pd.DataFrame({
+            'label': np.asarray(labels, dtype=np.int64),
+            'mean': values.mean(axis=1),
+            'sd': values.std(axis=1),
+        })
+    return PosteriorState(category_id, int(last_week_id), int(n_obs), incremental_runs, scalars, vectors)
+
+def merge(previous, update):
+    """
+    State after an incremental fit: labels seen in the new weeks take the
+    updated posterior, all others keep their previous one.
+    """
+    vectors = {}
+    for name in VECTOR_PARAMS:
+        old = previous.vectors[name]
+        new = update.vectors[name]
+        vectors[name] = pd.concat([old[~old['label'].isin(new['label'])], new], ignore_index=True)
+    return PosteriorState(update.category_id, update.last_week_id, previous.n_obs + update.n_obs,
+                          previous.incremental_runs + 1, dict(update.scalars), vectors)
+
+def drift_z(previous, update):
+    """
+    How far the update moved each parameter, in prior standard deviations.
+    Returns a Series of |mean_new - mean_old| / sd_old, largest first.
+    """
+    z = {}
+    for name in SCALAR_PARAMS:
+        mean, sd = previous.scalars[name]
+        z[name] = abs(update.scalars[name][0] - mean) / max(sd, 1e-9)
+    for name in VECTOR_PARAMS:
+        merged = previous.vectors[name].merge(update.vectors[name], on='label', suffixes=('_old', '_new'))
+        shift = (merged['mean_new'] - merged['mean_old']).abs() / merged['sd_old'].clip(lower=1e-9)
+        for label, value in zip(merged['label'], shift):
+            z[f"{name}[{label}]"] = value
+    return pd.Series(z, dtype=float).sort_values(ascending=False)
+
+def write_state(conn, state):
+    """Replace a category's state inside the caller's transaction."""
+    rows = [(name, None, mean, sd) for name, (mean, sd) in state.scalars.items()]
+    for name, table in state.vectors.items():
+        rows += list(zip([name] * len(table), table['label'], table['mean'], table['sd']))
+    df = pd.DataFrame(rows, columns=['param', 'label', 'mean', 'sd'])
+    df['label'] = df['label'].astype('Int64')
+    df.insert(0, 'category_id', state.category_id)
+    df['last_week_id'] = state.last_week_id
+    df['n_obs'] = state.n_obs
+    df['incremental_runs'] = state.incremental_runs
+    conn.execute(text(STATE_DDL))
+    conn.execute(text(f"DELETE FROM {STATE_TABLE} WHERE category_id = :cat"), {"cat": state.category_id})
+    copy_dataframe(conn, df, STATE_TABLE)
+
+def save_state(engine, state):
+    with engine.begin() as conn:
+        write_state(conn, state)
+
+def load_state(engine, category_id):
+    """The stored PosteriorState of a category, or None."""
+    with engine.connect() as conn:
+        if not conn.execute(text("SELECT to_regclass(:t) IS NOT NULL"), {"t": STATE_TABLE}).scalar():
+            return None
+        df = pd.read_sql(text(f"SELECT * FROM {STATE_TABLE} WHERE category_id = :cat"),
+                         conn, params={"cat": category_id})
+    if df.empty:
+        return None
+    scalars = {r.param: (r.mean, r.sd) for r in df[df['label'].isna()].itertuples()}
+    vectors = {
+        name: df.loc[df['param'] == name, ['label', 'mean', 'sd']].astype({'label': np.int64}).reset_index(drop=True)
+        for name in VECTOR_PARAMS
+    }
+    first = df.iloc[0]
+    return PosteriorState(category_id, int(first['last_week_id']), int(first['n_obs']),
+                          int(first['incremental_runs']), scalars, vectors)
+
+def catalog_from_state(state, category_id, upc_ids=None, promo_lift=None):
+    """Catalog rows from the stored beta_price moments (95% interval = mean +/- 1.96 sd)."""
+    table = state.vectors['beta_price']
+    if upc_ids is not None:
+        table = table[table['label'].isin(upc_ids)]
+    return pd.DataFrame({
+        'category_id': category_id,
+        'upc_id': table['label'].to_numpy(),
+        'elasticity': table['mean'].to_numpy(),
+        'ci_lower': (table['mean'] - 1.96 * table['sd']).to_numpy(),
+        'ci_upper': (table['mean'] + 1.96 * table['sd']).to_numpy(),
+        'promo_lift': state.scalars['beta_promo'][0] if promo_lift is None else promo_lift,
+    })
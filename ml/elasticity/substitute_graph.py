@@ -0,0 +1,174 @@
+"""
+Substitute graph: which UPCs of a category compete, as a screening stage
+for the cross-elasticity model.
+
+For every (target, driver) pair the partial correlation of the target's
+log sales with the driver's log price, given the target's own log price, is
+computed over the store-weeks both sold in. Both series are demeaned per
+(store, upc) first, so store size does not count as co-movement. All pair
+statistics come from two store-week x UPC matrix products, so a category
+screens in seconds. A substitute has a positive partial
+correlation (the target sells more when the driver is dearer); the top k per
+target are stored in substitute_graph.
+"""
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sqlalchemy import text
+from pipelines.utils import get_db_engine, ensure_index, copy_dataframe
+from pipelines.panel_cache import load_category_panel, PANEL_TABLE
+
+GRAPH_TABLE = 'substitute_graph'
+
+GRAPH_DDL = f"""
+    CREATE TABLE IF NOT EXISTS {GRAPH_TABLE} (
+        category_id text,
+        upc_id bigint,
+        substitute_upc_id bigint,
+        rank integer,
+        partial_corr double precision,
+        t_stat double precision,
+        n_obs integer,
+        built_at timestamptz DEFAULT now()
+    )
+"""
+
+def sparse_panel(panel):
+    """
+    CSR store-week x UPC matrices of the (store, upc)-demeaned log sales and
+    log prices and the observed mask, plus the UPC labels of the columns.
+    """
+    store_upc = panel.groupby(['store_id', 'upc_id'])
+    q = (panel['log_sales'] - store_upc['log_sales'].transform('mean')).to_numpy(float)
+    p = (panel['log_price'] - store_upc['log_price'].transform('mean')).to_numpy(float)
+
+    upc_code, upc_labels = pd.factorize(panel['upc_id'], sort=True)
+    store_idx, _ = pd.factorize(panel['store_id'], sort=True)
+    week_idx, week_labels = pd.factorize(panel['week_id'], sort=True)
+    row_code, row_keys = pd.factorize(store_idx.astype(np.int64) * len(week_labels) + week_idx)
+    shape = (len(row_keys), len(upc_labels))
+
+    def csr(values):
+        return sparse.csr_matrix((values, (row_code, upc_code)), shape=shape)
+    return csr(q), csr(p), csr(np.ones(len(panel))), np.asarray(upc_labels, dtype=np.int64)
+
+def cross_products(L, R, dense_above=0.05, chunk_rows=4096):
+    """
+    L.T @ R as a dense array. Sparse enough matrices are multiplied as CSR;
+    denser ones are densified a block of store-weeks at a time and
+    accumulated with BLAS, which is much faster than a sparse product there.
+    """
+    density = L.nnz / max(L.shape[0] * L.shape[1], 1)
+    if density < dense_above:
+        return (L.T @ R).toarray()
+    out = np.zeros((L.shape[1], R.shape[1]))
+    for start in range(0, L.shape[0], chunk_rows):
+        rows = slice(start, start + chunk_rows)
+        out += L[rows].toarray().T @ R[rows].toarray()
+    return out
+
+def partial_correlations(Q, P, M):
+    """
+    (partial_corr, n_obs) as dense UPC x UPC arrays, indexed [target, driver]:
+    corr(q_t, p_d | p_t) over the store-weeks where t and d were both observed.
+    """
+    # Pairwise-complete sums: the target-side (left) matrices are zero where the
+    # target is missing, the driver-side (right) ones where the driver is
+    k = Q.shape[1]
+    left = sparse.hstack([Q, P, Q.multiply(P), Q.multiply(Q), P.multiply(P), M], format='csr')
+    by_mask = cross_products(left, M)
+    s_q, s_pt, s_qpt, s_qq, s_ptpt, n = (by_mask[i * k:(i + 1) * k] for i in range(6))
+    # Driver-side sums over the pair's store-weeks are the transposed target-side ones
+    s_pd, s_pdpd = s_pt.T, s_ptpt.T
+    by_price = cross_products(sparse.hstack([Q, P], format='csr'), P)
+    s_qpd, s_ptpd = by_price[:k], by_price[k:]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        def corr(s_ab, s_a, s_b, s_aa, s_bb):
+            cov = s_ab - s_a * s_b / n
+            return cov / np.sqrt((s_aa - s_a ** 2 / n) * (s_bb - s_b ** 2 / n))
+
+        r_q_pd = corr(s_qpd, s_q, s_pd, s_qq, s_pdpd)
+        r_q_pt = corr(s_qpt, s_q, s_pt, s_qq, s_ptpt)
+        r_pt_pd = corr(s_ptpd, s_pt, s_pd, s_ptpt, s_pdpd)
+        partial = (r_q_pd - r_q_pt * r_pt_pd) / np.sqrt((1 - r_q_pt ** 2) * (1 - r_pt_pd ** 2))
+    np.fill_diagonal(partial, np.nan)
+    return partial, n
+
+def top_substitutes(partial, n_obs, upc_labels, k=10, min_overlap=26, min_corr=0.0):
+    """Long-format top-k substitutes per target by partial correlation."""
+    # Self-pairs are NaN; pairs failing a screen sort last and are dropped
+    valid = np.isfinite(partial) & (n_obs >= min_overlap) & (partial > min_corr)
+    score = np.where(valid, partial, -np.inf)
+    k = min(k, score.shape[1] - 1)
+    top = np.argsort(-score, axis=1, kind='stable')[:, :k]
+    targets = np.repeat(np.arange(len(upc_labels)), k)
+    drivers = top.ravel()
+    keep = valid[targets, drivers]
+    targets, drivers = targets[keep], drivers[keep]
+    r = partial[targets, drivers]
+    n = n_obs[targets, drivers]
+    return pd.DataFrame({
+        'upc_id': upc_labels[targets],
+        'substitute_upc_id': upc_labels[drivers],
+        'rank': np.tile(np.arange(1, k + 1), len(upc_labels))[keep],
+        'partial_corr': r,
+        't_stat': r * np.sqrt(np.maximum(n - 3, 0) / (1 - r ** 2)),
+        'n_obs': n.astype(np.int64),
+    })
+
+def build_graph(panel, k=10, min_overlap=26, min_corr=0.0):
+    Q, P, M, upc_labels = sparse_panel(panel)
+    partial, n_obs = partial_correlations(Q, P, M)
+    return top_substitutes(partial, n_obs, upc_labels, k=k, min_overlap=min_overlap, min_corr=min_corr)
+
+def save_graph(engine, graph, category_id):
+    """Replace the category's edges (other categories are kept)."""
+    graph = graph.copy()
+    graph.insert(0, 'category_id', category_id)
+    with engine.begin() as conn:
+        conn.execute(text(GRAPH_DDL))
+        conn.execute(text(f"DELETE FROM {GRAPH_TABLE} WHERE category_id = :cat"), {"cat": category_id})
+        copy_dataframe(conn, graph, GRAPH_TABLE,
+                       columns=['category_id', 'upc_id', 'substitute_upc_id', 'rank', 'partial_corr', 't_stat', 'n_obs'])
+    ensure_index(engine, GRAPH_TABLE, ['category_id', 'upc_id'])
+
+def load_edges(engine, category_id, k=None):
+    """(upc_id, substitute_upc_id) pairs of the stored graph, best first; empty if none."""
+    with engine.connect() as conn:
+        if not conn.execute(text("SELECT to_regclass(:t) IS NOT NULL"), {"t": GRAPH_TABLE}).scalar():
+            return np.empty((0, 2), dtype=np.int64)
+        rows = conn.execute(text(f"""
+            SELECT upc_id, substitute_upc_id FROM {GRAPH_TABLE}
+            WHERE category_id = :cat AND (CAST(:k AS integer) IS NULL OR rank <= :k)
+            ORDER BY upc_id, rank
+        """), {"cat": category_id, "k": k}).fetchall()
+    return np.array(rows, dtype=np.int64).reshape(-1, 2)
+
+def build_substitute_graph(category_id='sdr', k=10, min_overlap=26, min_corr=0.0, save=True):
+    print(f"Building substitute graph for category {category_id}...")
+    engine = get_db_engine()
+    # Every UPC of the category: screening only the top sellers would bias the candidates
+    panel = load_category_panel(category_id, engine, table=PANEL_TABLE)
+    if panel.empty:
+        print(f"No data found for category {category_id}")
+        return None
+
+    start = time.perf_counter()
+    graph = build_graph(panel, k=k, min_overlap=min_overlap, min_corr=min_corr)
+    print(f"Screened {panel['upc_id'].nunique()} UPCs ({len(panel)} rows) in {time.perf_counter() - start:.1f}s: "
+          f"{len(graph)} edges, {graph['upc_id'].nunique()} UPCs with at least one substitute.")
+    if save:
+        save_graph(engine, graph, category_id)
+    return graph
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Screen a category for substitute pairs")
+    parser.add_argument("--category", type=str, default="sdr")
+    parser.add_argument("--k", type=int, default=10, help="Substitutes kept per UPC")
+    parser.add_argument("--min-overlap", type=int, default=26, help="Minimum shared store-weeks per pair")
+    parser.add_argument("--min-corr", type=float, default=0.0, help="Minimum partial correlation")
+    args = parser.parse_args()
+    build_substitute_graph(category_id=args.category, k=args.k, min_overlap=args.min_overlap, min_corr=args.min_corr)
@@ -0,0 +1,174 @@
+"""
+Multi-category elasticity training: python -m ml.elasticity.train_all
+
+Trains every category (or --categories) concurrently, one process per
+category, with the machine's cores split between categories and their
+chains. The catalogs are only written once every category has finished,
+in a single transaction, so the promoted catalog versions never mix old and
+new categories from the same run.
+"""
+import os
+import sys
+import time
+import resource
+import argparse
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pandas as pd
+from pipelines.utils import get_db_engine
+from ml.elasticity.train_model import BACKENDS, LIKELIHOODS, train_elasticity_model
+from ml.elasticity import posterior_state, draw_store, catalog
+
+CATEGORIES = ['sdr', 'cer', 'lnd', 'sna']
+
+def plan_resources(n_categories, total_cores, chains, jobs=None):
+    """
+    (jobs, cores_per_job, sampler_cores, blas_threads).
+
+    jobs categories train at once; each gets cores_per_job cores, runs up to
+    sampler_cores chains in parallel and gives each chain blas_threads threads.
+    """
+    jobs = max(1, min(jobs or n_categories, n_categories, total_cores))
+    cores_per_job = max(1, total_cores // jobs)
+    sampler_cores = max(1, min(chains, cores_per_job))
+    blas_threads = max(1, cores_per_job // sampler_cores)
+    return jobs, cores_per_job, sampler_cores, blas_threads
+
+def _init_worker(memory_limit_bytes):
+    # One connection per job, like the ingest orchestrator
+    os.environ["PIRO_DB_POOL_SIZE"] = "1"
+    os.environ["PIRO_DB_MAX_OVERFLOW"] = "0"
+    if memory_limit_bytes:
+        # Inherited by the sampler's chain processes; the limit applies to each process
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit_bytes, memory_limit_bytes))
+
+def _train_category(category_id, samples, tune, chains, sampler_cores, backend, mode, likelihood):
+    start = time.perf_counter()
+    result = train_elasticity_model(category_id=category_id, samples=samples, tune=tune,
+                                    chains=chains, cores=sampler_cores, save=False, backend=backend, mode=mode,
+                                    likelihood=likelihood)
+    seconds = time.perf_counter() - start
+    if result is None:
+        return None, None, None, seconds
+    catalog_df, diagnostics, state = result
+    return catalog_df, diagnostics, state, seconds
+
+def write_catalogs(engine, catalogs, versions, run_ts, states=None, csv_dir=None, draw_versions=None):
+    """
+    Store and promote the catalog version (and posterior state) of every
+    trained category in one transaction, then publish the per-category CSV
+    artifacts (each via write + rename) and the draw store versions the
+    catalogs came from.
+    """
+    with engine.begin() as conn:
+        for category_id, catalog_df in catalogs.items():
+            catalog.write_catalog(conn, catalog_df, category_id, versions[category_id], run_ts)
+        for state in (states or {}).values():
+            posterior_state.write_state(conn, state)
+    catalog.ensure_catalog_indexes(engine)
+
+    csv_dir = csv_dir or ("/app/ml/elasticity" if os.path.isdir("/app/ml") else os.path.dirname(os.path.abspath(__file__)))
+    for category_id, catalog_df in catalogs.items():
+        path = os.path.join(csv_dir, f"catalog_{category_id}.csv")
+        tmp_path = f"{path}.tmp"
+        catalog_df.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, path)
+
+    for category_id, version in (draw_versions or {}).items():
+        if version:
+            draw_store.publish_version(category_id, version)
+            draw_store.prune(category_id)
+
+def _print_summary(results, wall):
+    print("\n--- Elasticity Training Summary ---")
+    print(f"{'category':<9} {'status':<8} {'fit':<12} {'seconds':>8} {'rows':>10} {'upcs':>5} "
+          f"{'max r_hat':>9} {'min ess':>8} {'div':>5}  error")
+    for cat, (status, seconds, diag, error) in results.items():
+        secs = f"{seconds:.1f}" if seconds is not None else "-"
+        if diag:
+            stats = (f"{diag['mode']:<12} {secs:>8} {diag['n_rows']:>10,} {diag['n_upcs']:>5} {diag['max_r_hat']:>9.3f} "
+                     f"{diag['min_ess_bulk']:>8.0f} {diag['divergences']:>5}")
+        else:
+            stats = f"{'-':<12} {secs:>8} {'-':>10} {'-':>5} {'-':>9} {'-':>8} {'-':>5}"
+        print(f"{cat:<9} {status:<8} {stats}  {error or ''}")
+    print(f"Wall time: {wall:.1f}s")
+
+def train_all(categories=None, samples=1000, tune=1000, chains=4, cores=None, jobs=None,
+              memory_gb=None, allow_partial=False, backend='pymc', mode='full', likelihood='collapsed'):
+    categories = list(categories or CATEGORIES)
+    total_cores = cores or os.cpu_count() or 1
+    jobs, cores_per_job, sampler_cores, blas_threads = plan_resources(
+        len(categories), total_cores, chains, jobs)
+    print(f"Training {len(categories)} categories ({backend}, {mode}), {jobs} at a time: {cores_per_job} cores per category, "
+          f"{sampler_cores} chains in parallel, {blas_threads} BLAS threads per chain.")
+
+    # Set before the workers start so numpy / pytensor in every job see them
+    for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = str(blas_threads)
+    memory_limit = int(memory_gb * (1 << 30)) if memory_gb else None
+
+    run_ts = pd.Timestamp.now(tz='UTC')
+    results = {cat: ("pending", None, None, None) for cat in categories}
+    catalogs, states = {}, {}
+    wall_start = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=mp.get_context("spawn"),
+                             initializer=_init_worker, initargs=(memory_limit,)) as executor:
+        futures = {executor.submit(_train_category, cat, samples, tune, chains, sampler_cores, backend, mode,
+                                   likelihood): cat
+                   for cat in categories}
+        for future in as_completed(futures):
+            cat = futures[future]
+            try:
+                catalog_df, diagnostics, state, seconds = future.result()
+            except Exception as e:
+                results[cat] = ("failed", None, None, f"{type(e).__name__}: {e}")
+                print(f"FAILED  {cat}: {e}")
+                continue
+            if catalog_df is None:
+                results[cat] = ("no data", seconds, None, None)
+                continue
+            results[cat] = ("ok", seconds, diagnostics, None)
+            # No new weeks: the promoted catalog and the stored state stay as they are
+            if diagnostics['mode'] != 'unchanged':
+                catalogs[cat] = catalog_df
+                states[cat] = state
+            print(f"ok      {cat} in {seconds:.1f}s ({diagnostics['mode']}, max r_hat {diagnostics['max_r_hat']:.3f}, "
+                  f"{diagnostics['divergences']} divergences)")
+
+    failed = any(status == "failed" for status, _, _, _ in results.values())
+    if catalogs and (allow_partial or not failed):
+        draw_versions = {cat: results[cat][2].get('draw_version') for cat in catalogs}
+        # The catalog version is the draw store version of the fit it came from
+        versions = {cat: draw_versions[cat] or draw_store.new_version() for cat in catalogs}
+        write_catalogs(get_db_engine(), catalogs, versions, run_ts, states, draw_versions=draw_versions)
+        print(f"Catalogs for {', '.join(sorted(catalogs))} written and promoted in one transaction: "
+              + ", ".join(f"{cat}={versions[cat]}" for cat in sorted(catalogs)))
+    elif failed:
+        print("Some categories failed; no catalogs written (use --allow-partial to write the rest).")
+
+    _print_summary(results, time.perf_counter() - wall_start)
+    return not failed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the elasticity model for several categories in parallel")
+    parser.add_argument("--categories", nargs="+", choices=CATEGORIES, default=None)
+    parser.add_argument("--backend", choices=BACKENDS, default="pymc")
+    parser.add_argument("--mode", choices=["full", "incremental"], default="full")
+    parser.add_argument("--likelihood", choices=LIKELIHOODS, default="collapsed")
+    parser.add_argument("--samples", type=int, default=1000)
+    parser.add_argument("--tune", type=int, default=1000)
+    parser.add_argument("--chains", type=int, default=4)
+    parser.add_argument("--cores", type=int, default=None, help="Total cores to use (default: all)")
+    parser.add_argument("--jobs", type=int, default=None, help="Categories trained at once (default: all)")
+    parser.add_argument("--memory-gb", type=float, default=None,
+                        help="Address-space limit per training process (RLIMIT_AS)")
+    parser.add_argument("--allow-partial", action="store_true",
+                        help="Write the catalogs of the categories that succeeded even if others failed")
+    args = parser.parse_args()
+
+    ok = train_all(categories=args.categories, samples=args.samples, tune=args.tune, chains=args.chains,
+                   cores=args.cores, jobs=args.jobs, memory_gb=args.memory_gb,
+                   allow_partial=args.allow_partial, backend=args.backend, mode=args.mode,
+                   likelihood=args.likelihood)
+    sys.exit(0 if ok else 1)
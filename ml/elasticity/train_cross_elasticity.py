@@ -1,149 +1,258 @@
-import pandas as pd
+"""
+Cross-price elasticity model for the top UPCs of a category:
+
+    log_sales[t] ~ Normal(alpha_upc[t] + alpha_store + beta_own[t] * log_price[t]
+                          + sum over drivers d of t: beta_cross[t, d] * log_price[d], sigma[t])
+
+Only the (target, driver) edges passed in (by default the category's
+substitute_graph, see substitute_graph.py) get a cross elasticity; all
+other pairs are fixed at 0, so the parameter count grows with the number
+of edges rather than N^2.
+Store-weeks are not required to contain every UPC: a target's likelihood
+only uses the store-weeks it sold in, and a driver missing from a
+store-week enters at its mean log price. Fitted with minibatch ADVI.
+"""
+import time
 import numpy as np
+import pandas as pd
 import pymc as pm
+import pytensor.tensor as pt
 import arviz as az
-from sqlalchemy import create_engine
-from pipelines.utils import get_db_engine
+from sqlalchemy import text
+from pipelines.utils import get_db_engine, ensure_index, copy_dataframe
+from pipelines.panel_cache import load_category_panel, PANEL_TABLE
+from ml.elasticity import substitute_graph
 
-def train_cross_elasticity(category_id='sdr'):
-    print(f"Training Cross-Elasticity Model for Category: {category_id}")
-    engine = get_db_engine()
-    
-    # 1. Identify Top 5 UPCs
-    print("Identifying Top 5 UPCs...")
-    top_upc_query = f"""
-        SELECT u.upc_id, u.description 
-        FROM fact_movement_weekly m
-        JOIN dim_upc u USING(upc_id) 
-        WHERE u.category_id = '{category_id}' 
-        GROUP BY 1, 2 
-        ORDER BY SUM(sales_units) DESC 
-        LIMIT 5
+CROSS_TABLE = 'cross_elasticity_matrix'
+
+CROSS_DDL = f"""
+    CREATE TABLE IF NOT EXISTS {CROSS_TABLE} (
+        category_id text,
+        upc_id_target bigint,
+        upc_id_driver bigint,
+        elasticity double precision,
+        ci_lower double precision,
+        ci_upper double precision,
+        is_own_elasticity boolean
+    )
+"""
+
+def top_upcs(panel, n_upcs):
+    """The n_upcs UPCs with the highest revenue in the panel, largest first."""
+    revenue = np.exp(panel['log_price'] + panel['log_sales']).groupby(panel['upc_id']).sum()
+    return revenue.sort_values(ascending=False).index[:n_upcs].to_numpy(np.int64)
+
+def wide_matrices(panel, upc_labels):
+    """
+    Store-week x UPC matrices built from dense indices.
+
+    Returns (X, Y, observed, store_code, store_labels): X the log prices
+    centered per UPC (0 where the UPC did not sell), Y the log sales (0 where
+    missing), observed the mask of store-weeks each UPC sold in, and the
+    store code of each row.
+    """
+    upc_code = pd.Index(upc_labels).get_indexer(panel['upc_id'])
+    panel = panel[upc_code >= 0]
+    upc_code = upc_code[upc_code >= 0]
+
+    store_idx, store_labels = pd.factorize(panel['store_id'], sort=True)
+    week_idx, week_labels = pd.factorize(panel['week_id'], sort=True)
+    row_code, row_keys = pd.factorize(store_idx.astype(np.int64) * len(week_labels) + week_idx, sort=True)
+    n_rows, n_upcs = len(row_keys), len(upc_labels)
+
+    X = np.zeros((n_rows, n_upcs), dtype=np.float32)
+    Y = np.zeros((n_rows, n_upcs), dtype=np.float32)
+    observed = np.zeros((n_rows, n_upcs), dtype=bool)
+    X[row_code, upc_code] = panel['log_price'].to_numpy(np.float32)
+    Y[row_code, upc_code] = panel['log_sales'].to_numpy(np.float32)
+    observed[row_code, upc_code] = True
+
+    counts = observed.sum(axis=0)
+    price_mean = X.sum(axis=0) / np.maximum(counts, 1)
+    X = np.where(observed, X - price_mean, 0.0).astype(np.float32)
+    store_code = (np.asarray(row_keys) // len(week_labels)).astype(np.int64)
+    return X, Y, observed, store_code, np.asarray(store_labels)
+
+def coverage_edges(observed, max_drivers=20, min_overlap=52):
+    """
+    (target, driver) code pairs: for each target, the max_drivers UPCs it
+    shares the most store-weeks with, keeping pairs with at least
+    min_overlap shared store-weeks. max_drivers=None keeps every such pair.
+    """
+    m = observed.astype(np.float32)
+    overlap = m.T @ m
+    np.fill_diagonal(overlap, -1)
+    n = overlap.shape[0]
+    k = n - 1 if max_drivers is None else min(max_drivers, n - 1)
+    drivers = np.argsort(-overlap, axis=1, kind='stable')[:, :k]
+    targets = np.repeat(np.arange(n), k)
+    drivers = drivers.ravel()
+    keep = overlap[targets, drivers] >= min_overlap
+    return np.column_stack([targets[keep], drivers[keep]]).astype(np.int64)
+
+def build_model(X, Y, observed, store_code, upc_labels, store_labels, edges, batch_size=1024):
+    """
+    Vectorized cross-elasticity model over the (target, driver) edges.
+    The masked likelihood is evaluated on minibatches of store-weeks and
+    scaled to the full data.
     """
-    top_upcs = pd.read_sql(top_upc_query, engine)
-    upc_list = top_upcs['upc_id'].tolist()
-    upc_map = {i: u for i, u in enumerate(upc_list)}
-    print(f"Top UPCs: {upc_list}")
-    
-    # 2. Construct Dynamic Pivot Query
-    # We build this dynamically to ensure alignment with upc_list order
-    select_clauses = []
-    for i, upc in enumerate(upc_list):
-        select_clauses.append(f"MAX(CASE WHEN upc_id = {upc} THEN log_price END) as ln_p_{i}")
-        select_clauses.append(f"MAX(CASE WHEN upc_id = {upc} THEN log_sales END) as ln_q_{i}")
-        
-    query = f"""
-        SELECT 
-            week_id,
-            store_id,
-            {', '.join(select_clauses)}
-        FROM elasticity_ready_panel
-        WHERE upc_id IN ({','.join(map(str, upc_list))})
-        GROUP BY 1, 2
-        HAVING COUNT(DISTINCT upc_id) = {len(upc_list)} -- Ensure all products present
+    n_rows, n_upcs = X.shape
+    targets, drivers = edges[:, 0], edges[:, 1]
+    mask = observed.astype(np.float32)
+    coords = {"upc": upc_labels, "store": store_labels, "edge": np.arange(len(edges))}
+
+    with pm.Model(coords=coords) as model:
+        if batch_size and batch_size < n_rows:
+            x, y, m, s = pm.Minibatch(X, Y, mask, store_code, batch_size=batch_size)
+            scale = n_rows / batch_size
+        else:
+            x, y, m, s = X, Y, mask, store_code
+            scale = 1.0
+
+        # Own elasticities, partially pooled
+        mu_own = pm.Normal("mu_own", mu=-2.0, sigma=1.0)
+        sigma_own = pm.HalfNormal("sigma_own", sigma=1.0)
+        beta_own = pm.Normal("beta_own", mu=mu_own, sigma=sigma_own, dims="upc")
+
+        # Cross elasticities, shrunk towards 0
+        sigma_cross = pm.HalfNormal("sigma_cross", sigma=0.5)
+        beta_cross = pm.Normal("beta_cross", mu=0.0, sigma=sigma_cross, dims="edge")
+
+        alpha_upc = pm.Normal("alpha_upc", mu=0.0, sigma=10.0, dims="upc")
+        sigma_store = pm.HalfNormal("sigma_store", sigma=1.0)
+        alpha_store = pm.Normal("alpha_store", mu=0.0, sigma=sigma_store, dims="store")
+        sigma = pm.HalfNormal("sigma", sigma=1.0, dims="upc")
+
+        # Sparse matrix-vector product: gather driver prices, scatter-add into targets
+        cross = pt.inc_subtensor(pt.zeros_like(x)[:, targets], x[:, drivers] * beta_cross)
+        mu = alpha_upc + alpha_store[s][:, None] + beta_own * x + cross
+
+        loglik = pm.logp(pm.Normal.dist(mu=mu, sigma=sigma), y)
+        pm.Potential("loglik", scale * pt.sum(m * loglik))
+    return model
+
+def fit(model, iterations=30000, draws=1000, seed=None):
+    with model:
+        approx = pm.fit(n=iterations, method="advi", random_seed=seed, progressbar=True,
+                        callbacks=[pm.callbacks.CheckParametersConvergence(every=500, diff="absolute",
+                                                                           tolerance=1e-3)])
+        return approx.sample(draws=draws, random_seed=seed)
+
+def extract_matrix(trace, upc_labels, edges, category_id):
+    """Long-format matrix rows: one per UPC (own) and one per edge (cross)."""
+    post = trace.posterior
+    hdi = az.hdi(trace, var_names=["beta_own", "beta_cross"], hdi_prob=0.94)
+    upc_labels = np.asarray(upc_labels, dtype=np.int64)
+    own = pd.DataFrame({
+        'upc_id_target': upc_labels,
+        'upc_id_driver': upc_labels,
+        'elasticity': post['beta_own'].mean(("chain", "draw")).values,
+        'ci_lower': hdi['beta_own'].sel(hdi="lower").values,
+        'ci_upper': hdi['beta_own'].sel(hdi="higher").values,
+        'is_own_elasticity': True,
+    })
+    cross = pd.DataFrame({
+        'upc_id_target': upc_labels[edges[:, 0]],
+        'upc_id_driver': upc_labels[edges[:, 1]],
+        'elasticity': post['beta_cross'].mean(("chain", "draw")).values,
+        'ci_lower': hdi['beta_cross'].sel(hdi="lower").values,
+        'ci_upper': hdi['beta_cross'].sel(hdi="higher").values,
+        'is_own_elasticity': False,
+    })
+    res_df = pd.concat([own, cross], ignore_index=True)
+    res_df.insert(0, 'category_id', category_id)
+    return res_df
+
+def save_matrix(engine, res_df, category_id):
+    """Replace the category's rows (other categories are kept)."""
+    with engine.begin() as conn:
+        conn.execute(text(CROSS_DDL))
+        conn.execute(text(f"DELETE FROM {CROSS_TABLE} WHERE category_id = :cat"), {"cat": category_id})
+        copy_dataframe(conn, res_df, CROSS_TABLE)
+    ensure_index(engine, CROSS_TABLE, ['category_id', 'upc_id_target'])
+
+def train_cross_elasticity(category_id='sdr', n_upcs=300, max_drivers=20, min_overlap=52, edges=None,
+                           edge_source='graph', iterations=30000, batch_size=1024, draws=1000, seed=None,
+                           save=True):
     """
-    
-    print("Fetching data...")
-    df = pd.read_sql(query, engine)
-    print(f"Data Shape: {df.shape}")
-    
-    if len(df) < 50:
+    Fit the cross-elasticity model on the category's top n_upcs UPCs.
+
+    edges: optional (target, driver) upc_id pairs. Otherwise edge_source
+    'graph' uses the top max_drivers substitutes of each target from the
+    stored substitute_graph, and 'coverage' (also the fallback when there is
+    no graph) the max_drivers drivers sharing the most store-weeks.
+    Returns the long-format matrix, or None if there is not enough data.
+    """
+    print(f"Training Cross-Elasticity Model for Category: {category_id}")
+    engine = get_db_engine()
+    # The full panel (every UPC of the category), not the top-N one
+    panel = load_category_panel(category_id, engine, table=PANEL_TABLE)
+    if panel.empty:
+        print(f"No data found for category {category_id}")
+        return None
+
+    upc_labels = top_upcs(panel, n_upcs)
+    if len(upc_labels) < n_upcs:
+        print(f"WARNING: category {category_id} has only {len(upc_labels)} UPCs in {PANEL_TABLE}; "
+              f"fitting those instead of the requested {n_upcs}.")
+    X, Y, observed, store_code, store_labels = wide_matrices(panel, upc_labels)
+    print(f"{len(upc_labels)} UPCs x {len(X)} store-weeks, {observed.mean():.1%} observed.")
+    if len(X) < 50:
         print("Not enough data points for reliable estimation.")
-        return
-
-    # 3. Prepare Data for PyMC
-    # Y: Log Sales (N_samples x 5)
-    # X: Log Prices (N_samples x 5)
-    
-    N_products = len(upc_list)
-    Y_obs = df[[f'ln_q_{i}' for i in range(N_products)]].values
-    X_obs = df[[f'ln_p_{i}' for i in range(N_products)]].values
-    
-    # Normalize X for better convergence
-    X_mean = X_obs.mean(axis=0)
-    X_centered = X_obs - X_mean
-    
+        return None
+
+    if edges is None and edge_source == 'graph':
+        edges = substitute_graph.load_edges(engine, category_id, k=max_drivers)
+        if len(edges) == 0:
+            print("No substitute graph for this category; choosing drivers by coverage.")
+            edges = None
+    if edges is None:
+        edge_codes = coverage_edges(observed, max_drivers, min_overlap)
+    else:
+        edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+        edge_codes = np.column_stack([pd.Index(upc_labels).get_indexer(edges[:, 0]),
+                                      pd.Index(upc_labels).get_indexer(edges[:, 1])])
+        edge_codes = edge_codes[(edge_codes >= 0).all(axis=1) & (edge_codes[:, 0] != edge_codes[:, 1])]
+    print(f"{len(edge_codes)} cross-elasticity edges ({len(edge_codes) / max(len(upc_labels), 1):.1f} drivers per UPC).")
+
     print("Building PyMC Model...")
-    with pm.Model() as model:
-        # Priors
-        # Alpha (Intercepts): 5 vector
-        alpha = pm.Normal('alpha', mu=0, sigma=10, shape=N_products)
-        
-        # Beta Matrix (Elasticities): 5x5 matrix
-        # We can model this as a flattened vector or matrix
-        # Priors: Diagonal (Own) ~ Normal(-2, 1), Off-Diagonal (Cross) ~ Normal(0, 1)
-        
-        beta_list = []
-        for i in range(N_products):
-            row = []
-            for j in range(N_products):
-                if i == j:
-                    # Own elasticity
-                    b = pm.Normal(f'beta_{i}_{j}', mu=-2.0, sigma=1.0)
-                else:
-                    # Cross elasticity
-                    b = pm.Normal(f'beta_{i}_{j}', mu=0.0, sigma=1.0)
-                row.append(b)
-            beta_list.append(row)
-        
-        # Convert list of lists to tensor
-        B = pm.math.stack([pm.math.stack(row) for row in beta_list])
-        
-        # Expected Log Sales
-        # mu = alpha + B @ X
-        # Shape: (5,) + (5x5) @ (5,)
-        # We process in batches: (N, 5)
-        
-        # mu = alpha + X @ B.T
-        mu = alpha + pm.math.dot(X_centered, B.T)
-        
-        # Likelihood
-        sigma = pm.HalfNormal('sigma', sigma=1, shape=N_products)
-        
-        # MvNormal is traditional for systems of demand, but independent Normal is often sufficient log-log
-        # unless errors are correlated (e.g., category shock). Let's use independent for robustness speed
-        
-        Y_est = pm.Normal('Y_obs', mu=mu, sigma=sigma, observed=Y_obs)
-        
-        # Sampling
-        print("Fitting ADVI...")
-        with model:
-            approx = pm.fit(n=5000, method='advi', progressbar=True)
-            trace = approx.sample(draws=1000)
-        
-    # 4. Extract Results
+    model = build_model(X, Y, observed, store_code, upc_labels, store_labels, edge_codes, batch_size=batch_size)
+    print(f"Fitting minibatch ADVI ({iterations} iterations, batch {batch_size})...")
+    start = time.perf_counter()
+    trace = fit(model, iterations=iterations, draws=draws, seed=seed)
+    print(f"Fitted in {time.perf_counter() - start:.0f}s.")
+
     print("Extracting Matrix...")
-    summary = az.summary(trace, var_names=['beta_.*'], filter_vars="regex")
-    
-    results = []
-    for i in range(N_products):
-        for j in range(N_products):
-            var_name = f"beta_{i}_{j}"
-            mean_val = summary.loc[var_name, 'mean']
-            ci_lower = summary.loc[var_name, 'hdi_3%']
-            ci_upper = summary.loc[var_name, 'hdi_97%']
-            
-            results.append({
-                'category_id': category_id,
-                'upc_id_target': upc_map[i],
-                'upc_id_driver': upc_map[j],
-                'elasticity': mean_val,
-                'ci_lower': ci_lower,
-                'ci_upper': ci_upper,
-                'is_own_elasticity': (i == j)
-            })
-            
-    # 5. Save to DB
-    res_df = pd.DataFrame(results)
-    res_df.to_sql('cross_elasticity_matrix', engine, if_exists='replace', index=False)
-    
-    print("Cross-Elasticity Matrix Saved:")
-    print(res_df.pivot(index='upc_id_target', columns='upc_id_driver', values='elasticity'))
+    res_df = extract_matrix(trace, upc_labels, edge_codes, category_id)
+    if save:
+        save_matrix(engine, res_df, category_id)
+
+    own = res_df[res_df['is_own_elasticity']]
+    cross = res_df[~res_df['is_own_elasticity']]
+    credible = (cross['ci_lower'] > 0) | (cross['ci_upper'] < 0)
+    print(f"Cross-Elasticity Matrix Saved: mean own elasticity {own['elasticity'].mean():.2f}, "
+          f"{credible.sum()} of {len(cross)} cross elasticities credibly non-zero.")
+    print("Strongest substitutes:")
+    print(cross.nlargest(10, 'elasticity')[['upc_id_target', 'upc_id_driver', 'elasticity', 'ci_lower', 'ci_upper']])
+    return res_df
 
 if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser()
     parser.add_argument("--category", type=str, default="sdr")
+    parser.add_argument("--n-upcs", type=int, default=300, help="Top UPCs by revenue to include")
+    parser.add_argument("--max-drivers", type=int, default=20,
+                        help="Cross elasticities estimated per target UPC (0: every sufficiently covered pair)")
+    parser.add_argument("--edges", choices=["graph", "coverage"], default="graph",
+                        help="graph: substitutes from substitute_graph, coverage: most shared store-weeks")
+    parser.add_argument("--min-overlap", type=int, default=52,
+                        help="Minimum shared store-weeks for a (target, driver) pair")
+    parser.add_argument("--iterations", type=int, default=30000)
+    parser.add_argument("--batch-size", type=int, default=1024)
+    parser.add_argument("--draws", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=None)
     args = parser.parse_args()
-    
-    train_cross_elasticity(category_id=args.category)
+
+    train_cross_elasticity(category_id=args.category, n_upcs=args.n_upcs, max_drivers=args.max_drivers or None,
+                           min_overlap=args.min_overlap, edge_source=args.edges, iterations=args.iterations, batch_size=args.batch_size,
+                           draws=args.draws, seed=args.seed)
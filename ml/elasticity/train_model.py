@@ -1,4 +1,6 @@
 import os
+import json
+import time
 import pandas as pd
 import numpy as np
 import pymc as pm
@@ -7,84 +9,296 @@ import mlflow
 import argparse
 from sqlalchemy import create_engine
 from pipelines.utils import get_db_engine
+from pipelines.panel_cache import load_category_panel
+from ml.elasticity import posterior_state, draw_store, catalog
+from ml.stats.ols_moments import moments_from_frame, moment_column
 
 # Improve PyMC performance
 import pytensor.tensor as pt
 
-def train_elasticity_model(category_id='sdr', samples=50, tune=50):
-    print(f"Starting Elasticity Training for Category: {category_id}")
-    
-    # MLflow Setup - Robustness
-    use_mlflow = False
-    
-    # 1. Load Data
-    engine = get_db_engine()
-    query = f"""
-        select * from elasticity_ready_panel 
-        where category_id = '{category_id}'
+# NUTS implementations, all driven through pm.sample(nuts_sampler=...)
+NUTS_BACKENDS = ['pymc', 'nutpie', 'numpyro', 'blackjax']
+# Variational approximations; draws come from the fitted approximation
+VI_BACKENDS = ['advi', 'pathfinder']
+BACKENDS = NUTS_BACKENDS + VI_BACKENDS
+
+# 'rows': one likelihood term per observation. 'collapsed': the same Gaussian
+# likelihood evaluated from per-(store, upc) sufficient statistics.
+LIKELIHOODS = ['collapsed', 'rows']
+LIKELIHOOD_VARS = ['log_price', 'is_promo', 'log_sales']
+
+BENCHMARK_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                             "benchmarks", "results")
+
+def pair_moments(df, store_labels, upc_labels):
     """
-    print("Fetching data from Postgres...")
-    df = pd.read_sql(query, engine)
-    
-    if df.empty:
-        print(f"No data found for category {category_id}")
-        return
+    Per-(store, upc) count, sums and cross-products of log_price, is_promo and
+    log_sales, with the pair's store / upc codes.
+    """
+    moments = moments_from_frame(df, ['store_id', 'upc_id'], variables=LIKELIHOOD_VARS)
+    moments['store_code'] = pd.Index(store_labels).get_indexer(moments['store_id'])
+    moments['upc_code'] = pd.Index(upc_labels).get_indexer(moments['upc_id'])
+    return moments
 
-    print(f"Loaded {len(df)} rows. Unique UPCs: {df['upc_id'].nunique()}. Unique Stores: {df['store_id'].nunique()}")
+def collapsed_loglik(moments, alpha_store, beta_price, beta_promo, sigma_y):
+    """
+    Exact Gaussian log-likelihood of
+        log_sales ~ Normal(alpha_store + beta_price * log_price + beta_promo * is_promo, sigma_y)
+    summed over all rows, from the per-pair moments. With a, b, c the pair's
+    intercept, slope and promo effect, its residual sum of squares is
+        Syy - 2(a Sy + b Sxy + c Spy) + n a^2 + b^2 Sxx + c^2 Spp + 2ab Sx + 2ac Sp + 2bc Sxp
+    so the cost scales with the number of pairs, not rows.
+    """
+    col = lambda a, b: moments[moment_column(a, b)].to_numpy(float)
+    n = moments['n_obs'].to_numpy(float)
+    s_x, s_p, s_y = (moments[f"sum_{v}"].to_numpy(float) for v in LIKELIHOOD_VARS)
+    s_xx, s_pp, s_yy = col('log_price', 'log_price'), col('is_promo', 'is_promo'), col('log_sales', 'log_sales')
+    s_xp, s_xy, s_py = col('log_price', 'is_promo'), col('log_price', 'log_sales'), col('is_promo', 'log_sales')
+
+    a = alpha_store[moments['store_code'].to_numpy()]
+    b = beta_price[moments['upc_code'].to_numpy()]
+    c = beta_promo
+    rss = (s_yy - 2 * (a * s_y + b * s_xy + c * s_py)
+           + n * a ** 2 + b ** 2 * s_xx + c ** 2 * s_pp
+           + 2 * (a * b * s_x + a * c * s_p + b * c * s_xp))
+    n_total = float(n.sum())
+    return -0.5 * n_total * np.log(2 * np.pi) - n_total * pt.log(sigma_y) - pt.sum(rss) / (2 * sigma_y ** 2)
+
+def build_model(df, prior=None, prior_scale=1.0, likelihood='collapsed'):
+    """
+    Hierarchical log-log demand model. Returns (model, store_labels, upc_labels).
+
+    prior: a posterior_state.PosteriorState from an earlier fit. Its moments
+    become the priors (sd widened by prior_scale); UPCs and stores it has not
+    seen fall back to the hierarchical priors.
+    likelihood: one of LIKELIHOODS; both give the same posterior.
+    """
+    if likelihood not in LIKELIHOODS:
+        raise ValueError(f"Unknown likelihood: {likelihood}")
 
-    # 2. Preprocessing
     # Label Encode IDs for Indexing
     store_idx, store_labels = pd.factorize(df['store_id'])
     upc_idx, upc_labels = pd.factorize(df['upc_id'])
-    
-    n_stores = len(store_labels)
-    n_upcs = len(upc_labels)
-    
+
     coords = {
         "store": store_labels,
         "upc": upc_labels,
-        "obs_id": np.arange(len(df))
     }
+    if likelihood == 'rows':
+        coords["obs_id"] = np.arange(len(df))
+    else:
+        moments = pair_moments(df, store_labels, upc_labels)
+        print(f"Collapsed likelihood: {len(df)} rows -> {len(moments)} (store, upc) pairs.")
 
-    # 3. PyMC Model Definition
-    print("Building Hierarchical Model...")
     with pm.Model(coords=coords) as model:
-        # Data Containers
+        if likelihood == 'rows':
+            # Data Containers
+            try:
+                 log_price = pm.Data("log_price", df['log_price'].values, dims="obs_id")
+                 is_promo = pm.Data("is_promo", df['is_promo'].values, dims="obs_id")
+                 log_sales_obs = pm.Data("log_sales_obs", df['log_sales'].values, dims="obs_id")
+            except:
+                 log_price = pm.Data("log_price", df['log_price'].values)
+                 is_promo = pm.Data("is_promo", df['is_promo'].values)
+                 log_sales_obs = pm.Data("log_sales_obs", df['log_sales'].values)
+
+        if prior is None:
+            # Hyperpriors
+            mu_elasticity = pm.Normal("mu_elasticity", mu=-2.0, sigma=1.0)
+            sigma_elasticity = pm.HalfNormal("sigma_elasticity", sigma=1.0)
+
+            # UPC-level Elasticity
+            beta_price = pm.Normal("beta_price", mu=mu_elasticity, sigma=sigma_elasticity, dims="upc")
+
+            # Store-level Intercepts
+            sigma_alpha = pm.HalfNormal("sigma_alpha", sigma=1.0)
+            alpha_store = pm.Normal("alpha_store", mu=0, sigma=sigma_alpha, dims="store")
+
+            # Promo Effect
+            beta_promo = pm.Normal("beta_promo", mu=0.5, sigma=0.5)
+
+            # Likelihood noise
+            sigma_y = pm.HalfNormal("sigma_y", sigma=1.0)
+        else:
+            # Warm start: the previous posterior, moment-matched, is the prior
+            mu_elasticity = pm.Normal("mu_elasticity", **prior.scalar_prior("mu_elasticity", prior_scale))
+            sigma_elasticity = pm.LogNormal("sigma_elasticity", **prior.scalar_prior("sigma_elasticity", prior_scale))
+            sigma_alpha = pm.LogNormal("sigma_alpha", **prior.scalar_prior("sigma_alpha", prior_scale))
+            beta_promo = pm.Normal("beta_promo", **prior.scalar_prior("beta_promo", prior_scale))
+            sigma_y = pm.LogNormal("sigma_y", **prior.scalar_prior("sigma_y", prior_scale))
+
+            # Non-centered, so known and new labels share one vector
+            b_mean, b_sd, b_known = prior.vector_prior("beta_price", upc_labels, prior_scale)
+            z_price = pm.Normal("z_price", mu=0, sigma=1, dims="upc")
+            beta_price = pm.Deterministic("beta_price", pt.where(
+                b_known, b_mean + b_sd * z_price, mu_elasticity + sigma_elasticity * z_price), dims="upc")
+
+            a_mean, a_sd, a_known = prior.vector_prior("alpha_store", store_labels, prior_scale)
+            z_store = pm.Normal("z_store", mu=0, sigma=1, dims="store")
+            alpha_store = pm.Deterministic("alpha_store", pt.where(
+                a_known, a_mean + a_sd * z_store, sigma_alpha * z_store), dims="store")
+
+        if likelihood == 'rows':
+            # Model Mean
+            mu = alpha_store[store_idx] + beta_price[upc_idx] * log_price + beta_promo * is_promo
+
+            # Likelihood
+            pm.Normal("g", mu=mu, sigma=sigma_y, observed=log_sales_obs, dims="obs_id")
+        else:
+            pm.Potential("g", collapsed_loglik(moments, alpha_store, beta_price, beta_promo, sigma_y))
+
+    return model, store_labels, upc_labels
+
+def _pathfinder():
+    # Pathfinder lives in pymc-extras (formerly pymc-experimental)
+    try:
+        import pymc_extras as pmx
+    except ImportError:
         try:
-             log_price = pm.Data("log_price", df['log_price'].values, dims="obs_id")
-             is_promo = pm.Data("is_promo", df['is_promo'].values, dims="obs_id")
-             log_sales_obs = pm.Data("log_sales_obs", df['log_sales'].values, dims="obs_id")
-        except:
-             log_price = pm.Data("log_price", df['log_price'].values)
-             is_promo = pm.Data("is_promo", df['is_promo'].values)
-             log_sales_obs = pm.Data("log_sales_obs", df['log_sales'].values)
-        
-        # Hyperpriors
-        mu_elasticity = pm.Normal("mu_elasticity", mu=-2.0, sigma=1.0)
-        sigma_elasticity = pm.HalfNormal("sigma_elasticity", sigma=1.0)
-        
-        # UPC-level Elasticity
-        beta_price = pm.Normal("beta_price", mu=mu_elasticity, sigma=sigma_elasticity, dims="upc")
-        
-        # Store-level Intercepts
-        sigma_alpha = pm.HalfNormal("sigma_alpha", sigma=1.0)
-        alpha_store = pm.Normal("alpha_store", mu=0, sigma=sigma_alpha, dims="store")
-        
-        # Promo Effect
-        beta_promo = pm.Normal("beta_promo", mu=0.5, sigma=0.5)
-        
-        # Model Mean
-        mu = alpha_store[store_idx] + beta_price[upc_idx] * log_price + beta_promo * is_promo
-        
-        # Likelihood noise
-        sigma_y = pm.HalfNormal("sigma_y", sigma=1.0)
-        
-        # Likelihood
-        pm.Normal("g", mu=mu, sigma=sigma_y, observed=log_sales_obs, dims="obs_id")
-
-    # 4. Sampling
-    print(f"Sampling {samples} draws...")
-    
+            import pymc_experimental as pmx
+        except ImportError:
+            raise RuntimeError("backend='pathfinder' needs the pymc-extras package.")
+    return pmx
+
+def fit(model, backend='pymc', draws=1000, tune=1000, chains=4, cores=4, vi_iterations=30000, seed=None):
+    """Posterior draws as InferenceData from one of BACKENDS."""
+    with model:
+        if backend in NUTS_BACKENDS:
+            return pm.sample(draws, tune=tune, target_accept=0.9, chains=chains, cores=cores,
+                             nuts_sampler=backend, random_seed=seed)
+        if backend == 'advi':
+            approx = pm.fit(n=vi_iterations, method='advi', random_seed=seed, progressbar=False)
+            return approx.sample(draws, random_seed=seed)
+        if backend == 'pathfinder':
+            return _pathfinder().fit(method='pathfinder', num_draws=draws, random_seed=seed)
+    raise ValueError(f"Unknown backend: {backend}")
+
+def diagnostics(trace, n_rows, n_upcs, n_stores):
+    summary = az.summary(trace, var_names=["mu_elasticity", "beta_promo", "beta_price"])
+    print(summary.head())
+    stats = getattr(trace, "sample_stats", None)
+    divergences = int(stats["diverging"].sum()) if stats is not None and "diverging" in stats else 0
+    return {
+        "n_rows": n_rows,
+        "n_upcs": n_upcs,
+        "n_stores": n_stores,
+        "max_r_hat": float(summary["r_hat"].max()),
+        "min_ess_bulk": float(summary["ess_bulk"].min()),
+        "divergences": divergences,
+    }
+
+def extract_catalog(trace, upc_labels, category_id):
+    # Calculate HDI on original trace (with chain/draw dims)
+    beta_price_hdi = az.hdi(trace.posterior["beta_price"], hdi_prob=0.95)
+
+    # Calculate Means on stacked
+    posterior_stacked = trace.posterior.stack(draws=("chain", "draw"))
+    beta_price_means = posterior_stacked["beta_price"].mean(dim="draws").values
+    beta_promo_mean = float(posterior_stacked["beta_promo"].mean(dim="draws").values)
+
+    catalog_rows = []
+    for i, label in enumerate(upc_labels):
+        # HDI is a Dataset. We need the DataArray "beta_price"
+        # .sel(hdi="lower") could be "lower" or "higher"
+        # Use .item() to get scalar
+        try:
+            da = beta_price_hdi["beta_price"]
+            lower = da.isel(upc=i).sel(hdi="lower").values.item()
+            upper = da.isel(upc=i).sel(hdi="higher").values.item()
+        except Exception as e:
+            print(f"Error extracting HDI for {label}: {e}")
+            lower, upper = 0.0, 0.0
+
+        catalog_rows.append({
+            "category_id": category_id,
+            "upc_id": label,
+            "elasticity": float(beta_price_means[i]),
+            "ci_lower": lower,
+            "ci_upper": upper,
+            "promo_lift": beta_promo_mean
+        })
+
+    return pd.DataFrame(catalog_rows)
+
+def save_catalog(engine, catalog_df, category_id, model_version, run_ts, use_mlflow=False):
+    # Save to Postgres as a new version and promote it
+    with engine.begin() as conn:
+        catalog.write_catalog(conn, catalog_df, category_id, model_version, run_ts)
+    catalog.ensure_catalog_indexes(engine)
+    print(f"Catalog version {model_version} saved to Postgres and promoted.")
+
+    # Save Artifact
+    csv_path = f"/app/ml/elasticity/catalog_{category_id}.csv"
+    catalog_df.to_csv(csv_path, index=False)
+    if use_mlflow:
+        try:
+            mlflow.log_artifact(csv_path)
+        except: pass
+
+def _fit_panel(df, prior, prior_scale, backend, samples, tune, chains, cores, seed, likelihood):
+    print("Building Hierarchical Model" + (" (warm start)..." if prior is not None else "..."))
+    model, store_labels, upc_labels = build_model(df, prior=prior, prior_scale=prior_scale, likelihood=likelihood)
+    print(f"Sampling {samples} draws on {len(df)} rows...")
+    trace = fit(model, backend=backend, draws=samples, tune=tune, chains=chains, cores=cores, seed=seed)
+    print("Calculating Diagnostics...")
+    diag = diagnostics(trace, len(df), len(upc_labels), len(store_labels))
+    return trace, store_labels, upc_labels, diag
+
+def train_elasticity_model(category_id='sdr', samples=1000, tune=1000, chains=4, cores=4, save=True,
+                           backend='pymc', seed=None, mode='full', drift_threshold=4.0,
+                           max_incremental_runs=12, prior_scale=1.0, likelihood='collapsed'):
+    """
+    Fit the hierarchical elasticity model for one category.
+
+    mode='incremental' warm-starts from elasticity_posterior_state: the stored
+    posterior (moment-matched) is the prior and only the weeks after its
+    last_week_id are fitted. It falls back to a full refit when there is no
+    state, after max_incremental_runs incremental runs in a row, or when the
+    update moves any parameter by more than drift_threshold prior sds.
+
+    The posterior draws are written to the draw store (ml/elasticity/draw_store.py)
+    as a new version; diagnostics['draw_version'] names it.
+
+    Returns (catalog_df, diagnostics, state), or None if the category has no
+    data. save=False leaves persisting the catalog and state, and publishing
+    the draw version, to the caller (see train_all).
+    """
+    print(f"Starting Elasticity Training for Category: {category_id} (backend={backend}, mode={mode})")
+    run_ts = pd.Timestamp.now(tz='UTC')
+
+    # MLflow Setup - Robustness
+    use_mlflow = False
+
+    # 1. Load Data
+    engine = get_db_engine()
+    print("Fetching panel (Postgres or local panel cache)...")
+    df = load_category_panel(category_id, engine)
+
+    if df.empty:
+        print(f"No data found for category {category_id}")
+        return None
+
+    print(f"Loaded {len(df)} rows. Unique UPCs: {df['upc_id'].nunique()}. Unique Stores: {df['store_id'].nunique()}")
+    last_week = int(df['week_id'].max())
+
+    # 2. Warm start?
+    prior = None
+    if mode == 'incremental':
+        prior = posterior_state.load_state(engine, category_id)
+        if prior is None:
+            print("No stored posterior state; running a full refit.")
+        elif prior.incremental_runs >= max_incremental_runs:
+            print(f"{prior.incremental_runs} incremental runs since the last full fit; running a full refit.")
+            prior = None
+
+    fit_df = df if prior is None else df[df['week_id'] > prior.last_week_id]
+    if prior is not None and fit_df.empty:
+        print(f"No new weeks since week {prior.last_week_id}; catalog unchanged.")
+        diag = {"n_rows": 0, "n_upcs": 0, "n_stores": 0, "max_r_hat": float("nan"),
+                "min_ess_bulk": float("nan"), "divergences": 0, "mode": "unchanged"}
+        diag["draw_version"] = draw_store.latest_version(category_id)
+        return posterior_state.catalog_from_state(prior, category_id), diag, prior
+
     # Conditional MLflow Context
     if use_mlflow:
         try:
@@ -99,72 +313,181 @@ def train_elasticity_model(category_id='sdr', samples=50, tune=50):
         if use_mlflow:
             try:
                 mlflow.log_param("category_id", category_id)
-                mlflow.log_param("n_upcs", n_upcs)
+                mlflow.log_param("n_upcs", df['upc_id'].nunique())
+                mlflow.log_param("backend", backend)
+                mlflow.log_param("mode", mode)
+                mlflow.log_param("likelihood", likelihood)
             except: pass
-        
-        with model:
-            trace = pm.sample(samples, tune=tune, target_accept=0.9, chains=2, cores=2)
-            
-        # 5. Diagnostics
-        print("Calculating Diagnostics...")
-        summary = az.summary(trace, var_names=["mu_elasticity", "beta_promo", "beta_price"])
-        print(summary.head())
-        
+
+        # 3. Sampling
+        sample_args = dict(backend=backend, samples=samples, tune=tune, chains=chains, cores=cores, seed=seed,
+                           likelihood=likelihood)
+        trace, store_labels, upc_labels, diag = _fit_panel(fit_df, prior, prior_scale, **sample_args)
+
+        # 4. Posterior state for the next run (+ drift check on warm starts)
+        if prior is None:
+            state = posterior_state.summarize(trace, category_id, store_labels, upc_labels, last_week, len(df))
+            diag["mode"] = "full"
+        else:
+            update = posterior_state.summarize(trace, category_id, store_labels, upc_labels, last_week, len(fit_df))
+            drift = posterior_state.drift_z(prior, update)
+            diag["max_drift_z"] = float(drift.iloc[0])
+            if drift.iloc[0] > drift_threshold:
+                print(f"Drift: {drift.index[0]} moved {drift.iloc[0]:.1f} prior sds (> {drift_threshold}); "
+                      "running a full refit.")
+                print(drift.head())
+                trace, store_labels, upc_labels, diag = _fit_panel(df, None, prior_scale, **sample_args)
+                state = posterior_state.summarize(trace, category_id, store_labels, upc_labels, last_week, len(df))
+                diag["mode"] = "full (drift)"
+            else:
+                state = posterior_state.merge(prior, update)
+                diag["mode"] = "incremental"
+
         if use_mlflow:
             try:
-                mlflow.log_metric("mu_elasticity_mean", summary.loc['mu_elasticity', 'mean'])
+                mlflow.log_metric("max_r_hat", diag["max_r_hat"])
             except: pass
-        
-        # 6. Extract Catalog & Save
+
+        # 5. Extract Catalog & Save
         print("Generating Elasticity Catalog...")
-        
-        # Calculate HDI on original trace (with chain/draw dims)
-        beta_price_hdi = az.hdi(trace.posterior["beta_price"], hdi_prob=0.95)
-        
-        # Calculate Means on stacked
-        posterior_stacked = trace.posterior.stack(draws=("chain", "draw"))
-        beta_price_means = posterior_stacked["beta_price"].mean(dim="draws").values
-        beta_promo_mean = float(posterior_stacked["beta_promo"].mean(dim="draws").values)
-
-        catalog_rows = []
-        for i, label in enumerate(upc_labels):
-            # HDI is a Dataset. We need the DataArray "beta_price"
-            # .sel(hdi="lower") could be "lower" or "higher"
-            # Use .item() to get scalar
-            try:
-                da = beta_price_hdi["beta_price"]
-                lower = da.isel(upc=i).sel(hdi="lower").values.item()
-                upper = da.isel(upc=i).sel(hdi="higher").values.item()
-            except Exception as e:
-                print(f"Error extracting HDI for {label}: {e}")
-                lower, upper = 0.0, 0.0
-            
-            catalog_rows.append({
-                "category_id": category_id,
-                "upc_id": label,
-                "elasticity": float(beta_price_means[i]),
-                "ci_lower": lower,
-                "ci_upper": upper,
-                "promo_lift": beta_promo_mean
-            })
-            
-        catalog_df = pd.DataFrame(catalog_rows)
-        
-        # Save to Postgres
-        catalog_df.to_sql('elasticity_catalog', engine, if_exists='append', index=False)
-        print("Catalog saved to Postgres.")
-        
-        # Save Artifact
-        csv_path = f"/app/ml/elasticity/catalog_{category_id}.csv"
-        catalog_df.to_csv(csv_path, index=False)
-        if use_mlflow:
-            try:
-                mlflow.log_artifact(csv_path)
-            except: pass
+        catalog_df = extract_catalog(trace, upc_labels, category_id)
+        if diag["mode"] == "incremental":
+            # UPCs without new weeks keep their stored posterior
+            known = state.vectors['beta_price']['label']
+            unchanged = known[~known.isin(np.asarray(upc_labels, dtype=np.int64))]
+            catalog_df = pd.concat([
+                catalog_df,
+                posterior_state.catalog_from_state(state, category_id, upc_ids=unchanged,
+                                                   promo_lift=catalog_df['promo_lift'].iloc[0]),
+            ], ignore_index=True)
+
+        # 6. Posterior draws for risk-adjusted consumers (published with the catalog)
+        draws = draw_store.draws_from_trace(trace, upc_labels, store_labels)
+        if diag["mode"] == "incremental":
+            draws = draw_store.fill_from_state(draws, state, seed=seed)
+        diag["draw_version"] = draw_store.write_draws(category_id, draws, publish=False,
+                                                      metadata={"backend": backend, "mode": diag["mode"],
+                                                                "likelihood": likelihood, "last_week_id": last_week})
+        print(f"Posterior draws written to the draw store as version {diag['draw_version']}")
+
+        if save:
+            save_catalog(engine, catalog_df, category_id, diag["draw_version"], run_ts, use_mlflow=use_mlflow)
+            posterior_state.save_state(engine, state)
+            draw_store.publish_version(category_id, diag["draw_version"])
+
+        return catalog_df, diag, state
+
+def compare_catalogs(reference, other):
+    """Elasticity differences of `other` against `reference`, matched on upc_id."""
+    merged = reference.merge(other, on="upc_id", suffixes=("_ref", "_other"))
+    diff = merged["elasticity_other"] - merged["elasticity_ref"]
+    width_ref = merged["ci_upper_ref"] - merged["ci_lower_ref"]
+    width_other = merged["ci_upper_other"] - merged["ci_lower_other"]
+    inside = (merged["elasticity_other"] >= merged["ci_lower_ref"]) & (merged["elasticity_other"] <= merged["ci_upper_ref"])
+    return {
+        "n_upcs": int(len(merged)),
+        "mean_abs_diff": float(diff.abs().mean()),
+        "max_abs_diff": float(diff.abs().max()),
+        "corr": float(merged["elasticity_ref"].corr(merged["elasticity_other"])),
+        "ci_width_ratio": float((width_other / width_ref.replace(0, np.nan)).median()),
+        "share_inside_ref_ci": float(inside.mean()),
+    }
+
+def benchmark_backends(category_id='sdr', backends=None, samples=1000, tune=1000, chains=4, cores=4, seed=42,
+                       likelihood='collapsed'):
+    """
+    Fit every backend on the same panel. NUTS backends are reported by
+    effective samples per second and convergence; VI backends draw
+    independent samples from an approximation, so ESS and r_hat say nothing
+    about them and they are reported by wall time and catalog agreement with
+    the first NUTS backend (the first backend if none ran).
+    """
+    backends = backends or BACKENDS
+    df = load_category_panel(category_id)
+    if df.empty:
+        print(f"No data found for category {category_id}")
+        return None
+
+    results, catalogs = {}, {}
+    for backend in backends:
+        print(f"\n=== {backend} ===")
+        model, store_labels, upc_labels = build_model(df, likelihood=likelihood)
+        start = time.perf_counter()
+        try:
+            trace = fit(model, backend=backend, draws=samples, tune=tune, chains=chains, cores=cores, seed=seed)
+        except Exception as e:
+            print(f"{backend} failed: {type(e).__name__}: {e}")
+            results[backend] = {"error": f"{type(e).__name__}: {e}"}
+            continue
+        seconds = time.perf_counter() - start
+        catalogs[backend] = extract_catalog(trace, upc_labels, category_id)
+        if backend in NUTS_BACKENDS:
+            diag = diagnostics(trace, len(df), len(upc_labels), len(store_labels))
+            results[backend] = {**diag, "seconds": seconds, "min_ess_per_sec": diag["min_ess_bulk"] / seconds}
+        else:
+            results[backend] = {"n_rows": len(df), "n_upcs": len(upc_labels), "n_stores": len(store_labels),
+                                "seconds": seconds}
+
+    reference = next((b for b in catalogs if b in NUTS_BACKENDS), next(iter(catalogs), None))
+    for backend, catalog_df in catalogs.items():
+        if backend != reference:
+            results[backend]["vs_" + reference] = compare_catalogs(catalogs[reference], catalog_df)
+
+    print(f"\n{'MCMC':<11} {'seconds':>8} {'min ess':>8} {'ess/s':>8} {'r_hat':>6} {'div':>5} "
+          f"{'|d elas|':>9} {'corr':>6}")
+    for backend, res in results.items():
+        if backend not in NUTS_BACKENDS:
+            continue
+        if "error" in res:
+            print(f"{backend:<11} failed: {res['error']}")
+            continue
+        cmp = res.get("vs_" + reference, {})
+        print(f"{backend:<11} {res['seconds']:>8.1f} {res['min_ess_bulk']:>8.0f} {res['min_ess_per_sec']:>8.2f} "
+              f"{res['max_r_hat']:>6.3f} {res['divergences']:>5} "
+              f"{cmp.get('mean_abs_diff', 0.0):>9.4f} {cmp.get('corr', 1.0):>6.3f}")
+    vi = [b for b in results if b not in NUTS_BACKENDS]
+    if vi:
+        print(f"\n{'VI':<11} {'seconds':>8} {'|d elas|':>9} {'max |d|':>8} {'corr':>6} {'ci width':>8} {'in ci':>6}")
+        for backend in vi:
+            res = results[backend]
+            if "error" in res:
+                print(f"{backend:<11} failed: {res['error']}")
+                continue
+            cmp = res.get("vs_" + reference, {})
+            print(f"{backend:<11} {res['seconds']:>8.1f} {cmp.get('mean_abs_diff', 0.0):>9.4f} "
+                  f"{cmp.get('max_abs_diff', 0.0):>8.4f} {cmp.get('corr', 1.0):>6.3f} "
+                  f"{cmp.get('ci_width_ratio', 1.0):>8.2f} {cmp.get('share_inside_ref_ci', 1.0):>6.2f}")
+    print(f"(catalog differences are against {reference}; ci width is the median ratio to its intervals)")
+
+    os.makedirs(BENCHMARK_DIR, exist_ok=True)
+    with open(os.path.join(BENCHMARK_DIR, f"elasticity_backends_{category_id}.json"), "w") as f:
+        json.dump(results, f, indent=2)
+    return results
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--category", type=str, default="sdr", help="Category ID (sdr, cer, lnd, sna)")
+    parser.add_argument("--backend", choices=BACKENDS, default="pymc")
+    parser.add_argument("--samples", type=int, default=1000)
+    parser.add_argument("--tune", type=int, default=1000)
+    parser.add_argument("--chains", type=int, default=4)
+    parser.add_argument("--cores", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--likelihood", choices=LIKELIHOODS, default="collapsed",
+                        help="collapsed: per-(store, upc) sufficient statistics, rows: one term per observation")
+    parser.add_argument("--mode", choices=["full", "incremental"], default="full",
+                        help="incremental: warm-start from the stored posterior and fit only new weeks")
+    parser.add_argument("--drift-threshold", type=float, default=4.0,
+                        help="Refit from scratch if a warm start moves any parameter more than this many prior sds")
+    parser.add_argument("--benchmark", nargs="*", choices=BACKENDS, default=None,
+                        help="Compare backends (all if none given) instead of training")
     args = parser.parse_args()
-    
-    train_elasticity_model(category_id=args.category)
+
+    if args.benchmark is not None:
+        benchmark_backends(category_id=args.category, backends=args.benchmark or None, samples=args.samples,
+                           tune=args.tune, chains=args.chains, cores=args.cores,
+                           seed=args.seed if args.seed is not None else 42, likelihood=args.likelihood)
+    else:
+        train_elasticity_model(category_id=args.category, samples=args.samples, tune=args.tune,
+                               chains=args.chains, cores=args.cores, backend=args.backend, seed=args.seed,
+                               mode=args.mode, drift_threshold=args.drift_threshold, likelihood=args.likelihood)
@@ -0,0 +1,142 @@
+import time
+import threading
+import numpy as np
+import pandas as pd
+from pipelines.utils import get_db_engine, table_version
+from pipelines.arrow_fetch import fetch_frame
+
+FEATURE_COLUMNS = [
+    'feat_log_price',
+    'feat_avg_price_4w',
+    'feat_lag_price_1w',
+    'feat_competitor_price_ratio',
+    'feat_month_of_year',
+    'log_sales',
+    'sales_units',
+]
+
+class _Snapshot:
+    """Immutable, array-backed copy of the online features at one mart version."""
+
+    def __init__(self, version, df):
+        self.version = version
+        self.store_ids, store_idx = np.unique(df['store_id'].to_numpy(np.int64), return_inverse=True)
+        self.upc_ids, upc_idx = np.unique(df['upc_id'].to_numpy(np.int64), return_inverse=True)
+        self.store_pos = {int(s): i for i, s in enumerate(self.store_ids)}
+        self.upc_pos = {int(u): i for i, u in enumerate(self.upc_ids)}
+
+        # Dense (store x upc) -> row grid, -1 where the pair has no features
+        self.grid = np.full((len(self.store_ids), len(self.upc_ids)), -1, dtype=np.int32)
+        self.grid[store_idx, upc_idx] = np.arange(len(df), dtype=np.int32)
+
+        self.values = df[FEATURE_COLUMNS].to_numpy(np.float32)
+        self.week_id = df['week_id'].to_numpy(np.int32)
+        for arr in (self.grid, self.values, self.week_id):
+            arr.setflags(write=False)
+
+    def row(self, store_id, upc_id):
+        si = self.store_pos.get(store_id)
+        ui = self.upc_pos.get(upc_id)
+        if si is None or ui is None:
+            return -1
+        return self.grid[si, ui]
+
+    def rows(self, store_ids, upc_ids):
+        store_ids = np.asarray(store_ids, dtype=np.int64)
+        upc_ids = np.asarray(upc_ids, dtype=np.int64)
+        if len(self.store_ids) == 0:
+            return np.full(len(store_ids), -1, dtype=np.int32)
+        si = np.searchsorted(self.store_ids, store_ids).clip(0, len(self.store_ids) - 1)
+        ui = np.searchsorted(self.upc_ids, upc_ids).clip(0, len(self.upc_ids) - 1)
+        known = (self.store_ids[si] == store_ids) & (self.upc_ids[ui] == upc_ids)
+        return np.where(known, self.grid[si, ui], -1)
+
+class OnlineFeatureStore:
+    """
+    In-process online feature store: the latest mart_feature_store row per
+    (store_id, upc_id), held as dense arrays and reloaded when the mart's
+    table version changes.
+
+    Lookups only read the current snapshot, which is swapped atomically on
+    refresh, so they never wait on Postgres.
+    """
+
+    def __init__(self, engine=None, source_table='mart_feature_store',
+                 online_view='mart_feature_store_online', min_refresh_interval=30):
+        self.engine = engine or get_db_engine()
+        self.source_table = source_table
+        self.online_view = online_view
+        self.min_refresh_interval = min_refresh_interval
+        self._snapshot = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def version(self):
+        snap = self._snapshot
+        return snap.version if snap else None
+
+    @property
+    def loaded(self):
+        return self._snapshot is not None
+
+    def refresh(self, force=False):
+        """Reload if the mart changed. Returns True if a new snapshot was loaded."""
+        now = time.monotonic()
+        if not force and self._snapshot is not None and now - self._last_check < self.min_refresh_interval:
+            return False
+        with self._lock:
+            self._last_check = now
+            version = table_version(self.engine, self.source_table)
+            if not force and self._snapshot is not None and version == self._snapshot.version:
+                return False
+            query = f"""
+                select store_id, upc_id, week_id, {', '.join(FEATURE_COLUMNS)}
+                from {self.online_view}
+            """
+            df = fetch_frame(query, self.engine)
+            self._snapshot = _Snapshot(version, df)
+            print(f"Online feature store loaded {len(df)} (store, upc) rows at version {version}.")
+            return True
+
+    def _require(self):
+        snap = self._snapshot
+        if snap is None:
+            raise RuntimeError("Online feature store has not been loaded yet.")
+        return snap
+
+    def get(self, store_id, upc_id):
+        """Features for one (store_id, upc_id) as a dict, or None if unknown."""
+        snap = self._require()
+        row = snap.row(store_id, upc_id)
+        if row < 0:
+            return None
+        out = dict(zip(FEATURE_COLUMNS, snap.values[row].tolist()))
+        out['week_id'] = int(snap.week_id[row])
+        return out
+
+    def get_batch(self, store_ids, upc_ids, with_week=False):
+        """
+        Vectorized lookup. Returns (values, found): a float32 (n, n_features)
+        array in FEATURE_COLUMNS order (NaN rows where not found) and a bool mask.
+        with_week=True also returns the week_id of each row (-1 where not found).
+        """
+        snap = self._require()
+        rows = snap.rows(store_ids, upc_ids)
+        found = rows >= 0
+        values = np.full((len(rows), len(FEATURE_COLUMNS)), np.nan, dtype=np.float32)
+        values[found] = snap.values[rows[found]]
+        if not with_week:
+            return values, found
+        week_id = np.full(len(rows), -1, dtype=np.int32)
+        week_id[found] = snap.week_id[rows[found]]
+        return values, found, week_id
+
+    def get_batch_frame(self, store_ids, upc_ids):
+        values, found, week_id = self.get_batch(store_ids, upc_ids, with_week=True)
+        df = pd.DataFrame(values, columns=FEATURE_COLUMNS)
+        df.insert(0, 'week_id', week_id)
+        df.insert(0, 'upc_id', np.asarray(upc_ids, dtype=np.int64))
+        df.insert(0, 'store_id', np.asarray(store_ids, dtype=np.int64))
+        df['found'] = found
+        return df
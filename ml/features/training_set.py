@@ -0,0 +1,145 @@
+import argparse
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from pipelines.utils import get_db_engine, copy_dataframe
+from pipelines.arrow_fetch import fetch_frame
+
+FEATURE_SOURCE = 'mart_feature_store'
+
+# Feature columns only; the targets (log_sales, sales_units) of a row are not
+# known at its event_timestamp, so they are never joined as features.
+DEFAULT_FEATURES = [
+    'feat_log_price',
+    'feat_avg_price_4w',
+    'feat_lag_price_1w',
+    'feat_competitor_price_ratio',
+    'feat_month_of_year',
+]
+
+SPINE_KEYS = ['store_id', 'upc_id', 'as_of_timestamp']
+
+def _prepare_spine(spine):
+    missing = [c for c in SPINE_KEYS if c not in spine.columns]
+    if missing:
+        raise ValueError(f"Spine is missing columns: {missing}")
+    spine = spine.copy()
+    spine['store_id'] = spine['store_id'].astype(np.int64)
+    spine['upc_id'] = spine['upc_id'].astype(np.int64)
+    spine['as_of_timestamp'] = pd.to_datetime(spine['as_of_timestamp'])
+    return spine
+
+def _asof_sql(spine, features, engine, chunk_rows):
+    """
+    As-of join pushed down to Postgres: the spine is COPY'd into a temp table
+    and every row probes the (store_id, upc_id, event_timestamp) index with a
+    LATERAL ... ORDER BY event_timestamp DESC LIMIT 1.
+    """
+    cols = ', '.join(f'f.{c}' for c in features)
+    query = f"""
+        SELECT s.spine_row, f.event_timestamp AS feature_timestamp, {cols}
+        FROM pit_spine s
+        LEFT JOIN LATERAL (
+            SELECT event_timestamp, {', '.join(features)}
+            FROM {FEATURE_SOURCE} f
+            WHERE f.store_id = s.store_id
+              AND f.upc_id = s.upc_id
+              AND f.event_timestamp <= s.as_of_timestamp
+            ORDER BY f.event_timestamp DESC
+            LIMIT 1
+        ) f ON TRUE
+    """
+    keyed = spine[SPINE_KEYS].copy()
+    keyed.insert(0, 'spine_row', np.arange(len(spine), dtype=np.int64))
+
+    parts = []
+    with engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TEMP TABLE pit_spine (
+                spine_row BIGINT, store_id BIGINT, upc_id BIGINT, as_of_timestamp TIMESTAMP
+            ) ON COMMIT DROP
+        """))
+        for start in range(0, len(keyed), chunk_rows):
+            chunk = keyed.iloc[start:start + chunk_rows]
+            conn.execute(text("TRUNCATE pit_spine"))
+            copy_dataframe(conn, chunk, 'pit_spine')
+            conn.execute(text("ANALYZE pit_spine"))
+            parts.append(pd.read_sql(text(query), conn))
+            print(f"As-of joined spine rows {start:,}-{start + len(chunk):,}.")
+
+    joined = pd.concat(parts, ignore_index=True).set_index('spine_row').sort_index()
+    joined['feature_timestamp'] = pd.to_datetime(joined['feature_timestamp'])
+    return joined.reset_index(drop=True)
+
+def _asof_merge(spine, features, engine):
+    """
+    As-of join as a vectorized sorted merge: pull the candidate feature rows
+    once (only the spine's stores and UPCs, only up to its last as_of_timestamp) and
+    match with pd.merge_asof by (store_id, upc_id).
+    """
+    stores = [int(s) for s in pd.unique(spine['store_id'])]
+    upcs = [int(u) for u in pd.unique(spine['upc_id'])]
+    query = f"""
+        SELECT store_id, upc_id, event_timestamp, {', '.join(features)}
+        FROM {FEATURE_SOURCE}
+        WHERE store_id = ANY(%(stores)s)
+          AND upc_id = ANY(%(upcs)s)
+          AND event_timestamp <= %(max_ts)s
+    """
+    params = {"stores": stores, "upcs": upcs, "max_ts": spine['as_of_timestamp'].max().to_pydatetime()}
+    feats = fetch_frame(query, engine, params=params)
+    feats['event_timestamp'] = pd.to_datetime(feats['event_timestamp'])
+    feats[['store_id', 'upc_id']] = feats[['store_id', 'upc_id']].astype(np.int64)
+    feats = feats.sort_values('event_timestamp', kind='stable')
+
+    left = spine[SPINE_KEYS].copy()
+    left['spine_row'] = np.arange(len(spine), dtype=np.int64)
+    left = left.sort_values('as_of_timestamp', kind='stable')
+
+    joined = pd.merge_asof(
+        left, feats,
+        left_on='as_of_timestamp', right_on='event_timestamp',
+        by=['store_id', 'upc_id'], direction='backward',
+    )
+    joined = joined.set_index('spine_row').sort_index()
+    joined = joined.rename(columns={'event_timestamp': 'feature_timestamp'})
+    return joined[['feature_timestamp'] + features].reset_index(drop=True)
+
+def build_training_set(spine, features=None, method='sql', engine=None, chunk_rows=2_000_000):
+    """
+    Point-in-time correct training set.
+
+    spine:    DataFrame with store_id, upc_id, as_of_timestamp (extra columns,
+              e.g. labels, are passed through)
+    features: mart_feature_store columns to join, default DEFAULT_FEATURES
+    method:   'sql' (LATERAL as-of join in Postgres, spine shipped in chunks
+              of chunk_rows) or 'merge' (vectorized merge_asof in pandas)
+
+    Each spine row gets the latest feature row with
+    event_timestamp <= as_of_timestamp, or NaN if there is none.
+    """
+    features = list(features or DEFAULT_FEATURES)
+    engine = engine or get_db_engine()
+    spine = _prepare_spine(spine).reset_index(drop=True)
+
+    if method == 'sql':
+        joined = _asof_sql(spine, features, engine, chunk_rows)
+    elif method == 'merge':
+        joined = _asof_merge(spine, features, engine)
+    else:
+        raise ValueError(f"Unknown method: {method}")
+
+    return pd.concat([spine, joined], axis=1)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build a point-in-time training set from a spine")
+    parser.add_argument("--spine", required=True, help="Parquet file with store_id, upc_id, as_of_timestamp")
+    parser.add_argument("--out", required=True, help="Output Parquet file")
+    parser.add_argument("--method", choices=["sql", "merge"], default="sql")
+    parser.add_argument("--features", nargs="+", default=None)
+    args = parser.parse_args()
+
+    spine_df = pd.read_parquet(args.spine)
+    result = build_training_set(spine_df, features=args.features, method=args.method)
+    result.to_parquet(args.out, index=False)
+    print(f"Wrote {len(result)} rows to {args.out}.")
@@ -4,32 +4,59 @@ from statsforecast import StatsForecast
 from statsforecast.models import AutoARIMA
 from sqlalchemy import create_engine
 from pipelines.utils import get_db_engine
+from pipelines.panel_cache import load_category_panel, TOP_PANEL_TABLE
+from pipelines.shared_panel import SharedPanel
+from concurrent.futures import ProcessPoolExecutor
 import argparse
 import os
 
-def run_forecast(category_id='sdr', horizon=12):
+def _forecast_series(panel_name, series, horizon, n_jobs=1):
+    """
+    Fit AutoARIMA on a subset of the shared panel's series.
+
+    Runs in a pool worker: it attaches to the panel by name and only builds a
+    DataFrame for its own series, so nothing panel-sized is pickled.
+    """
+    panel = SharedPanel.attach(panel_name) if isinstance(panel_name, str) else panel_name
+    try:
+        bounds = panel['series_bounds']
+        rows = np.concatenate([np.arange(bounds[i], bounds[i + 1]) for i in series])
+        store = panel['store_ids'][panel['store_code'][rows]]
+        upc = panel['upc_ids'][panel['upc_code'][rows]]
+        df = pd.DataFrame({
+            'unique_id': pd.Series(store).astype(str) + '_' + pd.Series(upc).astype(str),
+            'ds': panel['week_start'][panel['week_code'][rows]],
+            'y': panel['y'][rows].astype(np.float64),
+        })
+    finally:
+        if isinstance(panel_name, str):
+            panel.close()
+
+    sf = StatsForecast(
+        models=[AutoARIMA(season_length=52)],
+        freq='W',
+        n_jobs=n_jobs
+    )
+    sf.fit(df)
+    out = sf.predict(h=horizon, level=[90])
+    return out.reset_index() if out.index.name == 'unique_id' else out
+
+def run_forecast(category_id='sdr', horizon=12, workers=None):
     print(f"Starting Forecasting for Category: {category_id}")
     engine = get_db_engine()
+    workers = workers or os.cpu_count() or 1
     
     # 1. Load Panel Data
-    query = f"""
-        select 
-            store_id, 
-            upc_id, 
-            start_date as ds, 
-            exp(log_sales) as y,
-            exp(log_price) as price,
-            is_promo
-        from elasticity_ready_panel 
-        where category_id = '{category_id}'
-        order by store_id, upc_id, start_date
-    """
-    df = pd.read_sql(query, engine)
+    panel_df = load_category_panel(category_id, engine, table=TOP_PANEL_TABLE)
     
     # 2. Prepare for StatsForecast
-    # unique_id = store_id + '_' + upc_id
-    df['unique_id'] = df['store_id'].astype(str) + '_' + df['upc_id'].astype(str)
-    df['ds'] = pd.to_datetime(df['ds'])
+    # Series live in a shared-memory panel (int32 codes, float32 measures);
+    # workers attach to it instead of receiving a pickled DataFrame.
+    # y = sales units, price and is_promo are kept for exogenous models.
+    panel_df = panel_df.assign(
+        y=np.exp(panel_df['log_sales']),
+        price=np.exp(panel_df['log_price']),
+    )
     
     # StatsForecast expects: unique_id, ds, y
     # We can handle exogenous variables (price, is_promo) in AutoARIMA if we want, 
@@ -37,23 +64,8 @@ def run_forecast(category_id='sdr', horizon=12):
     # Let's try univariate first to ensure stability, then add exog if time permits.
     # Actually, the plan mentions covariates. Let's try with Price as a regressor.
     
-    # Check data sufficiency
-    counts = df.groupby('unique_id').size()
-    valid_ids = counts[counts > 20].index # Need some history
-    df = df[df['unique_id'].isin(valid_ids)]
-    
-    print(f"Training on {len(valid_ids)} time series...")
-    
     # 3. Define Models
-    models = [
-        AutoARIMA(season_length=52), 
-    ]
-    
-    sf = StatsForecast(
-        models=models,
-        freq='W',
-        n_jobs=-1
-    )
+    # AutoARIMA(season_length=52), one fit per series (see _forecast_series)
     
     # 4. Fit & Forecast
     # For future exog, we need future values.
@@ -66,14 +78,32 @@ def run_forecast(category_id='sdr', horizon=12):
     # If we want Price optimization, we use the Elasticity Model (PyMC), not ARIMA.
     # The ARIMA here is for "Base Demand" trend.
     
-    sf.fit(df[['unique_id', 'ds', 'y']])
-    forecast_df = sf.predict(h=horizon, level=[90])
+    with SharedPanel.from_frame(panel_df, ['y', 'price', 'is_promo'], date_col='start_date') as panel:
+        del panel_df
+        print(f"Shared panel: {len(panel)} rows, {panel.n_series} series, {panel.nbytes / 1e6:.1f} MB.")
+        
+        # Check data sufficiency
+        valid = np.flatnonzero(panel.series_lengths() > 20) # Need some history
+        print(f"Training on {len(valid)} time series with {workers} worker(s)...")
+        if len(valid) == 0:
+            print("No series with enough history to forecast.")
+            return
+        
+        if workers == 1:
+            parts = [_forecast_series(panel, valid, horizon)]
+        else:
+            # Several chunks per worker so uneven series lengths still balance out
+            chunks = [c for c in np.array_split(valid, workers * 4) if len(c)]
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(_forecast_series, panel.name, c, horizon) for c in chunks]
+                parts = [f.result() for f in futures]
+    
+    forecast_df = pd.concat(parts, ignore_index=True)
     
     print("Forecast generated. Sample:")
     print(forecast_df.head())
     
     # 5. Save to DB
-    forecast_df.reset_index(inplace=True)
     forecast_df['category_id'] = category_id
     forecast_df['created_at'] = pd.Timestamp.now()
     
@@ -89,6 +119,8 @@ def run_forecast(category_id='sdr', horizon=12):
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--category", type=str, default="sdr")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Forecast worker processes (default: all cores)")
     args = parser.parse_args()
     
-    run_forecast(category_id=args.category)
+    run_forecast(category_id=args.category, workers=args.workers)
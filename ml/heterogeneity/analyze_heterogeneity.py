@@ -1,62 +1,48 @@
 import pandas as pd
 import numpy as np
-import statsmodels.api as sm
 import argparse
 from sqlalchemy import create_engine
 from pipelines.utils import get_db_engine
+from ml.stats.ols_moments import load_moments, ols_from_moments, summary_table
 
 def analyze_heterogeneity(category_id='sdr'):
     print(f"Analyzing Heterogeneity for Category: {category_id}")
     engine = get_db_engine()
     
     # 1. Load Data
-    # Panel
-    query_panel = f"""
-        select * from elasticity_ready_panel 
-        where category_id = '{category_id}'
-    """
-    df = pd.read_sql(query_panel, engine)
+    # Per-(upc, store) sufficient statistics instead of the row-level panel
+    moments = load_moments(category_id, engine)
     
     # Demographics
-    query_demo = "select * from dim_store_demographics"
+    query_demo = "select store_id, log_median_income from dim_store_demographics"
     demo_df = pd.read_sql(query_demo, engine)
     
-    # Join
-    df = df.merge(demo_df, on='store_id', how='inner')
-    print(f"Merged Data Shape: {df.shape}")
-    
-    # Preprocessing
-    if 'log_price' not in df.columns and 'price' in df.columns:
-         df['log_price'] = np.log(df['price'])
-    # log_median_income is already logged in dim (assuming DFF standard)
+    # Join (income is constant within a store, so it scales the store's moments)
+    moments = moments.merge(demo_df, on='store_id', how='inner')
+    moments = moments.dropna(subset=['log_median_income'])
+    print(f"Merged moments: {len(moments)} (upc, store) groups, {int(moments['n_obs'].sum())} rows")
     
     # 2. Model: log_sales ~ log_price * log_median_income + promo_depth + ...
     # We want to see if Price Elasticity (beta) depends on Income.
     # Interaction term: log_price * log_median_income
-    
-    df['interaction_price_income'] = df['log_price'] * df['log_median_income']
-    # df['log_sales'] = np.log(df['sales_units'])
-    if 'log_sales' not in df.columns and 'sales_units' in df.columns:
-         df['log_sales'] = np.log(df['sales_units'])
-    
-    df['promo_depth'] = df['promo_depth'].fillna(0)
-    
-    # Drop NAs
-    model_df = df[['log_sales', 'log_price', 'log_median_income', 'interaction_price_income', 'promo_depth']].dropna()
-    
-    # Add constant
-    X = model_df[['log_price', 'log_median_income', 'interaction_price_income', 'promo_depth']]
-    X = sm.add_constant(X)
-    y = model_df['log_sales']
+    # log_median_income is already logged in dim (assuming DFF standard)
+    terms = [
+        ('const', 'const', None),
+        ('log_price', 'log_price', None),
+        ('log_median_income', 'const', 'log_median_income'),
+        ('interaction_price_income', 'log_price', 'log_median_income'),
+        ('promo_depth', 'promo_depth', None),
+    ]
     
     # Fit OLS
-    model = sm.OLS(y, X).fit()
-    print(model.summary())
+    model = ols_from_moments(moments, terms)
+    print(summary_table(model))
+    print(f"R-squared: {model['rsquared']:.4f}  No. Observations: {model['nobs']}")
     
     # Interpretation
-    base_elas = model.params['log_price']
-    interaction = model.params['interaction_price_income']
-    p_val = model.pvalues['interaction_price_income']
+    base_elas = model['params']['log_price']
+    interaction = model['params']['interaction_price_income']
+    p_val = model['pvalues']['interaction_price_income']
     
     print("\n--- Results ---")
     print(f"Base Elasticity: {base_elas:.4f}")
@@ -4,6 +4,7 @@ from sqlalchemy import create_engine
 from scipy.spatial.distance import jensenshannon
 import argparse
 from pipelines.utils import get_db_engine
+from pipelines.arrow_fetch import fetch_frame
 
 def calculate_psi(expected_array, actual_array, buckets=10):
     """
@@ -59,7 +60,7 @@ def check_drift(start_date_train, end_date_train, start_date_serve, end_date_ser
         FROM mart_feature_store
         WHERE event_timestamp BETWEEN '{start_date_train}' AND '{end_date_serve}'
     """
-    df = pd.read_sql(query, engine)
+    df = fetch_frame(query, engine)
     
     # Convert timestamp
     df['event_timestamp'] = pd.to_datetime(df['event_timestamp'])
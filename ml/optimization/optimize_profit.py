@@ -3,7 +3,8 @@ import numpy as np
 from ortools.linear_solver import pywraplp
 import argparse
 from sqlalchemy import create_engine
-from pipelines.utils import get_db_engine
+from pipelines.utils import get_db_engine, ensure_index
+from pipelines.panel_cache import load_category_panel, TOP_PANEL_TABLE
 
 def optimize_profit(category_id='sdr', min_revenue_pct=0.95):
     print(f"Running Profit Optimization for {category_id}...")
@@ -18,16 +19,11 @@ def optimize_profit(category_id='sdr', min_revenue_pct=0.95):
     # ERROR in Logic: We need weighted profit.
     # We need Base Profit / Base Revenue to weight them.
     
-    # Let's fetch base metrics from 'elasticity_ready_panel' (latest week or avg)
-    query_base = f"""
-        select upc_id, 
-               exp(avg(log_sales)) as base_units,
-               exp(avg(log_price)) as base_price
-        from elasticity_ready_panel
-        where category_id = '{category_id}'
-        group by 1
-    """
-    base_df = pd.read_sql(query_base, engine)
+    # Let's fetch base metrics from 'elasticity_ready_panel_top' (latest week or avg)
+    panel = load_category_panel(category_id, engine, table=TOP_PANEL_TABLE)
+    base_df = panel.groupby('upc_id', as_index=False)[['log_sales', 'log_price']].mean()
+    base_df['base_units'] = np.exp(base_df.pop('log_sales'))
+    base_df['base_price'] = np.exp(base_df.pop('log_price'))
     
     # Approximate base cost = 0.7 * price
     base_df['base_revenue'] = base_df['base_units'] * base_df['base_price']
@@ -128,6 +124,7 @@ def optimize_profit(category_id='sdr', min_revenue_pct=0.95):
         # Save Recommendations
         rec_df = pd.DataFrame(results)
         rec_df.to_sql('optimization_results', engine, if_exists='replace', index=False)
+        ensure_index(engine, 'optimization_results', ['category_id', 'upc_id'])
         print("Optimization results saved to 'optimization_results'.")
         
     else:
@@ -1,63 +1,45 @@
 import pandas as pd
 import numpy as np
-import statsmodels.api as sm
 import argparse
 from sqlalchemy import create_engine
 from pipelines.utils import get_db_engine
+from ml.stats.ols_moments import load_moments, ols_from_moments
 
 def estimate_uplift(category_id='sdr'):
     print(f"Estimating Promo Uplift for Category: {category_id}")
     engine = get_db_engine()
     
-    # Load Data
-    query = f"""
-        select * from elasticity_ready_panel 
-        where category_id = '{category_id}'
-    """
-    df = pd.read_sql(query, engine)
-    print(f"Loaded {len(df)} rows.")
+    # Load per-(upc, store) sufficient statistics instead of the row-level panel
+    moments = load_moments(category_id, engine)
+    print(f"Loaded moments for {len(moments)} (upc, store) groups ({int(moments['n_obs'].sum())} rows).")
     
     # Simple log-log model with promo features
-    # log_sales ~ log_price + promo_depth + trend + seasonality(month)
-    
-    # Preprocessing
-    # df['log_price'] = np.log(df['price'])
-    # df['log_sales'] = np.log(df['sales_units']) # Already logged in dbt?
-    # Check if log_sales is in columns, dbt sql says 'log_sales'
-    
-    if 'log_price' not in df.columns and 'price' in df.columns:
-         df['log_price'] = np.log(df['price'])
-         
-    df['promo_depth'] = df['promo_depth'].fillna(0)
-    
-    # Run separate regression for each UPC? Or pooled?
-    # Let's do pooled with UPC fixed effects (dummy variables)
-    # Be careful with dummy variable trap, drop_first=True
+    # log_sales ~ log_price + promo_depth
+    terms = [
+        ('const', 'const', None),
+        ('log_price', 'log_price', None),
+        ('promo_depth', 'promo_depth', None),
+    ]
     
     results = []
     
-    # Iterate per UPC for granular lift
-    for upc in df['upc_id'].unique():
-        sub = df[df['upc_id'] == upc].copy()
-        if len(sub) < 50:
+    # Iterate per UPC for granular lift (summing store moments gives the UPC's moments)
+    for upc, sub in moments.groupby('upc_id'):
+        if sub['n_obs'].sum() < 50:
             continue
-            
-        X = sub[['log_price', 'promo_depth']]
-        X = sm.add_constant(X)
-        y = sub['log_sales']
         
         try:
-            model = sm.OLS(y, X).fit()
+            model = ols_from_moments(sub, terms)
             
             # Extract coefficients
-            elasticity = model.params.get('log_price', 0)
-            lift_coef = model.params.get('promo_depth', 0) 
+            elasticity = model['params'].get('log_price', 0)
+            lift_coef = model['params'].get('promo_depth', 0) 
             # Note: if promo_depth is 0.2 (20% off), lift is exp(coef * 0.2)
             
             # Calculate Average Lift for this UPC
             # Avg Promo Depth when promo is active
-            avg_depth = sub[sub['promo_depth'] > 0]['promo_depth'].mean()
-            if pd.isna(avg_depth): avg_depth = 0
+            n_pos = sub['n_promo_depth_pos'].sum()
+            avg_depth = sub['sum_promo_depth_pos'].sum() / n_pos if n_pos > 0 else 0
             
             # Expected % Volume Increase = exp(lift_coef * avg_depth) - 1
             expected_lift_pct = (np.exp(lift_coef * avg_depth) - 1) * 100
@@ -69,7 +51,7 @@ def estimate_uplift(category_id='sdr'):
                 'promo_sensitivity': lift_coef,
                 'avg_promo_depth': avg_depth,
                 'avg_lift_pct': expected_lift_pct,
-                'r2': model.rsquared
+                'r2': model['rsquared']
             })
         except Exception as e:
             print(f"Error modeling UPC {upc}: {e}")
@@ -0,0 +1,194 @@
+"""
+Joint price simulation through the cross-elasticity matrix.
+
+scenario_engine moves one UPC's price at a time; here a candidate is a price
+vector for a group of UPCs and every product of the matrix responds to all
+of them (cannibalization included):
+
+    Q_i / Q0_i = prod_j (P_j / P0_j) ** beta_ij
+
+In log space this is log(Q / Q0) = B @ log(P / P0), so a batch of K
+candidates is a (K x group) @ (group x n) product: thousands of candidates
+take a few milliseconds, fast enough for interactive what-ifs. UPCs outside
+the group keep their current price but still respond through B.
+"""
+import time
+import argparse
+import threading
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from pipelines.utils import get_db_engine, table_version
+from pipelines.panel_cache import load_category_panel
+from ml.simulation import scenario_engine
+
+# Written by ml/elasticity/train_cross_elasticity.py (not imported here: it needs PyMC)
+CROSS_TABLE = 'cross_elasticity_matrix'
+
+def load_matrix(engine, category_id):
+    """Long-format cross_elasticity_matrix rows of the category."""
+    return pd.read_sql(text(f"""
+        SELECT upc_id_target, upc_id_driver, elasticity FROM {CROSS_TABLE}
+        WHERE category_id = :cat
+    """), engine, params={"cat": category_id})
+
+def dense_matrix(matrix_df):
+    """(B, upc_ids): B[target, driver] over the UPCs of the matrix, zero where no edge was fitted."""
+    upc_ids = np.union1d(matrix_df['upc_id_target'].to_numpy(np.int64), matrix_df['upc_id_driver'].to_numpy(np.int64))
+    rows = np.searchsorted(upc_ids, matrix_df['upc_id_target'].to_numpy(np.int64))
+    cols = np.searchsorted(upc_ids, matrix_df['upc_id_driver'].to_numpy(np.int64))
+    B = np.zeros((len(upc_ids), len(upc_ids)))
+    B[rows, cols] = matrix_df['elasticity'].to_numpy(float)
+    return B, upc_ids
+
+def baselines(panel, upc_ids, baseline_weeks=13):
+    """
+    Current price (mean shelf price of the latest week) and baseline weekly
+    units (chain total, averaged over the last baseline_weeks weeks) per UPC.
+    """
+    panel = panel[panel['upc_id'].isin(upc_ids)]
+    weeks = np.sort(panel['week_id'].unique())[-baseline_weeks:]
+    recent = panel[panel['week_id'].isin(weeks)]
+    units = np.exp(recent['log_sales']).groupby([recent['upc_id'], recent['week_id']]).sum()
+    baseline_units = units.groupby(level='upc_id').sum() / len(weeks)
+
+    last = recent[recent['week_id'] == recent.groupby('upc_id')['week_id'].transform('max')]
+    current_price = np.exp(last['log_price']).groupby(last['upc_id']).mean()
+    out = pd.DataFrame({'current_price': current_price, 'baseline_units': baseline_units}).reindex(upc_ids)
+    return out['current_price'].to_numpy(float), out['baseline_units'].to_numpy(float)
+
+class JointSimulator:
+    """
+    Batched joint scenarios for one category's cross-elasticity matrix.
+    UPCs without a current price or baseline volume are left out.
+    """
+
+    def __init__(self, B, upc_ids, current_price, baseline_units, unit_cost, category_id=None):
+        keep = np.isfinite(current_price) & np.isfinite(baseline_units) & (np.asarray(current_price) > 0)
+        self.category_id = category_id
+        self.upc_ids = np.asarray(upc_ids, dtype=np.int64)[keep]
+        self.B = np.asarray(B, dtype=float)[np.ix_(keep, keep)]
+        self.current_price = np.asarray(current_price, dtype=float)[keep]
+        self.baseline_units = np.asarray(baseline_units, dtype=float)[keep]
+        self.unit_cost = np.asarray(unit_cost, dtype=float)[keep]
+        self._col = {int(u): i for i, u in enumerate(self.upc_ids)}
+        self.baseline_revenue = float(self.baseline_units @ self.current_price)
+        self.baseline_profit = float(self.baseline_units @ (self.current_price - self.unit_cost))
+
+    @classmethod
+    def from_db(cls, category_id, engine=None, baseline_weeks=13, cost_ratio=scenario_engine.DEFAULT_COST_RATIO,
+                costs=None):
+        engine = engine or get_db_engine()
+        matrix_df = load_matrix(engine, category_id)
+        if matrix_df.empty:
+            raise LookupError(f"No cross-elasticity matrix for category {category_id}")
+        B, upc_ids = dense_matrix(matrix_df)
+        current_price, baseline_units = baselines(load_category_panel(category_id, engine), upc_ids, baseline_weeks)
+        unit_cost = scenario_engine.unit_costs(current_price, upc_ids, cost_ratio, costs)
+        return cls(B, upc_ids, current_price, baseline_units, unit_cost, category_id=category_id)
+
+    def columns(self, upc_ids):
+        """Column of each upc_id; raises KeyError for UPCs outside the matrix."""
+        missing = [u for u in upc_ids if int(u) not in self._col]
+        if missing:
+            raise KeyError(f"UPCs {missing[:10]} are not in the cross-elasticity matrix of {self.category_id}")
+        return np.array([self._col[int(u)] for u in upc_ids], dtype=np.int64)
+
+    def simulate(self, prices, upc_ids=None, batch_size=4096, per_upc=False):
+        """
+        Evaluate K candidate price vectors.
+
+        prices: (K x group) new prices for upc_ids (all matrix UPCs if None).
+        Returns {name: (K,) array} with the group totals revenue, profit and
+        their indices vs the current prices; per_upc=True adds the (K x n)
+        quantity_index of every matrix UPC.
+        """
+        prices = np.atleast_2d(np.asarray(prices, dtype=float))
+        cols = np.arange(len(self.upc_ids)) if upc_ids is None else self.columns(upc_ids)
+        if len(np.unique(cols)) != len(cols):
+            raise ValueError("Each UPC can appear only once in the group")
+        if prices.shape[1] != len(cols):
+            raise ValueError(f"Expected {len(cols)} prices per candidate, got {prices.shape[1]}")
+        if not (prices > 0).all():
+            raise ValueError("Candidate prices must be positive")
+
+        B_group = self.B[:, cols].T
+        revenue = np.empty(len(prices))
+        profit = np.empty(len(prices))
+        quantity_index = np.empty((len(prices), len(self.upc_ids))) if per_upc else None
+        for start in range(0, len(prices), batch_size):
+            batch = slice(start, start + batch_size)
+            log_ratio = np.log(prices[batch] / self.current_price[cols])
+            q_index = np.exp(log_ratio @ B_group)
+            new_price = np.broadcast_to(self.current_price, q_index.shape).copy()
+            new_price[:, cols] = prices[batch]
+            units = self.baseline_units * q_index
+            revenue[batch] = (units * new_price).sum(axis=1)
+            profit[batch] = (units * (new_price - self.unit_cost)).sum(axis=1)
+            if per_upc:
+                quantity_index[batch] = q_index
+
+        out = {
+            'revenue': revenue,
+            'profit': profit,
+            'revenue_index': revenue / self.baseline_revenue,
+            'profit_index': profit / self.baseline_profit,
+        }
+        if per_upc:
+            out['quantity_index'] = quantity_index
+        return out
+
+class SimulatorCache:
+    """
+    JointSimulator per category for the API, rebuilt when
+    cross_elasticity_matrix changes (checked at most every min_refresh_interval seconds).
+    """
+
+    def __init__(self, engine=None, min_refresh_interval=30):
+        self.engine = engine or get_db_engine()
+        self.min_refresh_interval = min_refresh_interval
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, category_id):
+        now = time.monotonic()
+        entry = self._entries.get(category_id)
+        if entry is not None and now - entry['checked'] < self.min_refresh_interval:
+            return entry['simulator']
+        with self._lock:
+            with self.engine.connect() as conn:
+                if not conn.execute(text("SELECT to_regclass(:t) IS NOT NULL"), {"t": CROSS_TABLE}).scalar():
+                    raise LookupError(f"No cross-elasticity matrix has been trained yet ({CROSS_TABLE} missing)")
+            version = table_version(self.engine, CROSS_TABLE)
+            entry = self._entries.get(category_id)
+            if entry is None or entry['version'] != version:
+                simulator = JointSimulator.from_db(category_id, self.engine)
+                entry = {'simulator': simulator, 'version': version}
+                self._entries[category_id] = entry
+            entry['checked'] = now
+            return entry['simulator']
+
+def random_candidates(simulator, upc_ids, n_candidates, max_change_pct=0.20, seed=None):
+    """Uniformly drawn price changes within +-max_change_pct for the group, as prices."""
+    rng = np.random.default_rng(seed)
+    base = simulator.current_price[simulator.columns(upc_ids)]
+    return base * (1.0 + rng.uniform(-max_change_pct, max_change_pct, size=(n_candidates, len(base))))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Joint what-if over random price vectors for a UPC group")
+    parser.add_argument("--category", type=str, default="sdr")
+    parser.add_argument("--upcs", type=str, default=None, help="Comma-separated group (default: whole matrix)")
+    parser.add_argument("--candidates", type=int, default=5000)
+    parser.add_argument("--max-change", type=float, default=0.20)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    sim = JointSimulator.from_db(args.category)
+    group = sim.upc_ids if args.upcs is None else [int(u) for u in args.upcs.split(",")]
+    prices = random_candidates(sim, group, args.candidates, args.max_change, args.seed)
+    start = time.perf_counter()
+    res = sim.simulate(prices, group)
+    print(f"{args.candidates} candidates x {len(group)} priced UPCs ({len(sim.upc_ids)} responding) "
+          f"in {1000 * (time.perf_counter() - start):.1f} ms.")
+    best = int(np.argmax(res['profit']))
+    print(f"Best profit index {res['profit_index'][best]:.4f} (revenue index {res['revenue_index'][best]:.4f}).")
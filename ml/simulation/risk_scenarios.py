@@ -0,0 +1,218 @@
+"""
+Posterior-aware price scenarios: revenue and profit indices with their
+uncertainty, from S elasticity samples per UPC instead of the catalog mean.
+
+Samples come from the draw store (ml/elasticity/draw_store.py), preferably
+the version the catalog was promoted from; UPCs without stored draws are
+sampled from a Normal matched to the catalog's 95% interval. For each block
+of UPCs the indices are evaluated for every sample x grid point as one
+(S x UPC x grid) tensor, and reduced to P5 / P50 / P95 and the probability
+that revenue / profit end up below their current level.
+
+Both indices are monotone in the elasticity at a fixed price point, so with
+the samples sorted per UPC the tensor is already ordered along S and the
+percentiles are read off by position instead of sorting it.
+"""
+import os
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from pipelines.utils import get_db_engine, ensure_index, copy_binary
+from ml.elasticity import draw_store
+from ml.simulation import scenario_engine
+
+RISK_TABLE = 'scenario_risk'
+
+PERCENTILES = (5, 50, 95)
+# z of the catalog's 95% interval, used to turn it into a standard deviation
+CI_Z = 1.959964
+
+RISK_DDL = f"""
+    CREATE TABLE IF NOT EXISTS {RISK_TABLE} (
+        category_id text,
+        upc_id bigint,
+        draw_source text,
+        current_price double precision,
+        simulated_price double precision,
+        price_change_pct double precision,
+        elasticity double precision,
+        revenue_p5 double precision,
+        revenue_p50 double precision,
+        revenue_p95 double precision,
+        profit_p5 double precision,
+        profit_p50 double precision,
+        profit_p95 double precision,
+        prob_revenue_loss double precision,
+        prob_profit_loss double precision
+    )
+"""
+
+def open_draws(category_id, model_version=None):
+    """DrawStore of the catalog's model version if stored, else the published one; None if neither."""
+    root = draw_store.store_root()
+    if model_version and os.path.isdir(os.path.join(root, category_id, str(model_version))):
+        return draw_store.DrawStore(category_id, version=model_version, root=root)
+    try:
+        return draw_store.DrawStore(category_id, root=root)
+    except FileNotFoundError:
+        return None
+
+def draw_rows(n_stored, n_draws):
+    """Evenly spaced rows of the store when it holds more than n_draws draws."""
+    if n_stored <= n_draws:
+        return slice(None)
+    return np.linspace(0, n_stored - 1, n_draws).round().astype(np.int64)
+
+def ci_samples(elasticity, ci_lower, ci_upper, n_draws, rng):
+    """(n_draws x UPC) Normal samples with the catalog mean and an sd matching the 95% interval."""
+    sd = np.maximum((np.asarray(ci_upper, float) - np.asarray(ci_lower, float)) / (2 * CI_Z), 0.0)
+    return rng.normal(np.asarray(elasticity, float), sd, size=(n_draws, len(sd)))
+
+def monotone_percentiles(values, q=PERCENTILES):
+    """
+    np.percentile(values, q, axis=0) (linear interpolation) for values that
+    are monotone along axis 0, in either direction per column.
+    """
+    n = values.shape[0]
+    pos = np.asarray(q, dtype=float) / 100 * (n - 1)
+    lo = np.floor(pos).astype(np.int64)
+    hi = np.minimum(lo + 1, n - 1)
+    frac = (pos - lo).reshape((-1,) + (1,) * (values.ndim - 1))
+    ascending = values[-1] >= values[0]
+
+    def at(i):
+        return np.where(ascending, values[i], values[n - 1 - i])
+    return at(lo) + frac * (at(hi) - at(lo))
+
+def simulate_risk(current_price, samples, unit_cost, pct_grid):
+    """
+    Percentiles and loss probabilities of the indices for a block of UPCs.
+    samples is (S x UPC); returns {name: (UPC x grid) array}.
+    """
+    samples = np.sort(np.asarray(samples, dtype=float), axis=0)
+    current_price = np.asarray(current_price, dtype=float)[None, :, None]
+    unit_cost = np.asarray(unit_cost, dtype=float)[None, :, None]
+    ratio = 1.0 + np.asarray(pct_grid, dtype=float)
+
+    # (S x UPC x grid); same formulas as scenario_engine.simulate
+    quantity_index = np.exp(samples[:, :, None] * np.log(ratio))
+    base_margin = current_price - unit_cost
+    base_margin = np.where(base_margin <= 0, scenario_engine.MIN_BASE_MARGIN, base_margin)
+    margin_index = (current_price * ratio - unit_cost) / base_margin
+    revenue_index = ratio * quantity_index
+    profit_index = margin_index * quantity_index
+
+    out = {}
+    for name, index in (('revenue', revenue_index), ('profit', profit_index)):
+        for q, values in zip(PERCENTILES, monotone_percentiles(index)):
+            out[f"{name}_p{q}"] = values
+        out[f"prob_{name}_loss"] = (index < 1.0).mean(axis=0)
+    return out
+
+def risk_columns(category_id, draw_source, upc_ids, current_price, elasticity, samples, unit_cost, pct_grid):
+    """scenario_risk columns (UPC-major rows) for one block, as NumPy arrays."""
+    steps = len(pct_grid)
+    columns = {
+        'category_id': category_id,
+        'upc_id': np.repeat(np.asarray(upc_ids, dtype=np.int64), steps),
+        'draw_source': draw_source,
+        'current_price': np.repeat(np.asarray(current_price, dtype=float), steps),
+        'simulated_price': (np.asarray(current_price, dtype=float)[:, None] * (1.0 + pct_grid)).ravel(),
+        'price_change_pct': np.tile(np.asarray(pct_grid, dtype=float), len(upc_ids)),
+        'elasticity': np.repeat(np.asarray(elasticity, dtype=float), steps),
+    }
+    for name, values in simulate_risk(current_price, samples, unit_cost, pct_grid).items():
+        columns[name] = values.ravel()
+    return columns
+
+def iter_risk_blocks(category_id, inputs, pct_grid, n_draws, draws=None, cost_ratio=scenario_engine.DEFAULT_COST_RATIO,
+                     costs=None, block_upcs=500, seed=None):
+    """
+    Yield scenario_risk column blocks. inputs has upc_id, current_price,
+    elasticity, ci_lower, ci_upper; draws is a DrawStore or None.
+    """
+    rng = np.random.default_rng(seed)
+    has_draws = np.zeros(len(inputs), dtype=bool)
+    if draws is not None:
+        has_draws = inputs['upc_id'].isin(draws.upc_ids).to_numpy()
+        rows = draw_rows(draws.n_draws, n_draws)
+
+    for source, mask in (('draws', has_draws), ('ci', ~has_draws)):
+        group = inputs[mask]
+        upc_ids = group['upc_id'].to_numpy(np.int64)
+        current_price = group['current_price'].to_numpy(float)
+        cost = scenario_engine.unit_costs(current_price, upc_ids, cost_ratio, costs)
+        if source == 'draws' and len(group):
+            # One gather of the used draws x UPCs; blocks slice it
+            stored = draws.beta_price(upc_ids, draws=rows)
+        for start in range(0, len(group), block_upcs):
+            block = slice(start, start + block_upcs)
+            rows_df = group.iloc[block]
+            if source == 'draws':
+                samples = stored[:, block]
+            else:
+                samples = ci_samples(rows_df['elasticity'], rows_df['ci_lower'], rows_df['ci_upper'], n_draws, rng)
+            yield risk_columns(category_id, source, upc_ids[block], current_price[block],
+                               rows_df['elasticity'].to_numpy(float), samples, cost[block], pct_grid)
+
+def load_risk_inputs(category_id, engine):
+    """Current price per UPC with the catalog's mean, interval and model version."""
+    catalog_df = pd.read_sql(text("""
+        select upc_id, ci_lower, ci_upper, model_version from elasticity_catalog
+        where category_id = :cat
+    """), engine, params={"cat": category_id})
+    prices = scenario_engine.load_inputs(category_id, engine)
+    return prices.merge(catalog_df, on='upc_id', how='inner')
+
+def run_risk_simulation(category_id='sdr', n_draws=1000, min_change_pct=-0.20, max_change_pct=0.20, steps=20,
+                        cost_ratio=scenario_engine.DEFAULT_COST_RATIO, costs=None, block_upcs=500, seed=None):
+    """
+    Replace the category's rows in scenario_risk, one binary COPY per block,
+    all in one transaction.
+    """
+    print(f"Running Monte Carlo price simulation for {category_id} ({n_draws} draws)...")
+    engine = get_db_engine()
+    inputs = load_risk_inputs(category_id, engine)
+    versions = inputs['model_version'].dropna().unique()
+    draws = open_draws(category_id, versions[0] if len(versions) == 1 else None)
+    if draws is None:
+        print("No stored draws, sampling every UPC from the catalog interval.")
+    else:
+        print(f"Using draw store version {draws.version} ({draws.n_draws} draws).")
+    pct_grid = scenario_engine.price_grid(min_change_pct, max_change_pct, steps)
+
+    start = time.perf_counter()
+    n_rows = 0
+    with engine.begin() as conn:
+        conn.execute(text(RISK_DDL))
+        conn.execute(text(f"DELETE FROM {RISK_TABLE} WHERE category_id = :cat"), {"cat": category_id})
+        for columns in iter_risk_blocks(category_id, inputs, pct_grid, n_draws, draws=draws, cost_ratio=cost_ratio,
+                                        costs=costs, block_upcs=block_upcs, seed=seed):
+            copy_binary(conn, RISK_TABLE, columns)
+            n_rows += len(columns['upc_id'])
+    ensure_index(engine, RISK_TABLE, ['category_id', 'upc_id'])
+    print(f"{n_rows} scenario rows ({len(inputs)} UPCs x {steps} price points) saved to '{RISK_TABLE}' "
+          f"in {time.perf_counter() - start:.1f}s.")
+    return n_rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Posterior-aware price scenarios (Monte Carlo)")
+    parser.add_argument("--category", type=str, default="sdr")
+    parser.add_argument("--draws", type=int, default=1000, help="Elasticity samples per UPC")
+    parser.add_argument("--min-change", type=float, default=-0.20)
+    parser.add_argument("--max-change", type=float, default=0.20)
+    parser.add_argument("--steps", type=int, default=20)
+    parser.add_argument("--cost-ratio", type=float, default=scenario_engine.DEFAULT_COST_RATIO)
+    parser.add_argument("--costs", type=str, default=None, help="CSV with upc_id, unit_cost columns")
+    parser.add_argument("--block-upcs", type=int, default=500, help="UPCs per (draws x UPC x grid) tensor")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    costs = None
+    if args.costs:
+        costs = pd.read_csv(args.costs).set_index('upc_id')['unit_cost']
+    run_risk_simulation(category_id=args.category, n_draws=args.draws, min_change_pct=args.min_change,
+                        max_change_pct=args.max_change, steps=args.steps, cost_ratio=args.cost_ratio, costs=costs,
+                        block_upcs=args.block_upcs, seed=args.seed)
@@ -1,114 +1,150 @@
 import pandas as pd
 import numpy as np
 import argparse
-from sqlalchemy import create_engine
-from pipelines.utils import get_db_engine
+from sqlalchemy import text
+from pipelines.utils import get_db_engine, ensure_index, copy_binary
+from pipelines.panel_cache import load_category_panel, TOP_PANEL_TABLE
 
-def run_simulation(category_id='sdr', min_change_pct=-0.20, max_change_pct=0.20, steps=20):
-    print(f"Running Price Simulation for {category_id}...")
-    engine = get_db_engine()
-    
-    # 1. Load Elasticity Model Coefficients
-    query_cat = f"""
-        select * from elasticity_catalog
-        -- where category_id = '{category_id}' -- Assuming catalog has category_id or we filter by UPCs
+# Cost assumption when no unit costs are given: cost = DEFAULT_COST_RATIO * current price
+DEFAULT_COST_RATIO = 0.7
+# Floor for the current unit margin, so profit indices stay finite
+MIN_BASE_MARGIN = 0.01
+
+RESULT_COLUMNS = ['category_id', 'upc_id', 'current_price', 'simulated_price', 'price_change_pct',
+                  'elasticity', 'revenue_index', 'profit_index']
+
+RESULTS_DDL = """
+    CREATE TABLE IF NOT EXISTS scenario_results (
+        category_id text,
+        upc_id bigint,
+        current_price double precision,
+        simulated_price double precision,
+        price_change_pct double precision,
+        elasticity double precision,
+        revenue_index double precision,
+        profit_index double precision
+    )
+"""
+
+def price_grid(min_change_pct=-0.20, max_change_pct=0.20, steps=20):
+    """Relative price changes evaluated for every UPC."""
+    return np.linspace(min_change_pct, max_change_pct, steps)
+
+def unit_costs(current_price, upc_ids, cost_ratio=DEFAULT_COST_RATIO, costs=None):
     """
-    elasticity_df = pd.read_sql(query_cat, engine)
-    
-    # 2. Load Current Prices and Costs (Using avg cost proxy = price * 0.7 for now if cost unknown)
-    # We need a reference price. Let's take the latest price from elasticity_ready_panel
-    query_prices = f"""
-        select distinct on (upc_id) 
-            upc_id, exp(log_price) as current_price
-        from elasticity_ready_panel
-        where category_id = '{category_id}'
-        order by upc_id, week_id desc
+    Unit cost per UPC: from `costs` (a Series indexed by upc_id) where given,
+    cost_ratio * current price otherwise.
     """
-    prices_df = pd.read_sql(query_prices, engine)
-    
-    # Merge
-    # Note: elasticity_catalog might be keyed by specific UPCs.
-    # We need to map elasticity back to UPCs.
-    # In Sprint 3, elasticity_catalog has: category_id, upc_id, mu_elasticity (if pooled) or beta_price.
-    # Let's inspect catalog schema if column names are needed. 
-    # Assuming catalog has 'upc_id' and 'mean_elasticity'.
-    
-    merged = prices_df.merge(elasticity_df, on='upc_id', how='inner')
-    print(f"Simulating for {len(merged)} UPCs.")
-    
-    scenario_results = []
-    
-    for _, row in merged.iterrows():
-        upc = row['upc_id']
-        curr_price = row['current_price']
-        elasticity = row['elasticity'] 
-        
-        # Calculate Reference Quantity (Q_curr) if needed, or use Relative Change
-        # Ratio Q_new / Q_curr = (P_new / P_curr) ^ elasticity
-        # This avoids needing the intercept (alpha).
-        # Simplification: Linear approximation around current point using elasticity.
-        # % Change in Qty = Elasticity * % Change in Price
-        # Base Qty = exp(intercept + elasticity * log(curr_price)) ... roughly.
-        
-        # Better: Use the formula: Q_new = Q_curr * (P_new / P_curr) ^ Elasticity
-        # We need Q_curr (Current Baseline Volume). 
-        # Let's fetch average recent volume as baseline.
-        
-        # Generate Price Grid
-        price_grid = np.linspace(curr_price * (1 + min_change_pct), curr_price * (1 + max_change_pct), steps)
-        
-        # Assume Q_curr is 100 (index) to just normalize, or fetch real avg sales.
-        # Let's use relative revenue impact.
-        # New Revenue Index = (P_new * Q_new) / (P_curr * Q_curr)
-        #                   = (P_new / P_curr) * (Q_new / Q_curr)
-        #                   = (P_new / P_curr) * (P_new / P_curr) ^ Elasticity
-        #                   = (P_new / P_curr) ^ (1 + Elasticity)
-        
-        for p_sim in price_grid:
-            pct_change_price = (p_sim - curr_price) / curr_price
-            
-            # Revenue Impact Factor
-            revenue_index = (p_sim / curr_price) ** (1 + elasticity)
-            
-            # Profit Impact? Need Cost.
-            # Assume constant margin % for baseline?? No, cost is fixed usually.
-            # let Cost = 0.7 * curr_price
-            cost = 0.7 * curr_price
-            
-            # Profit_curr = (curr_price - cost) * Q_curr
-            # Profit_new = (p_sim - cost) * Q_new
-            #            = (p_sim - cost) * Q_curr * (p_sim/curr_price)^elasticity
-            
-            # Profit Index = Profit_new / Profit_curr
-            #              = ((p_sim - cost) / (curr_price - cost)) * (p_sim/curr_price)^elasticity
-            
-            base_margin = curr_price - cost
-            sim_margin = p_sim - cost
-            
-            if base_margin <= 0: base_margin = 0.01 # Avoid div by zero
-            
-            profit_index = (sim_margin / base_margin) * ((p_sim / curr_price) ** elasticity)
-            
-            scenario_results.append({
-                'category_id': category_id,
-                'upc_id': upc,
-                'current_price': curr_price,
-                'simulated_price': p_sim,
-                'price_change_pct': pct_change_price,
-                'elasticity': elasticity,
-                'revenue_index': revenue_index,
-                'profit_index': profit_index
-            })
-
-    res_df = pd.DataFrame(scenario_results)
-    
-    # Save
-    res_df.to_sql('scenario_results', engine, if_exists='replace', index=False)
-    print("Scenario results saved to 'scenario_results'.")
+    cost = cost_ratio * current_price
+    if costs is not None:
+        known = pd.Series(upc_ids).map(costs).to_numpy(float)
+        cost = np.where(np.isnan(known), cost, known)
+    return cost
+
+def simulate(current_price, elasticity, unit_cost, pct_grid):
+    """
+    Constant-elasticity scenarios for a (UPC x grid) block in one pass.
+
+    With r = P_new / P_curr, Q_new / Q_curr = r ** elasticity, so
+        revenue_index = r ** (1 + elasticity)
+        profit_index  = (P_new - cost) / (P_curr - cost) * r ** elasticity
+    Returns (simulated_price, revenue_index, profit_index), each (n_upcs, steps).
+    """
+    current_price = np.asarray(current_price, dtype=float)[:, None]
+    elasticity = np.asarray(elasticity, dtype=float)[:, None]
+    unit_cost = np.asarray(unit_cost, dtype=float)[:, None]
+    ratio = 1.0 + np.asarray(pct_grid, dtype=float)[None, :]
+
+    quantity_index = np.exp(elasticity * np.log(ratio))
+    simulated_price = current_price * ratio
+    base_margin = current_price - unit_cost
+    base_margin = np.where(base_margin <= 0, MIN_BASE_MARGIN, base_margin)
+    revenue_index = ratio * quantity_index
+    profit_index = (simulated_price - unit_cost) / base_margin * quantity_index
+    return simulated_price, revenue_index, profit_index
+
+def scenario_columns(category_id, upc_ids, current_price, elasticity, unit_cost, pct_grid):
+    """scenario_results columns (UPC-major rows) for one block, as NumPy arrays."""
+    simulated_price, revenue_index, profit_index = simulate(current_price, elasticity, unit_cost, pct_grid)
+    steps = len(pct_grid)
+    return {
+        'category_id': category_id,
+        'upc_id': np.repeat(np.asarray(upc_ids, dtype=np.int64), steps),
+        'current_price': np.repeat(np.asarray(current_price, dtype=float), steps),
+        'simulated_price': simulated_price.ravel(),
+        'price_change_pct': np.tile(np.asarray(pct_grid, dtype=float), len(upc_ids)),
+        'elasticity': np.repeat(np.asarray(elasticity, dtype=float), steps),
+        'revenue_index': revenue_index.ravel(),
+        'profit_index': profit_index.ravel(),
+    }
+
+def scenario_frame(category_id, upc_ids, current_price, elasticity, unit_cost, pct_grid):
+    """scenario_columns as a DataFrame."""
+    return pd.DataFrame(scenario_columns(category_id, upc_ids, current_price, elasticity, unit_cost, pct_grid),
+                        columns=RESULT_COLUMNS)
+
+def load_inputs(category_id, engine):
+    """Current price (latest week) and catalog elasticity per UPC of the category."""
+    elasticity_df = pd.read_sql(text("""
+        select upc_id, elasticity from elasticity_catalog
+        where category_id = :cat
+    """), engine, params={"cat": category_id})
+
+    # Reference price: the latest price per UPC in elasticity_ready_panel_top
+    panel = load_category_panel(category_id, engine, table=TOP_PANEL_TABLE)
+    latest = panel.sort_values(['upc_id', 'week_id'], kind='stable').drop_duplicates('upc_id', keep='last')
+    prices_df = pd.DataFrame({
+        'upc_id': latest['upc_id'].to_numpy(),
+        'current_price': np.exp(latest['log_price'].to_numpy()),
+    })
+    return prices_df.merge(elasticity_df, on='upc_id', how='inner')
+
+def run_simulation(category_id='sdr', min_change_pct=-0.20, max_change_pct=0.20, steps=20,
+                   cost_ratio=DEFAULT_COST_RATIO, costs=None, block_upcs=10000):
+    """
+    Simulate every UPC of the category over the price grid and replace the
+    category's rows in scenario_results. UPCs are processed in blocks of
+    block_upcs, each block computed with NumPy broadcasting and written
+    with one binary COPY, all in one transaction.
+    """
+    print(f"Running Price Simulation for {category_id}...")
+    engine = get_db_engine()
+    merged = load_inputs(category_id, engine)
+    pct_grid = price_grid(min_change_pct, max_change_pct, steps)
+    print(f"Simulating for {len(merged)} UPCs x {steps} price points.")
+
+    upc_ids = merged['upc_id'].to_numpy(np.int64)
+    current_price = merged['current_price'].to_numpy(float)
+    elasticity = merged['elasticity'].to_numpy(float)
+    cost = unit_costs(current_price, upc_ids, cost_ratio, costs)
+
+    n_rows = 0
+    with engine.begin() as conn:
+        conn.execute(text(RESULTS_DDL))
+        conn.execute(text("DELETE FROM scenario_results WHERE category_id = :cat"), {"cat": category_id})
+        for start in range(0, len(merged), block_upcs):
+            block = slice(start, start + block_upcs)
+            columns = scenario_columns(category_id, upc_ids[block], current_price[block], elasticity[block],
+                                       cost[block], pct_grid)
+            copy_binary(conn, 'scenario_results', columns)
+            n_rows += len(columns['upc_id'])
+    ensure_index(engine, 'scenario_results', ['category_id', 'upc_id'])
+    print(f"{n_rows} scenario results saved to 'scenario_results'.")
+    return n_rows
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--category", type=str, default="sdr")
+    parser.add_argument("--min-change", type=float, default=-0.20, help="Lowest price change (fraction)")
+    parser.add_argument("--max-change", type=float, default=0.20, help="Highest price change (fraction)")
+    parser.add_argument("--steps", type=int, default=20, help="Price points per UPC")
+    parser.add_argument("--cost-ratio", type=float, default=DEFAULT_COST_RATIO,
+                        help="Unit cost as a fraction of the current price, where no unit cost is given")
+    parser.add_argument("--costs", type=str, default=None, help="CSV with upc_id, unit_cost columns")
     args = parser.parse_args()
-    
-    run_simulation(category_id=args.category)
+
+    costs = None
+    if args.costs:
+        costs = pd.read_csv(args.costs).set_index('upc_id')['unit_cost']
+    run_simulation(category_id=args.category, min_change_pct=args.min_change, max_change_pct=args.max_change,
+                   steps=args.steps, cost_ratio=args.cost_ratio, costs=costs)
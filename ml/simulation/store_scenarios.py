@@ -0,0 +1,223 @@
+"""
+Store x UPC price scenarios, streamed with bounded memory.
+
+scenario_engine works at chain level from one latest price per UPC. Here
+every (store, upc) gets its own current price (latest week) and baseline
+volume (mean units over the last baseline_weeks weeks), so the scenarios
+differ by store and price zone. Stores are processed in blocks (inputs are
+fetched per block) and each block in UPC blocks; iter_store_scenarios
+yields one chunk at a time and the sinks write each chunk as soon as it is
+computed, so peak memory depends on the block sizes, not on the number of
+stores.
+
+Sinks, both partitioned by category_id and price_zone for selective reads:
+    postgres  store_scenario_results, LIST-partitioned by category_id, then price_zone
+    parquet   the lake's store_scenarios dataset (pipelines/lake.py)
+"""
+import re
+import time
+import argparse
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from sqlalchemy import text
+from pipelines.utils import get_db_engine, copy_binary, peak_rss_mb
+from pipelines.arrow_fetch import fetch_frame
+from pipelines import lake
+from ml.simulation import scenario_engine
+
+STORE_TABLE = 'store_scenario_results'
+
+# Column -> Postgres type; the arrays of a chunk have the matching NumPy dtypes
+# (bigint: int64, integer: int32, double precision: float64)
+STORE_COLUMNS = {
+    'category_id': 'text',
+    'store_id': 'bigint',
+    'price_zone': 'integer',
+    'upc_id': 'bigint',
+    'current_price': 'double precision',
+    'simulated_price': 'double precision',
+    'price_change_pct': 'double precision',
+    'elasticity': 'double precision',
+    'baseline_units': 'double precision',
+    'simulated_units': 'double precision',
+    'revenue_index': 'double precision',
+    'profit_index': 'double precision',
+    'simulated_profit': 'double precision',
+}
+
+ARROW_SCHEMA = pa.schema([
+    (name, {'text': pa.string(), 'bigint': pa.int64(), 'integer': pa.int32()}.get(pg_type, pa.float64()))
+    for name, pg_type in STORE_COLUMNS.items()
+])
+
+STORES_QUERY = """
+    select s.store_id, coalesce(d.price_zone::int, 0) as price_zone
+    from (select distinct store_id from elasticity_ready_panel_top where category_id = %(cat)s) s
+    left join dim_store_demographics d using (store_id)
+    order by 2, 1
+"""
+
+# Latest price and mean units of the last %(weeks)s weeks per (store, upc)
+INPUTS_QUERY = """
+    select store_id, upc_id,
+           exp(max(log_price) filter (where rn = 1)) as current_price,
+           avg(exp(log_sales)) as baseline_units
+    from (
+        select store_id, upc_id, log_price, log_sales,
+               row_number() over (partition by store_id, upc_id order by week_id desc) as rn
+        from elasticity_ready_panel_top
+        where category_id = %(cat)s and store_id = any(%(stores)s)
+    ) recent
+    where rn <= %(weeks)s
+    group by store_id, upc_id
+    order by upc_id, store_id
+"""
+
+def store_zones(category_id, engine):
+    """Stores of the category with their price zone (0 if unknown), ordered by zone."""
+    stores = fetch_frame(STORES_QUERY, engine, params={"cat": category_id})
+    return stores.astype({'store_id': np.int64, 'price_zone': np.int32})
+
+def chunk_columns(category_id, inputs, pct_grid, cost_ratio, costs):
+    """Scenario columns for a chunk of (store, upc) rows x the price grid."""
+    upc_ids = inputs['upc_id'].to_numpy(np.int64)
+    current_price = inputs['current_price'].to_numpy(float)
+    baseline_units = inputs['baseline_units'].to_numpy(float)
+    cost = scenario_engine.unit_costs(current_price, upc_ids, cost_ratio, costs)
+
+    columns = scenario_engine.scenario_columns(category_id, upc_ids, current_price,
+                                               inputs['elasticity'].to_numpy(float), cost, pct_grid)
+    steps = len(pct_grid)
+    units = np.repeat(baseline_units, steps) * columns['revenue_index'] / (1.0 + columns['price_change_pct'])
+    columns.update({
+        'store_id': np.repeat(inputs['store_id'].to_numpy(np.int64), steps),
+        'price_zone': np.repeat(inputs['price_zone'].to_numpy(np.int32), steps),
+        'baseline_units': np.repeat(baseline_units, steps),
+        'simulated_units': units,
+        'simulated_profit': (columns['simulated_price'] - np.repeat(cost, steps)) * units,
+    })
+    return {name: columns[name] for name in STORE_COLUMNS}
+
+def iter_store_scenarios(category_id, engine=None, pct_grid=None, store_block=16, upc_block=2000,
+                         cost_ratio=scenario_engine.DEFAULT_COST_RATIO, costs=None, baseline_weeks=13):
+    """
+    Yield scenario chunks ({column: array}, see STORE_COLUMNS) of at most
+    store_block stores x upc_block UPCs x len(pct_grid) rows.
+    """
+    engine = engine or get_db_engine()
+    pct_grid = scenario_engine.price_grid() if pct_grid is None else pct_grid
+    elasticity = pd.read_sql(text("select upc_id, elasticity from elasticity_catalog where category_id = :cat"),
+                             engine, params={"cat": category_id})
+    elasticity = elasticity.set_index('upc_id')['elasticity']
+    stores = store_zones(category_id, engine)
+    zone_of = stores.set_index('store_id')['price_zone']
+
+    for start in range(0, len(stores), store_block):
+        block = stores['store_id'].iloc[start:start + store_block]
+        inputs = fetch_frame(INPUTS_QUERY, engine, params={
+            "cat": category_id, "stores": [int(s) for s in block], "weeks": baseline_weeks})
+        inputs = inputs.astype({'store_id': np.int64, 'upc_id': np.int64})
+        inputs['elasticity'] = inputs['upc_id'].map(elasticity)
+        inputs = inputs.dropna(subset=['elasticity', 'current_price']).reset_index(drop=True)
+        inputs['price_zone'] = inputs['store_id'].map(zone_of)
+
+        # Rows are ordered by upc_id, so each UPC block is a contiguous slice
+        upc_ids = inputs['upc_id'].to_numpy()
+        bounds = np.searchsorted(upc_ids, np.unique(upc_ids)[::upc_block])
+        for lo, hi in zip(bounds, list(bounds[1:]) + [len(inputs)]):
+            yield chunk_columns(category_id, inputs.iloc[lo:hi], pct_grid, cost_ratio, costs)
+
+def _check_identifier(category_id):
+    if not re.fullmatch(r"\w+", category_id):
+        raise ValueError(f"Invalid category id: {category_id!r}")
+
+def write_postgres(engine, category_id, chunks, price_zones):
+    """
+    Replace the category's partition of store_scenario_results with the
+    streamed chunks, one binary COPY per chunk, in one transaction.
+    """
+    _check_identifier(category_id)
+    columns_ddl = ",\n        ".join(f"{name} {pg_type}" for name, pg_type in STORE_COLUMNS.items())
+    cat_table = f"{STORE_TABLE}_{category_id}"
+    n_rows = 0
+    with engine.begin() as conn:
+        conn.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS {STORE_TABLE} (
+                {columns_ddl}
+            ) PARTITION BY LIST (category_id)
+        """))
+        conn.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS {cat_table} PARTITION OF {STORE_TABLE}
+            FOR VALUES IN ('{category_id}') PARTITION BY LIST (price_zone)
+        """))
+        conn.execute(text(f"TRUNCATE {cat_table}"))
+        # The default partition is empty after the TRUNCATE, so new zones can be attached
+        for zone in sorted(set(int(z) for z in price_zones)):
+            conn.execute(text(f"""
+                CREATE TABLE IF NOT EXISTS {cat_table}_z{zone} PARTITION OF {cat_table} FOR VALUES IN ({zone})
+            """))
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {cat_table}_zdefault PARTITION OF {cat_table} DEFAULT"))
+        for columns in chunks:
+            copy_binary(conn, STORE_TABLE, columns)
+            n_rows += len(columns['upc_id'])
+        conn.execute(text(f"""
+            CREATE INDEX IF NOT EXISTS {STORE_TABLE}_store_id_upc_id_idx ON {STORE_TABLE} (store_id, upc_id)
+        """))
+    return n_rows
+
+def write_parquet(category_id, chunks):
+    """Rewrite the category in the lake's store_scenarios dataset from the streamed chunks."""
+    n_rows = [0]
+
+    def batches():
+        for columns in chunks:
+            n = len(columns['upc_id'])
+            n_rows[0] += n
+            arrays = {**columns, 'category_id': pa.repeat(category_id, n)}
+            yield pa.RecordBatch.from_pydict(arrays, schema=ARROW_SCHEMA)
+
+    lake.write_store_scenarios(batches(), ARROW_SCHEMA, category_id)
+    return n_rows[0]
+
+def run_store_simulation(category_id='sdr', sink='postgres', min_change_pct=-0.20, max_change_pct=0.20, steps=20,
+                         cost_ratio=scenario_engine.DEFAULT_COST_RATIO, costs=None, baseline_weeks=13,
+                         store_block=16, upc_block=2000):
+    print(f"Running store-level price simulation for {category_id} (sink={sink})...")
+    engine = get_db_engine()
+    pct_grid = scenario_engine.price_grid(min_change_pct, max_change_pct, steps)
+    chunks = iter_store_scenarios(category_id, engine, pct_grid, store_block=store_block, upc_block=upc_block,
+                                  cost_ratio=cost_ratio, costs=costs, baseline_weeks=baseline_weeks)
+    start = time.perf_counter()
+    if sink == 'postgres':
+        n_rows = write_postgres(engine, category_id, chunks, store_zones(category_id, engine)['price_zone'])
+        target = STORE_TABLE
+    elif sink == 'parquet':
+        n_rows = write_parquet(category_id, chunks)
+        target = "lake store_scenarios"
+    else:
+        raise ValueError(f"Unknown sink: {sink}")
+    print(f"{n_rows} store scenarios written to {target} in {time.perf_counter() - start:.1f}s "
+          f"(peak RSS {peak_rss_mb():.0f} MB).")
+    return n_rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Store x UPC price scenarios, streamed in chunks")
+    parser.add_argument("--category", type=str, default="sdr")
+    parser.add_argument("--sink", choices=["postgres", "parquet"], default="postgres")
+    parser.add_argument("--min-change", type=float, default=-0.20)
+    parser.add_argument("--max-change", type=float, default=0.20)
+    parser.add_argument("--steps", type=int, default=20)
+    parser.add_argument("--cost-ratio", type=float, default=scenario_engine.DEFAULT_COST_RATIO)
+    parser.add_argument("--costs", type=str, default=None, help="CSV with upc_id, unit_cost columns")
+    parser.add_argument("--baseline-weeks", type=int, default=13, help="Weeks averaged for the baseline volume")
+    parser.add_argument("--store-block", type=int, default=16, help="Stores fetched and simulated at a time")
+    parser.add_argument("--upc-block", type=int, default=2000, help="UPCs per chunk within a store block")
+    args = parser.parse_args()
+
+    costs = None
+    if args.costs:
+        costs = pd.read_csv(args.costs).set_index('upc_id')['unit_cost']
+    run_store_simulation(category_id=args.category, sink=args.sink, min_change_pct=args.min_change,
+                         max_change_pct=args.max_change, steps=args.steps, cost_ratio=args.cost_ratio, costs=costs,
+                         baseline_weeks=args.baseline_weeks, store_block=args.store_block, upc_block=args.upc_block)
@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+from scipy import stats
+from sqlalchemy import text
+from pipelines.utils import get_db_engine
+
+# Variables whose moments are stored in mart_regression_moments (in this order)
+MOMENT_VARS = ['log_price', 'promo_depth', 'is_promo', 'log_sales']
+
+def moment_column(a, b):
+    """Name of the mart column holding sum(a * b)."""
+    if a == b:
+        return f"sum_{a}_sq"
+    i, j = sorted((MOMENT_VARS.index(a), MOMENT_VARS.index(b)))
+    return f"sum_{MOMENT_VARS[i]}_x_{MOMENT_VARS[j]}"
+
+def moments_from_frame(df, group_cols, variables=None):
+    """
+    Same moments as mart_regression_moments, computed in pandas from a
+    row-level frame. variables: subset of MOMENT_VARS (default all).
+    """
+    variables = [v for v in MOMENT_VARS if v in (variables or MOMENT_VARS)]
+    out = df[group_cols].copy()
+    out['n_obs'] = 1
+    for a in variables:
+        out[f"sum_{a}"] = df[a].astype(float)
+    for i, a in enumerate(variables):
+        for b in variables[i:]:
+            out[moment_column(a, b)] = df[a].astype(float) * df[b].astype(float)
+    return out.groupby(group_cols, as_index=False).sum()
+
+def load_moments(category_id, engine=None):
+    engine = engine or get_db_engine()
+    return pd.read_sql(text("""
+        select * from mart_regression_moments
+        where category_id = :cat
+    """), engine, params={"cat": category_id})
+
+def _cross(moments, a, b):
+    """Per-row sum(a * b), where 'const' is the intercept column of ones."""
+    if a == 'const' and b == 'const':
+        return moments['n_obs'].to_numpy(float)
+    if a == 'const':
+        return moments[f"sum_{b}"].to_numpy(float)
+    if b == 'const':
+        return moments[f"sum_{a}"].to_numpy(float)
+    return moments[moment_column(a, b)].to_numpy(float)
+
+def normal_equations(moments, terms, target='log_sales'):
+    """
+    Assemble X'X, X'y, y'y, sum(y) and n from moment rows.
+
+    terms: list of (name, base_var, scale) where base_var is a MOMENT_VARS
+    entry or 'const', and scale is None or a column of `moments` that is
+    constant within each row's group (e.g. a store covariate). The regressor is
+    base_var * scale, so store-level covariates and their interactions with
+    row-level variables come out exactly from the per-store moments.
+    """
+    k = len(terms)
+    scales = [np.ones(len(moments)) if s is None else moments[s].to_numpy(float) for _, _, s in terms]
+    xtx = np.empty((k, k))
+    for i, (_, a, _) in enumerate(terms):
+        for j in range(i, k):
+            b = terms[j][1]
+            xtx[i, j] = xtx[j, i] = np.sum(scales[i] * scales[j] * _cross(moments, a, b))
+    xty = np.array([np.sum(scales[i] * _cross(moments, a, target)) for i, (_, a, _) in enumerate(terms)])
+    yty = np.sum(_cross(moments, target, target))
+    sum_y = np.sum(_cross(moments, 'const', target))
+    n = np.sum(moments['n_obs'].to_numpy(float))
+    return xtx, xty, yty, sum_y, n
+
+def ols_from_moments(moments, terms, target='log_sales'):
+    """
+    OLS coefficients, standard errors, t / p values and R^2 from moments alone.
+
+    Returns a dict with 'params', 'bse', 'tvalues', 'pvalues' (Series indexed
+    by term name), 'rsquared', 'sigma2' and 'nobs'.
+    """
+    names = [name for name, _, _ in terms]
+    xtx, xty, yty, sum_y, n = normal_equations(moments, terms, target)
+    k = len(terms)
+
+    xtx_inv = np.linalg.pinv(xtx)
+    beta = xtx_inv @ xty
+    # RSS = y'y - 2 b'X'y + b'X'X b  (= y'y - b'X'y at the solution)
+    rss = max(yty - beta @ xty, 0.0)
+    dof = n - k
+    sigma2 = rss / dof if dof > 0 else np.nan
+    bse = np.sqrt(np.clip(np.diag(xtx_inv) * sigma2, 0, None))
+    tvalues = beta / bse
+    pvalues = 2 * stats.t.sf(np.abs(tvalues), dof) if dof > 0 else np.full(k, np.nan)
+    tss = yty - sum_y ** 2 / n
+    rsquared = 1 - rss / tss if tss > 0 else np.nan
+
+    return {
+        'params': pd.Series(beta, index=names),
+        'bse': pd.Series(bse, index=names),
+        'tvalues': pd.Series(tvalues, index=names),
+        'pvalues': pd.Series(pvalues, index=names),
+        'rsquared': rsquared,
+        'sigma2': sigma2,
+        'nobs': int(n),
+    }
+
+def summary_table(result):
+    return pd.DataFrame({
+        'coef': result['params'],
+        'std err': result['bse'],
+        't': result['tvalues'],
+        'P>|t|': result['pvalues'],
+    })
@@ -0,0 +1,149 @@
+import os
+import threading
+import pyarrow as pa
+import pyarrow.csv as pacsv
+from pipelines.utils import get_db_engine
+
+try:
+    import adbc_driver_postgresql.dbapi as adbc_pg
+except ImportError:
+    adbc_pg = None
+
+# Postgres type OID -> Arrow type for the COPY path. Anything else arrives as string.
+OID_TYPES = {
+    16: pa.bool_(),                    # bool
+    20: pa.int64(),                    # int8
+    21: pa.int16(),                    # int2
+    23: pa.int32(),                    # int4
+    700: pa.float32(),                 # float4
+    701: pa.float64(),                 # float8
+    1700: pa.float64(),                # numeric
+    25: pa.string(),                   # text
+    1043: pa.string(),                 # varchar
+    1082: pa.date32(),                 # date
+    1114: pa.timestamp('us'),          # timestamp
+    1184: pa.timestamp('us', tz='UTC'),  # timestamptz (session TimeZone is set to UTC)
+}
+
+def _render(cur, query, params):
+    """Inline bind parameters (psycopg2 %(name)s style); COPY cannot take them."""
+    query = query.strip().rstrip(';')
+    if params:
+        query = cur.mogrify(query, params).decode()
+    return query
+
+def _schema(cur, query):
+    cur.execute(f"SELECT * FROM ({query}) _q LIMIT 0")
+    return pa.schema([(col.name, OID_TYPES.get(col.type_code, pa.string())) for col in cur.description])
+
+def _iter_copy(query, engine, params, block_size):
+    raw = engine.raw_connection()
+    ok = False
+    try:
+        cur = raw.cursor()
+        # LOCAL: the settings end with the transaction, before the connection goes back to the pool
+        cur.execute("SET LOCAL TimeZone = 'UTC'")
+        cur.execute("SET LOCAL DateStyle = 'ISO, YMD'")
+        query = _render(cur, query, params)
+        schema = _schema(cur, query)
+
+        read_fd, write_fd = os.pipe()
+        errors = []
+
+        def produce():
+            # Postgres writes CSV into the pipe while Arrow parses the other end
+            with os.fdopen(write_fd, 'wb') as sink:
+                try:
+                    cur.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv)", sink, size=1 << 20)
+                except Exception as e:
+                    errors.append(e)
+
+        producer = threading.Thread(target=produce, daemon=True)
+        producer.start()
+        with os.fdopen(read_fd, 'rb') as source:
+            if source.peek(1):
+                reader = pacsv.open_csv(
+                    source,
+                    read_options=pacsv.ReadOptions(column_names=schema.names, block_size=block_size),
+                    convert_options=pacsv.ConvertOptions(
+                        column_types={f.name: f.type for f in schema},
+                        null_values=[''],
+                        strings_can_be_null=True,
+                        quoted_strings_can_be_null=False,
+                        true_values=['t'],
+                        false_values=['f'],
+                    ),
+                )
+                for batch in reader:
+                    yield batch
+        producer.join()
+        if errors:
+            raise errors[0]
+        raw.rollback()
+        ok = True
+    finally:
+        if ok:
+            raw.close()
+        else:
+            # The COPY may still be mid-stream; never hand this connection back to the pool
+            raw.invalidate()
+
+def _iter_adbc(query, engine, params):
+    raw = engine.raw_connection()
+    try:
+        query = _render(raw.cursor(), query, params)
+    finally:
+        raw.close()
+    uri = engine.url.set(drivername='postgresql').render_as_string(hide_password=False)
+    with adbc_pg.connect(uri) as conn:
+        with conn.cursor() as cur:
+            cur.execute(query)
+            reader = cur.fetch_record_batch()
+            for batch in reader:
+                yield batch
+
+def _backend(backend):
+    backend = backend or os.getenv("PIRO_FETCH_BACKEND", "auto")
+    if backend == 'auto':
+        return 'adbc' if adbc_pg is not None else 'copy'
+    if backend == 'adbc' and adbc_pg is None:
+        raise RuntimeError("backend='adbc' needs the adbc-driver-postgresql package.")
+    if backend not in ('adbc', 'copy'):
+        raise ValueError(f"Unknown fetch backend: {backend}")
+    return backend
+
+def iter_arrow_batches(query, engine=None, params=None, backend=None, block_size=16 << 20):
+    """
+    Stream a query result as Arrow RecordBatches, for out-of-core consumers.
+
+    backend: 'adbc' (adbc-driver-postgresql, Arrow end to end), 'copy'
+             (COPY ... TO STDOUT parsed by Arrow's multithreaded CSV reader,
+             column types taken from the result's type OIDs) or 'auto' / None
+             (PIRO_FETCH_BACKEND, else adbc if installed, else copy)
+    block_size: bytes of CSV per batch on the copy path
+    """
+    engine = engine or get_db_engine()
+    if _backend(backend) == 'adbc':
+        return _iter_adbc(query, engine, params)
+    return _iter_copy(query, engine, params, block_size)
+
+def fetch_arrow(query, engine=None, params=None, backend=None):
+    """Whole query result as a pyarrow.Table."""
+    engine = engine or get_db_engine()
+    backend = _backend(backend)
+    batches = list(iter_arrow_batches(query, engine, params, backend))
+    if batches:
+        return pa.Table.from_batches(batches)
+    # No rows: still return the right columns
+    raw = engine.raw_connection()
+    try:
+        cur = raw.cursor()
+        schema = _schema(cur, _render(cur, query, params))
+        raw.rollback()
+    finally:
+        raw.close()
+    return schema.empty_table()
+
+def fetch_frame(query, engine=None, params=None, backend=None):
+    """Drop-in replacement for pd.read_sql(query, engine) on large results."""
+    return fetch_arrow(query, engine, params, backend).to_pandas()
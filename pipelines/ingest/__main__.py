@@ -0,0 +1,119 @@
+"""
+Parallel ingestion entry point: python -m pipelines.ingest
+
+Runs every raw source file (ccount, demo, upc{cat}, w{cat}) as an
+independent task in a process pool. Each worker holds at most one database
+connection, so the pool size is also the connection budget. The first
+failure cancels everything still queued and the run ends with a summary.
+"""
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from pipelines.ingest.load_ccount import load_ccount
+from pipelines.ingest.load_demo import load_demo
+from pipelines.ingest.load_upc import load_upc_category
+from pipelines.ingest.load_movement import load_movement_category, CATEGORIES
+
+def _file_size(*filenames):
+    for filename in filenames:
+        for path in (f"/app/data/raw/{filename}", f"data/raw/{filename}"):
+            if os.path.exists(path):
+                return os.path.getsize(path)
+    return 0
+
+def build_tasks(mode, sink, force, categories):
+    """(name, size_bytes, fn, kwargs) for every ingestion task."""
+    tasks = [
+        ("ccount", _file_size("ccount(stata).zip", "ccount.dta"), load_ccount, {}),
+        ("demo", _file_size("demo(stata).zip", "demo.dta"), load_demo, {}),
+    ]
+    for cat in categories:
+        tasks.append((f"upc:{cat}", _file_size(f"upc{cat}.csv"), load_upc_category,
+                      {"cat": cat, "sink": sink}))
+        tasks.append((f"movement:{cat}", _file_size(f"w{cat}.csv"), load_movement_category,
+                      {"cat": cat, "mode": mode, "force": force, "sink": sink}))
+    # Largest files first so the long tail doesn't start last
+    return sorted(tasks, key=lambda t: t[1], reverse=True)
+
+def _init_worker():
+    # One connection per worker: the pool size is the connection budget
+    os.environ["PIRO_DB_POOL_SIZE"] = "1"
+    os.environ["PIRO_DB_MAX_OVERFLOW"] = "0"
+
+def _run_task(name, fn, kwargs):
+    start = time.perf_counter()
+    rows = fn(**kwargs)
+    return rows, time.perf_counter() - start
+
+def _print_summary(results, wall):
+    print("\n--- Ingestion Summary ---")
+    print(f"{'task':<14} {'status':<10} {'seconds':>8} {'rows':>12}  error")
+    for name, (status, seconds, rows, error) in results.items():
+        secs = f"{seconds:.1f}" if seconds is not None else "-"
+        nrows = f"{rows:,}" if rows is not None else "-"
+        print(f"{name:<14} {status:<10} {secs:>8} {nrows:>12}  {error or ''}")
+    print(f"Wall time: {wall:.1f}s")
+
+def run_ingest(workers=4, max_db_connections=4, mode='copy', sink='postgres', force=False,
+               categories=None):
+    tasks = build_tasks(mode, sink, force, categories or CATEGORIES)
+    workers = max(1, min(workers, max_db_connections, len(tasks)))
+    print(f"Running {len(tasks)} ingestion tasks on {workers} workers "
+          f"(mode={mode}, sink={sink}, <= {workers} DB connections).")
+
+    results = {name: ("cancelled", None, None, None) for name, _, _, _ in tasks}
+    failed = False
+    wall_start = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        # Only `workers` tasks are ever in flight, so a failure leaves the rest unsubmitted
+        queue = iter(tasks)
+        pending = {}
+
+        def submit_next():
+            for name, _, fn, kwargs in queue:
+                pending[executor.submit(_run_task, name, fn, kwargs)] = name
+                return
+
+        for _ in range(workers):
+            submit_next()
+
+        done_count = 0
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = pending.pop(future)
+                done_count += 1
+                try:
+                    rows, seconds = future.result()
+                except Exception as e:
+                    results[name] = ("failed", None, None, f"{type(e).__name__}: {e}")
+                    print(f"[{done_count:>2}/{len(tasks)}] FAILED  {name}: {e}")
+                    failed = True
+                    continue
+                status = "skipped" if rows is None else "ok"
+                results[name] = (status, seconds, rows, None)
+                print(f"[{done_count:>2}/{len(tasks)}] {status:<7} {name} in {seconds:.1f}s"
+                      + (f" ({rows:,} rows)" if rows is not None else ""))
+                if not failed:
+                    submit_next()
+
+    _print_summary(results, time.perf_counter() - wall_start)
+    return not failed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run all raw ingestion tasks in parallel")
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1))
+    parser.add_argument("--max-db-connections", type=int, default=4)
+    parser.add_argument("--mode", choices=["insert", "copy"], default="copy")
+    parser.add_argument("--sink", choices=["postgres", "parquet", "both"], default="postgres")
+    parser.add_argument("--categories", nargs="+", choices=CATEGORIES, default=None)
+    parser.add_argument("--force", action="store_true",
+                        help="Ignore the ingest manifest and reload every movement file")
+    args = parser.parse_args()
+
+    ok = run_ingest(workers=args.workers, max_db_connections=args.max_db_connections,
+                    mode=args.mode, sink=args.sink, force=args.force, categories=args.categories)
+    sys.exit(0 if ok else 1)
@@ -1,6 +1,22 @@
 import pandas as pd
 import os
-from pipelines.utils import get_db_engine
+from sqlalchemy import text
+from pipelines.utils import get_db_engine, copy_dataframe
+
+# Rows per Stata chunk; the daily ccount file is never held in memory at once
+CHUNKSIZE = 100000
+
+def _conform(chunk, dtypes):
+    """
+    Cast a chunk to the staging table's column types (taken from the first
+    chunk). read_stata turns an int column into float64 in any chunk where it
+    has missing values; those go back to integers as nullable Int64, with the
+    missing values written as NULL.
+    """
+    for col, dtype in dtypes.items():
+        if pd.api.types.is_integer_dtype(dtype) and not pd.api.types.is_integer_dtype(chunk[col].dtype):
+            chunk[col] = chunk[col].astype('Int64')
+    return chunk
 
 def load_ccount():
     print("Loading ccount (Store Traffic)...")
@@ -20,27 +36,41 @@ def load_ccount():
 
     if not os.path.exists(data_path):
         print(f"Skipping ccount: File not found at {data_path}")
-        return
+        return None
+
+    # raw_ccount: store, date, count (+ department counts), kept raw.
+    # Chunks are COPY'd into a staging table that replaces raw_ccount at the end,
+    # so readers never see a half-loaded table.
+    engine = get_db_engine()
+    staging = "raw_ccount__staging"
+    rows = 0
+    dtypes = None
 
     # Pandas can read directly from zip if it contains one file
     # We assume standard Stata zip from Kilts Center
     try:
-        df = pd.read_stata(data_path)
+        with pd.read_stata(data_path, iterator=True, chunksize=CHUNKSIZE) as reader:
+            for i, chunk in enumerate(reader):
+                chunk.columns = [c.lower() for c in chunk.columns]
+                with engine.begin() as conn:
+                    if i == 0:
+                        conn.execute(text(f"DROP TABLE IF EXISTS {staging}"))
+                        chunk.head(0).to_sql(staging, conn, schema='public', index=False)
+                        dtypes = chunk.dtypes
+                    else:
+                        chunk = _conform(chunk, dtypes)
+                    rows += copy_dataframe(conn, chunk, staging)
+                print(f"Loaded chunk {i+1} ({len(chunk)} rows) into {staging}.")
     except Exception as e:
         print(f"Error reading Stata file: {e}")
-        # Build robustness: try extracting first
-        return
-
-    # Clean columns
-    df.columns = [c.lower() for c in df.columns]
-    
-    # Simple rename for clarity if needed, or keeping raw
-    # raw_ccount: store, date, count
-    
-    # Store to DB
-    engine = get_db_engine()
-    df.to_sql('raw_ccount', engine, schema='public', if_exists='replace', index=False, chunksize=10000)
-    print(f"Loaded {len(df)} rows into raw_ccount.")
+        raise
+
+    with engine.begin() as conn:
+        # dbt views over the raw tables are rebuilt by the next `dbt run`.
+        conn.execute(text("DROP TABLE IF EXISTS raw_ccount CASCADE"))
+        conn.execute(text(f"ALTER TABLE {staging} RENAME TO raw_ccount"))
+    print(f"Loaded {rows} rows into raw_ccount.")
+    return rows
 
 if __name__ == "__main__":
     load_ccount()
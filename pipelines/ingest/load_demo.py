@@ -17,19 +17,20 @@ def load_demo():
 
     if not os.path.exists(data_path):
         print(f"Skipping demo: File not found at {data_path}")
-        return
+        return None
 
     try:
         df = pd.read_stata(data_path)
     except Exception as e:
         print(f"Error reading Stata file: {e}")
-        return
+        raise
 
     df.columns = [c.lower() for c in df.columns]
     
     engine = get_db_engine()
     df.to_sql('raw_demo', engine, schema='public', if_exists='replace', index=False)
     print(f"Loaded {len(df)} rows into raw_demo.")
+    return len(df)
 
 if __name__ == "__main__":
     load_demo()
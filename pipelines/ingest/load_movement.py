@@ -1,39 +1,209 @@
+import io
 import pandas as pd
 import os
-from pipelines.utils import get_db_engine
+import time
+import argparse
+from sqlalchemy import text
+from pipelines.utils import get_db_engine, peak_rss_mb
+from pipelines.ingest import manifest
+from pipelines import lake
 
 CATEGORIES = ['sdr', 'cer', 'lnd', 'sna']
 
-def load_movement():
-    engine = get_db_engine()
-    
-    for cat in CATEGORIES:
-        print(f"Loading Movement for category: {cat}...")
-        filename = f"w{cat}.csv"
-        data_path = f"/app/data/raw/{filename}"
-        if not os.path.exists(data_path):
-            data_path = f"data/raw/{filename}"
-        
-        if not os.path.exists(data_path):
-            print(f"Skipping {cat}: {filename} not found.")
-            continue
-            
-        # These files can be large, chunking or careful typing recommended for prod
-        # For sprint 1, we assume memory is sufficient for one category
+# Lines per committed chunk. COPY is cheap per statement, so it commits less often.
+CHUNK_LINES = {'insert': 50000, 'copy': 1000000}
+
+# Explicit Postgres types for the DFF movement columns.
+# Anything not listed here (e.g. PRICE_HEX / PROFIT_HEX) is loaded as text.
+MOVEMENT_COLUMN_TYPES = {
+    'store': 'integer',
+    'upc': 'bigint',
+    'week': 'integer',
+    'move': 'integer',
+    'qty': 'integer',
+    'price': 'double precision',
+    'sale': 'text',
+    'profit': 'double precision',
+    'ok': 'integer',
+}
+
+def _parse_header(header):
+    return [c.strip().strip('"').lower() for c in header.decode('latin1').strip().split(',')]
+
+def _table_exists(conn, table_name):
+    return conn.execute(text("SELECT to_regclass(:t) IS NOT NULL"), {"t": table_name}).scalar()
+
+def _row_count(conn, table_name):
+    return conn.execute(text(f"SELECT COUNT(*) FROM {table_name}")).scalar()
+
+def _insert_chunk(conn, cat, table_name, header, body, replace):
+    chunk = pd.read_csv(io.BytesIO(header + body), encoding='latin1')
+    chunk.columns = [c.lower() for c in chunk.columns]
+    chunk['category_id'] = cat
+    chunk.to_sql(table_name, conn, schema='public',
+                 if_exists='replace' if replace else 'append', index=False)
+    return len(chunk)
+
+def _copy_chunk(conn, table_name, columns, body):
+    # The bytes are passed through untouched; Postgres handles the latin1 decoding.
+    column_list = ", ".join(f'"{c}"' for c in columns)
+    cur = conn.connection.cursor()
+    cur.copy_expert(
+        f"COPY {table_name} ({column_list}) FROM STDIN WITH (FORMAT csv, ENCODING 'LATIN1')",
+        io.BytesIO(body),
+        size=1 << 20,
+    )
+    return cur.rowcount
+
+def _create_staging(conn, cat, staging_name, columns):
+    column_ddl = ", ".join(f'"{c}" {MOVEMENT_COLUMN_TYPES.get(c, "text")}' for c in columns)
+    conn.execute(text(f"DROP TABLE IF EXISTS {staging_name}"))
+    conn.execute(text(
+        f"CREATE UNLOGGED TABLE {staging_name} ({column_ddl}, "
+        f"category_id text NOT NULL DEFAULT '{cat}')"
+    ))
+
+def _swap_staging(conn, staging_name, table_name):
+    # dbt views over the raw tables are rebuilt by the next `dbt run`.
+    conn.execute(text(f"DROP TABLE IF EXISTS {table_name} CASCADE"))
+    conn.execute(text(f"ALTER TABLE {staging_name} RENAME TO {table_name}"))
+
+def load_movement_file(engine, cat, data_path, mode='insert', force=False):
+    """
+    Load one movement CSV into raw_w{cat}, resuming from the ingest manifest.
+
+    mode='insert' writes each chunk with DataFrame.to_sql into the live table.
+    mode='copy' streams chunks through COPY FROM STDIN into an unlogged staging
+    table that is swapped into raw_w{cat} once the whole file is in.
+    Each chunk commits together with its manifest update, so a crash loses at
+    most the chunk in flight. Returns the number of rows written by this call.
+    """
+    table_name = f"raw_w{cat}"
+    staging_name = f"{table_name}__staging"
+    plan = manifest.plan_load(engine, data_path, force=force)
+
+    if plan.action == 'skip':
+        print(f"{table_name}: {data_path} unchanged since last load, skipping.")
+        return 0
+
+    # Where do the chunks go?
+    #   insert           -> live table
+    #   copy, fresh load -> staging, swapped in at the end
+    #   copy, resume     -> staging if the load never finished, else append to live
+    target = table_name
+    swap = False
+    if mode == 'copy':
+        swap = plan.previous_status != 'complete'
+        target = staging_name if swap else table_name
+
+    if plan.action == 'resume':
+        with engine.connect() as conn:
+            # Unlogged staging tables are truncated by a server crash
+            ok = _table_exists(conn, target) and _row_count(conn, target) == plan.rows_loaded
+        if not ok:
+            print(f"{table_name}: {target} does not match the manifest, reloading from scratch.")
+            plan = manifest.plan_load(engine, data_path, force=True)
+            swap = mode == 'copy'
+            target = staging_name if swap else table_name
+        else:
+            print(f"{table_name}: resuming at chunk {plan.start_chunk} "
+                  f"(byte {plan.start_offset:,}, {plan.rows_loaded:,} rows already loaded).")
+
+    hasher = plan.prefix_hasher
+    chunks = plan.start_chunk
+    total_rows = plan.rows_loaded
+    new_rows = 0
+
+    if plan.action == 'fresh' and mode == 'copy':
+        with open(data_path, 'rb') as f:
+            columns = _parse_header(f.readline())
+        with engine.begin() as conn:
+            _create_staging(conn, cat, staging_name, columns)
+            manifest.start_load(conn, plan, table_name)
+    elif plan.action == 'fresh':
+        with engine.begin() as conn:
+            manifest.start_load(conn, plan, table_name)
+    elif mode == 'copy' and not swap:
+        with engine.begin() as conn:
+            conn.execute(text(f"ALTER TABLE {table_name} ALTER COLUMN category_id SET DEFAULT '{cat}'"))
+
+    for header, body, end_offset in manifest.iter_line_chunks(data_path, plan.start_offset, CHUNK_LINES[mode]):
+        if chunks == 0 and plan.start_offset == 0:
+            hasher.update(header)
+        hasher.update(body)
+
+        with engine.begin() as conn:
+            if mode == 'copy':
+                rows = _copy_chunk(conn, target, _parse_header(header), body)
+            else:
+                rows = _insert_chunk(conn, cat, target, header, body, replace=(chunks == 0))
+            chunks += 1
+            total_rows += rows
+            manifest.commit_chunk(conn, data_path, chunks, end_offset, hasher.hexdigest(), total_rows)
+        new_rows += rows
+        print(f"Loaded chunk {chunks} ({rows} rows) into {target}.")
+
+    if mode == 'copy' and swap:
+        # WAL-log the table before it becomes the live raw table
+        with engine.begin() as conn:
+            conn.execute(text(f"ALTER TABLE {staging_name} SET LOGGED"))
+    with engine.begin() as conn:
+        if mode == 'copy' and swap:
+            _swap_staging(conn, staging_name, table_name)
+        manifest.complete_load(conn, plan, hasher.hexdigest())
+
+    return new_rows
+
+def _report(target, rows, elapsed):
+    rate = rows / elapsed if elapsed > 0 else 0.0
+    print(f"Loaded {rows} rows into {target} in {elapsed:.1f}s "
+          f"({rate:,.0f} rows/s, peak RSS {peak_rss_mb():.0f} MB).")
+
+def load_movement_category(cat, mode='insert', force=False, sink='postgres'):
+    """
+    Load w{cat}.csv into raw_w{cat} (sink='postgres'), the Parquet lake
+    (sink='parquet'), or both. Returns the number of rows written, or None
+    if the file is missing.
+    """
+    filename = f"w{cat}.csv"
+    data_path = f"/app/data/raw/{filename}"
+    if not os.path.exists(data_path):
+        data_path = f"data/raw/{filename}"
+
+    if not os.path.exists(data_path):
+        print(f"Skipping {cat}: {filename} not found.")
+        return None
+
+    rows = 0
+    if sink in ('postgres', 'both'):
+        engine = get_db_engine()
+        manifest.ensure_manifest(engine)
+        start = time.perf_counter()
+        rows = load_movement_file(engine, cat, data_path, mode=mode, force=force)
+        _report(f"raw_w{cat}", rows, time.perf_counter() - start)
+    if sink in ('parquet', 'both'):
+        start = time.perf_counter()
+        rows = lake.write_movement(data_path, cat)
+        _report(f"lake movement/category_id={cat}", rows, time.perf_counter() - start)
+    return rows
+
+def load_movement(mode='insert', categories=None, force=False, sink='postgres'):
+    for cat in categories or CATEGORIES:
+        print(f"Loading Movement for category: {cat} (mode={mode}, sink={sink})...")
         try:
-            chunksize = 50000
-            for i, chunk in enumerate(pd.read_csv(data_path, encoding='latin1', chunksize=chunksize)):
-                chunk.columns = [c.lower() for c in chunk.columns]
-                chunk['category_id'] = cat
-                
-                table_name = f"raw_w{cat}"
-                if_exists = 'replace' if i == 0 else 'append'
-                chunk.to_sql(table_name, engine, schema='public', if_exists=if_exists, index=False)
-                print(f"Loaded chunk {i+1} ({len(chunk)} rows) into {table_name}.")
-                
+            load_movement_category(cat, mode=mode, force=force, sink=sink)
         except Exception as e:
-            print(f"Error reading CSV {filename}: {e}")
+            print(f"Error loading movement for {cat}: {e}")
             continue
 
 if __name__ == "__main__":
-    load_movement()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mode", choices=["insert", "copy"], default="insert",
+                        help="insert: chunked DataFrame.to_sql, copy: streaming COPY FROM STDIN")
+    parser.add_argument("--categories", nargs="+", choices=CATEGORIES, default=None)
+    parser.add_argument("--force", action="store_true",
+                        help="Ignore the ingest manifest and reload every file")
+    parser.add_argument("--sink", choices=["postgres", "parquet", "both"], default="postgres")
+    args = parser.parse_args()
+
+    load_movement(mode=args.mode, categories=args.categories, force=args.force, sink=args.sink)
@@ -1,35 +1,49 @@
 import pandas as pd
 import os
+import argparse
 from pipelines.utils import get_db_engine
+from pipelines import lake
 
 CATEGORIES = ['sdr', 'cer', 'lnd', 'sna']
 
-def load_upc():
-    engine = get_db_engine()
+def load_upc_category(cat, sink='postgres'):
+    """Load upc{cat}.csv. Returns the row count, or None if the file is missing."""
+    filename = f"upc{cat}.csv"
+    data_path = f"/app/data/raw/{filename}"
+    if not os.path.exists(data_path):
+        data_path = f"data/raw/{filename}"
     
+    if not os.path.exists(data_path):
+        print(f"Skipping {cat}: {filename} not found.")
+        return None
+
+    if sink in ('parquet', 'both'):
+        rows = lake.write_upc(data_path, cat)
+        print(f"Wrote {rows} rows to lake upc/category_id={cat}.")
+        if sink == 'parquet':
+            return rows
+
+    df = pd.read_csv(data_path, encoding='latin1')
+    df.columns = [c.lower() for c in df.columns]
+    df['category_id'] = cat
+    
+    table_name = f"raw_upc_{cat}"
+    df.to_sql(table_name, get_db_engine(), schema='public', if_exists='replace', index=False)
+    print(f"Loaded {len(df)} rows into {table_name}.")
+    return len(df)
+
+def load_upc(sink='postgres'):
     for cat in CATEGORIES:
         print(f"Loading UPCs for category: {cat}...")
-        filename = f"upc{cat}.csv"
-        data_path = f"/app/data/raw/{filename}"
-        if not os.path.exists(data_path):
-            data_path = f"data/raw/{filename}"
-        
-        if not os.path.exists(data_path):
-            print(f"Skipping {cat}: {filename} not found.")
-            continue
-            
         try:
-            df = pd.read_csv(data_path, encoding='latin1')
+            load_upc_category(cat, sink=sink)
         except Exception as e:
-            print(f"Error reading CSV {filename}: {e}")
+            print(f"Error loading UPCs for {cat}: {e}")
             continue
 
-        df.columns = [c.lower() for c in df.columns]
-        df['category_id'] = cat
-        
-        table_name = f"raw_upc_{cat}"
-        df.to_sql(table_name, engine, schema='public', if_exists='replace', index=False)
-        print(f"Loaded {len(df)} rows into {table_name}.")
-
 if __name__ == "__main__":
-    load_upc()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sink", choices=["postgres", "parquet", "both"], default="postgres")
+    args = parser.parse_args()
+
+    load_upc(sink=args.sink)
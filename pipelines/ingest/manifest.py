@@ -0,0 +1,185 @@
+import os
+import hashlib
+from dataclasses import dataclass
+from typing import Optional
+from sqlalchemy import text
+
+# One row per ingested source file.
+# committed_offset / committed_hash describe the prefix of the file that is
+# durably loaded: every chunk is written in the same transaction as the
+# manifest update, so the two can never disagree.
+MANIFEST_DDL = """
+    CREATE TABLE IF NOT EXISTS ingest_manifest (
+        file_path TEXT PRIMARY KEY,
+        target_table TEXT NOT NULL,
+        file_size BIGINT NOT NULL,
+        file_mtime_ns BIGINT NOT NULL,
+        content_hash TEXT,
+        committed_chunks INTEGER NOT NULL DEFAULT 0,
+        committed_offset BIGINT NOT NULL DEFAULT 0,
+        committed_hash TEXT NOT NULL,
+        rows_loaded BIGINT NOT NULL DEFAULT 0,
+        status TEXT NOT NULL,
+        updated_at TIMESTAMP DEFAULT NOW()
+    )
+"""
+
+HASH_BLOCK = 8 * 1024 * 1024
+
+@dataclass
+class LoadPlan:
+    action: str                 # 'skip', 'resume' or 'fresh'
+    file_path: str
+    file_size: int
+    file_mtime_ns: int
+    start_offset: int = 0
+    start_chunk: int = 0
+    rows_loaded: int = 0
+    prefix_hasher: Optional[object] = None
+    previous_status: Optional[str] = None
+
+def ensure_manifest(engine):
+    with engine.begin() as conn:
+        conn.execute(text(MANIFEST_DDL))
+
+def get_entry(conn, file_path):
+    row = conn.execute(
+        text("SELECT * FROM ingest_manifest WHERE file_path = :p"), {"p": file_path}
+    ).mappings().fetchone()
+    return dict(row) if row else None
+
+def _hash_file(file_path, snapshot_offset):
+    """
+    Hash the whole file in one pass, also returning a copy of the hasher
+    state at `snapshot_offset` so a load can be resumed from there.
+    """
+    full = hashlib.sha256()
+    prefix = hashlib.sha256() if snapshot_offset == 0 else None
+    pos = 0
+    with open(file_path, 'rb') as f:
+        while True:
+            block = f.read(HASH_BLOCK)
+            if not block:
+                break
+            if prefix is None and pos + len(block) >= snapshot_offset:
+                cut = snapshot_offset - pos
+                full.update(block[:cut])
+                prefix = full.copy()
+                full.update(block[cut:])
+            else:
+                full.update(block)
+            pos += len(block)
+    return full.hexdigest(), prefix
+
+def _ends_on_newline(file_path, offset):
+    if offset == 0:
+        return True
+    with open(file_path, 'rb') as f:
+        f.seek(offset - 1)
+        return f.read(1) == b'\n'
+
+def plan_load(engine, file_path, force=False):
+    """
+    Decide how much of `file_path` still has to be loaded.
+
+    - skip:   the file is fully loaded and unchanged
+    - resume: the first committed_offset bytes are unchanged (partial load,
+              or a file that has only been appended to since the last run)
+    - fresh:  anything else; the target is rebuilt from the first chunk
+    """
+    stat = os.stat(file_path)
+    with engine.connect() as conn:
+        entry = get_entry(conn, file_path)
+
+    plan = LoadPlan(action='fresh', file_path=file_path,
+                    file_size=stat.st_size, file_mtime_ns=stat.st_mtime_ns)
+    if force or entry is None:
+        plan.prefix_hasher = hashlib.sha256()
+        return plan
+
+    # Fast path: same size and mtime as a completed load, don't re-read the file
+    if (entry['status'] == 'complete' and entry['file_size'] == stat.st_size
+            and entry['file_mtime_ns'] == stat.st_mtime_ns):
+        plan.action = 'skip'
+        return plan
+
+    offset = entry['committed_offset']
+    if offset > stat.st_size:
+        plan.prefix_hasher = hashlib.sha256()
+        return plan
+
+    content_hash, prefix_hasher = _hash_file(file_path, offset)
+    if entry['status'] == 'complete' and entry['content_hash'] == content_hash:
+        plan.action = 'skip'
+    elif prefix_hasher.hexdigest() == entry['committed_hash'] and _ends_on_newline(file_path, offset):
+        plan.action = 'resume'
+        plan.start_offset = offset
+        plan.start_chunk = entry['committed_chunks']
+        plan.rows_loaded = entry['rows_loaded']
+        plan.prefix_hasher = prefix_hasher
+        plan.previous_status = entry['status']
+    else:
+        plan.prefix_hasher = hashlib.sha256()
+    return plan
+
+def start_load(conn, plan, target_table):
+    """Reset the manifest row for a fresh load (inside the first chunk's transaction)."""
+    conn.execute(text("""
+        INSERT INTO ingest_manifest (file_path, target_table, file_size, file_mtime_ns,
+                                     committed_hash, status)
+        VALUES (:p, :t, :s, :m, :h, 'loading')
+        ON CONFLICT (file_path) DO UPDATE SET
+            target_table = EXCLUDED.target_table,
+            file_size = EXCLUDED.file_size,
+            file_mtime_ns = EXCLUDED.file_mtime_ns,
+            content_hash = NULL,
+            committed_chunks = 0,
+            committed_offset = 0,
+            committed_hash = EXCLUDED.committed_hash,
+            rows_loaded = 0,
+            status = 'loading',
+            updated_at = NOW()
+    """), {"p": plan.file_path, "t": target_table, "s": plan.file_size,
+           "m": plan.file_mtime_ns, "h": hashlib.sha256().hexdigest()})
+
+def commit_chunk(conn, file_path, chunks, offset, committed_hash, rows_loaded):
+    conn.execute(text("""
+        UPDATE ingest_manifest SET
+            committed_chunks = :c,
+            committed_offset = :o,
+            committed_hash = :h,
+            rows_loaded = :r,
+            status = 'loading',
+            updated_at = NOW()
+        WHERE file_path = :p
+    """), {"p": file_path, "c": chunks, "o": offset, "h": committed_hash, "r": rows_loaded})
+
+def complete_load(conn, plan, content_hash):
+    conn.execute(text("""
+        UPDATE ingest_manifest SET
+            file_size = :s,
+            file_mtime_ns = :m,
+            content_hash = :h,
+            status = 'complete',
+            updated_at = NOW()
+        WHERE file_path = :p
+    """), {"p": plan.file_path, "s": plan.file_size, "m": plan.file_mtime_ns, "h": content_hash})
+
+def iter_line_chunks(file_path, start_offset, lines_per_chunk):
+    """
+    Yield (header, body, end_offset) for consecutive blocks of whole CSV lines,
+    starting at byte `start_offset` (which must sit on a line boundary).
+    """
+    with open(file_path, 'rb') as f:
+        header = f.readline()
+        if start_offset > f.tell():
+            f.seek(start_offset)
+        while True:
+            lines = []
+            for line in f:
+                lines.append(line)
+                if len(lines) >= lines_per_chunk:
+                    break
+            if not lines:
+                return
+            yield header, b''.join(lines), f.tell()
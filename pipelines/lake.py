@@ -0,0 +1,150 @@
+import os
+import shutil
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.dataset as ds
+import pyarrow.compute as pc
+from pyarrow import fs
+
+# Weeks per `week_block` partition (DFF spans ~400 weeks, so ~8 blocks per category)
+WEEK_BLOCK = 52
+
+MOVEMENT_TYPES = {
+    'store': pa.int32(),
+    'upc': pa.int64(),
+    'week': pa.int32(),
+    'move': pa.int32(),
+    'qty': pa.int32(),
+    'price': pa.float32(),
+    'sale': pa.string(),
+    'profit': pa.float32(),
+    'ok': pa.int8(),
+}
+
+UPC_TYPES = {
+    'com_code': pa.int32(),
+    'upc': pa.int64(),
+    'descrip': pa.string(),
+    'size': pa.string(),
+    'case': pa.int32(),
+    'nitem': pa.int64(),
+}
+
+def lake_root():
+    root = os.getenv("PIRO_LAKE_DIR")
+    if root:
+        return root
+    return "/app/data/lake" if os.path.isdir("/app/data") else "data/lake"
+
+def week_block(week):
+    return (week - 1) // WEEK_BLOCK
+
+def _open_csv(data_path, column_types, block_size):
+    with open(data_path, 'r', encoding='latin1') as f:
+        names = [c.strip().strip('"').lower() for c in f.readline().strip().split(',')]
+    read_options = pacsv.ReadOptions(encoding='latin1', column_names=names, skip_rows=1,
+                                     block_size=block_size)
+    convert_options = pacsv.ConvertOptions(
+        column_types={c: t for c, t in column_types.items() if c in names},
+        strings_can_be_null=True,
+    )
+    return pacsv.open_csv(data_path, read_options=read_options, convert_options=convert_options)
+
+def _write(batches, schema, name, partition_schema, cat):
+    base_dir = os.path.join(lake_root(), name)
+    # A category is always rewritten as a whole
+    shutil.rmtree(os.path.join(base_dir, f"category_id={cat}"), ignore_errors=True)
+    file_format = ds.ParquetFileFormat()
+    ds.write_dataset(
+        batches,
+        base_dir=base_dir,
+        schema=schema,
+        format=file_format,
+        file_options=file_format.make_write_options(compression='zstd'),
+        partitioning=ds.partitioning(partition_schema, flavor='hive'),
+        existing_data_behavior='overwrite_or_ignore',
+        basename_template=f"part-{cat}-{{i}}.parquet",
+        max_rows_per_group=1 << 20,
+    )
+
+def write_movement(data_path, cat, block_size=64 << 20):
+    """
+    Stream a DFF movement CSV into the lake as typed, zstd-compressed Parquet
+    partitioned by category_id / week_block. Returns the number of rows written.
+    """
+    reader = _open_csv(data_path, MOVEMENT_TYPES, block_size)
+    schema = (reader.schema
+              .append(pa.field('category_id', pa.string()))
+              .append(pa.field('week_block', pa.int32())))
+    rows = [0]
+
+    def batches():
+        for batch in reader:
+            rows[0] += batch.num_rows
+            blocks = pc.divide(pc.subtract(batch.column('week'), 1), WEEK_BLOCK)
+            yield pa.RecordBatch.from_arrays(
+                batch.columns + [pa.array([cat] * batch.num_rows, pa.string()), blocks.cast(pa.int32())],
+                schema=schema,
+            )
+
+    partition_schema = pa.schema([('category_id', pa.string()), ('week_block', pa.int32())])
+    _write(batches(), schema, 'movement', partition_schema, cat)
+    return rows[0]
+
+def write_upc(data_path, cat):
+    reader = _open_csv(data_path, UPC_TYPES, 1 << 20)
+    table = reader.read_all()
+    table = table.append_column('category_id', pa.array([cat] * table.num_rows, pa.string()))
+    partition_schema = pa.schema([('category_id', pa.string())])
+    _write(table.to_batches(), table.schema, 'upc', partition_schema, cat)
+    return table.num_rows
+
+def dataset(name):
+    """Open a lake dataset; local files are memory-mapped rather than read into buffers."""
+    return ds.dataset(
+        os.path.join(lake_root(), name),
+        format='parquet',
+        partitioning='hive',
+        filesystem=fs.LocalFileSystem(use_mmap=True),
+    )
+
+def scan_movement(categories=None, weeks=None, columns=None):
+    """
+    Read movement rows from the lake as an Arrow table.
+
+    categories: list of category ids, None for all
+    weeks:      (first_week, last_week) inclusive, None for all
+    columns:    list of column names, None for all
+    Only the matching category_id / week_block partitions are opened.
+    """
+    expr = None
+    if categories:
+        expr = pc.field('category_id').isin(list(categories))
+    if weeks:
+        first, last = weeks
+        week_expr = ((pc.field('week_block') >= week_block(first))
+                     & (pc.field('week_block') <= week_block(last))
+                     & (pc.field('week') >= first)
+                     & (pc.field('week') <= last))
+        expr = week_expr if expr is None else expr & week_expr
+    return dataset('movement').to_table(columns=columns, filter=expr)
+
+def write_store_scenarios(batches, schema, cat):
+    """
+    Stream store-level scenario batches (ml/simulation/store_scenarios.py)
+    into the lake, partitioned by category_id / price_zone.
+    """
+    partition_schema = pa.schema([('category_id', pa.string()), ('price_zone', pa.int32())])
+    _write(batches, schema, 'store_scenarios', partition_schema, cat)
+
+def scan_store_scenarios(categories=None, price_zones=None, stores=None, columns=None):
+    """
+    Read store-level scenarios from the lake as an Arrow table; only the
+    matching category_id / price_zone partitions are opened.
+    """
+    expr = None
+    for field, values in (('category_id', categories), ('price_zone', price_zones), ('store_id', stores)):
+        if values:
+            cond = pc.field(field).isin(list(values))
+            expr = cond if expr is None else expr & cond
+    return dataset('store_scenarios').to_table(columns=columns, filter=expr)
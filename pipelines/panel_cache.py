@@ -0,0 +1,120 @@
+import os
+import hashlib
+import pyarrow as pa
+import pyarrow.feather as feather
+from pipelines.utils import get_db_engine, table_version
+from pipelines.arrow_fetch import fetch_arrow
+
+# Every UPC (elasticity models, screens) and the top panel_top_upcs UPCs per category (everything else)
+PANEL_TABLE = 'elasticity_ready_panel'
+TOP_PANEL_TABLE = 'elasticity_ready_panel_top'
+
+# Default size cap of the on-disk cache, overridable with PIRO_PANEL_CACHE_MB
+DEFAULT_CACHE_MB = 2048
+
+def cache_dir():
+    root = os.getenv("PIRO_PANEL_CACHE_DIR")
+    if root:
+        return root
+    return "/app/data/cache/panels" if os.path.isdir("/app/data") else "data/cache/panels"
+
+def cache_limit_bytes():
+    return int(float(os.getenv("PIRO_PANEL_CACHE_MB", DEFAULT_CACHE_MB)) * (1 << 20))
+
+def cache_key(query, versions, params=None):
+    """sha256 over the query text, its bind parameters and the version stamp of every table it reads."""
+    h = hashlib.sha256(query.strip().encode())
+    for name in sorted(params or {}):
+        h.update(f"\n:{name}={params[name]!r}".encode())
+    for table in sorted(versions):
+        h.update(f"\n{table}={versions[table]}".encode())
+    return h.hexdigest()
+
+def _entries(directory):
+    entries = []
+    for name in os.listdir(directory):
+        if not name.endswith(".feather"):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+    return entries
+
+def evict(directory=None, limit_bytes=None):
+    """
+    Delete least recently used entries until the cache fits in limit_bytes.
+    A hit touches its file, so mtime order is LRU order.
+    """
+    directory = directory or cache_dir()
+    limit_bytes = cache_limit_bytes() if limit_bytes is None else limit_bytes
+    if not os.path.isdir(directory):
+        return 0
+    entries = sorted(_entries(directory))
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, path in entries:
+        if total <= limit_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+    return removed
+
+def cached_query(query, tables, engine=None, refresh=False, params=None):
+    """
+    pd.read_sql(query) with an on-disk Arrow/Feather cache. Misses are fetched
+    with arrow_fetch.fetch_arrow, so the result is typed Arrow on both paths.
+
+    tables: the tables the query reads; their table_version stamps are part of
+            the cache key, so a dbt run that changes them invalidates the entry
+    refresh: ignore an existing entry and re-query
+    params: bind parameters (psycopg2 %(name)s style), part of the cache key
+    """
+    engine = engine or get_db_engine()
+    versions = {t: table_version(engine, t) for t in tables}
+    directory = cache_dir()
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{cache_key(query, versions, params)}.feather")
+
+    if not refresh and os.path.exists(path):
+        try:
+            df = feather.read_table(path, memory_map=True).to_pandas()
+            os.utime(path)
+            print(f"Panel cache hit: {os.path.basename(path)} ({len(df)} rows).")
+            return df
+        except (OSError, pa.ArrowInvalid) as e:
+            print(f"Panel cache entry {path} unreadable ({e}), re-querying.")
+
+    table = fetch_arrow(query, engine, params)
+    # Write then rename, so concurrent readers never see a partial file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    feather.write_feather(table, tmp_path, compression='lz4')
+    os.replace(tmp_path, path)
+    print(f"Panel cache miss: cached {table.num_rows} rows as {os.path.basename(path)}.")
+    evict(directory)
+    return table.to_pandas()
+
+def load_category_panel(category_id, engine=None, refresh=False, table=PANEL_TABLE):
+    """
+    Full panel for one category: elasticity_ready_panel (every UPC) by
+    default, or TOP_PANEL_TABLE (the top panel_top_upcs UPCs by revenue) for
+    jobs whose cost grows with the number of UPCs.
+
+    Every job in the train -> simulate -> optimize -> forecast chain reads the
+    panel through this one query and derives its own frame in pandas, so the
+    chain hits Postgres once per category and panel version.
+    """
+    if table not in (PANEL_TABLE, TOP_PANEL_TABLE):
+        raise ValueError(f"Unknown panel table: {table}")
+    query = f"""
+        select * from {table}
+        where category_id = %(cat)s
+        order by store_id, upc_id, week_id
+    """
+    return cached_query(query, [table], engine=engine, refresh=refresh, params={"cat": category_id})
@@ -0,0 +1,149 @@
+import sys
+import json
+import struct
+import numpy as np
+import pandas as pd
+from multiprocessing import shared_memory, resource_tracker
+
+# Arrays start on cache-line boundaries inside the segment
+_ALIGN = 64
+_HEADER = struct.Struct("<QQ")
+
+def _aligned(offset):
+    return (offset + _ALIGN - 1) // _ALIGN * _ALIGN
+
+class SharedPanel:
+    """
+    Compact columnar (store, upc, week) panel in one shared memory segment.
+
+    Rows are sorted by (store, upc, week), so every (store, upc) series is a
+    contiguous slice given by `series_bounds`. Arrays:
+
+      store_code, upc_code, week_code  int32 dense codes, one per row
+      store_ids, upc_ids               int64 labels, indexed by code
+      week_ids                         int32 labels, indexed by week_code
+      week_start                       datetime64[ns] per week_code (if known)
+      series_bounds                    int64, series i is rows [b[i], b[i+1])
+      <measure>                        float32, one per row
+
+    Workers attach by segment name and get read-only NumPy views on the same
+    pages, so adding workers does not add copies of the panel.
+    """
+
+    def __init__(self, shm, layout, data_start, owner):
+        self._shm = shm
+        self._owner = owner
+        self.name = shm.name
+        self.measures = layout['measures']
+        self.arrays = {}
+        for key, (offset, dtype, length) in layout['arrays'].items():
+            arr = np.ndarray((length,), dtype=np.dtype(dtype), buffer=shm.buf, offset=data_start + offset)
+            if not owner:
+                arr.setflags(write=False)
+            self.arrays[key] = arr
+
+    @classmethod
+    def from_frame(cls, df, measures, store_col='store_id', upc_col='upc_id',
+                   week_col='week_id', date_col=None, name=None):
+        """Copy a panel DataFrame into a new segment. The caller owns it and must unlink()."""
+        df = df.sort_values([store_col, upc_col, week_col], kind='stable')
+        store_code, store_ids = pd.factorize(df[store_col], sort=True)
+        upc_code, upc_ids = pd.factorize(df[upc_col], sort=True)
+        week_code, week_ids = pd.factorize(df[week_col], sort=True)
+
+        # A new series starts wherever store or upc changes
+        pair = store_code.astype(np.int64) * len(upc_ids) + upc_code
+        starts = np.flatnonzero(np.diff(pair, prepend=-1)) if len(pair) else np.array([], dtype=np.int64)
+        series_bounds = np.append(starts, len(pair)).astype(np.int64)
+
+        arrays = {
+            'store_code': store_code.astype(np.int32),
+            'upc_code': upc_code.astype(np.int32),
+            'week_code': week_code.astype(np.int32),
+            'store_ids': np.asarray(store_ids, dtype=np.int64),
+            'upc_ids': np.asarray(upc_ids, dtype=np.int64),
+            'week_ids': np.asarray(week_ids, dtype=np.int32),
+            'series_bounds': series_bounds,
+        }
+        if date_col is not None:
+            week_start = (pd.to_datetime(df[date_col]).groupby(week_code).first()
+                          .reindex(range(len(week_ids))).to_numpy('datetime64[ns]'))
+            arrays['week_start'] = week_start
+        for m in measures:
+            arrays[m] = df[m].to_numpy(np.float32)
+
+        # Segment: [header length, data start][JSON layout][arrays...]; array
+        # offsets in the layout are relative to the data start
+        layout = {'measures': list(measures), 'arrays': {}}
+        offset = 0
+        for key, arr in arrays.items():
+            offset = _aligned(offset)
+            layout['arrays'][key] = (offset, arr.dtype.str, len(arr))
+            offset += arr.nbytes
+        header = json.dumps(layout).encode()
+        data_start = _aligned(_HEADER.size + len(header))
+
+        shm = shared_memory.SharedMemory(name=name, create=True, size=data_start + max(offset, 1))
+        _HEADER.pack_into(shm.buf, 0, len(header), data_start)
+        shm.buf[_HEADER.size:_HEADER.size + len(header)] = header
+
+        panel = cls(shm, layout, data_start, owner=True)
+        for key, arr in arrays.items():
+            panel.arrays[key][:] = arr
+        return panel
+
+    @classmethod
+    def attach(cls, name):
+        """Zero-copy, read-only view of a panel created by another process."""
+        if sys.version_info >= (3, 13):
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        else:
+            # Only the creator may unlink. Before 3.13 attaching registers the
+            # segment with the resource tracker (shared with the parent), so
+            # skip the registration rather than undo it afterwards.
+            register = resource_tracker.register
+            resource_tracker.register = lambda *args, **kwargs: None
+            try:
+                shm = shared_memory.SharedMemory(name=name)
+            finally:
+                resource_tracker.register = register
+        length, data_start = _HEADER.unpack_from(shm.buf, 0)
+        layout = json.loads(bytes(shm.buf[_HEADER.size:_HEADER.size + length]))
+        return cls(shm, layout, data_start, owner=False)
+
+    def __getitem__(self, key):
+        return self.arrays[key]
+
+    def __len__(self):
+        return len(self.arrays['store_code'])
+
+    @property
+    def n_series(self):
+        return len(self.arrays['series_bounds']) - 1
+
+    @property
+    def nbytes(self):
+        return self._shm.size
+
+    def series_lengths(self):
+        return np.diff(self.arrays['series_bounds'])
+
+    def series_rows(self, series):
+        """Row range [start, end) of series number `series`."""
+        b = self.arrays['series_bounds']
+        return int(b[series]), int(b[series + 1])
+
+    def close(self):
+        self.arrays = {}
+        self._shm.close()
+
+    def unlink(self):
+        if self._owner:
+            self._shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        self.unlink()
@@ -1,9 +1,22 @@
+import io
 import os
+import sys
+import struct
+import resource
 import sqlalchemy
+import numpy as np
 from sqlalchemy import create_engine
 
+# One pooled engine per (process, url, pool settings); see get_db_engine
+_ENGINES = {}
+
 def get_db_engine():
-    """Create and return a SQLAlchemy engine for the Postgres database."""
+    """
+    Return the process-wide pooled SQLAlchemy engine for the Postgres database.
+
+    Repeated calls share one engine (and its connection pool). A forked child
+    gets its own engine instead of reusing the parent's sockets.
+    """
     user = os.getenv("POSTGRES_USER", "admin")
     password = os.getenv("POSTGRES_PASSWORD", "admin")
     host = os.getenv("POSTGRES_HOST", "localhost")
@@ -11,4 +24,122 @@ def get_db_engine():
     db = os.getenv("POSTGRES_DB", "piro_db")
     
     url = f"postgresql://{user}:{password}@{host}:{port}/{db}"
-    return create_engine(url)
+    # Pool sizing can be capped per process, e.g. by the ingest orchestrator
+    pool_size = int(os.getenv("PIRO_DB_POOL_SIZE", "5"))
+    max_overflow = int(os.getenv("PIRO_DB_MAX_OVERFLOW", "10"))
+    key = (os.getpid(), url, pool_size, max_overflow)
+    engine = _ENGINES.get(key)
+    if engine is None:
+        engine = create_engine(url, pool_size=pool_size, max_overflow=max_overflow,
+                               pool_pre_ping=True)
+        _ENGINES[key] = engine
+    return engine
+
+def peak_rss_mb():
+    """Peak resident set size of the current process in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS reports bytes
+    if sys.platform == "darwin":
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+def copy_dataframe(conn, df, table_name, columns=None):
+    """
+    Bulk-append a DataFrame to an existing table with COPY FROM STDIN.
+    `conn` is a SQLAlchemy connection; the COPY joins its transaction.
+    """
+    columns = list(columns or df.columns)
+    buf = io.StringIO()
+    df[columns].to_csv(buf, index=False, header=False)
+    buf.seek(0)
+    column_list = ", ".join(f'"{c}"' for c in columns)
+    cur = conn.connection.cursor()
+    cur.copy_expert(f"COPY {table_name} ({column_list}) FROM STDIN WITH (FORMAT csv)", buf)
+    return cur.rowcount
+
+# NumPy dtype -> big-endian wire format of the matching Postgres type
+_BINARY_FORMATS = {
+    np.dtype(np.int16): '>i2',     # smallint
+    np.dtype(np.int32): '>i4',     # integer
+    np.dtype(np.int64): '>i8',     # bigint
+    np.dtype(np.float32): '>f4',   # real
+    np.dtype(np.float64): '>f8',   # double precision
+}
+
+def binary_copy_buffer(columns):
+    """
+    Postgres binary COPY payload (a uint8 array) for {column: values}.
+    Values are equal-length numeric NumPy arrays, or a str for a text column
+    that is constant across the rows. Rows are laid out as a packed
+    structured array: the constant parts (field count, lengths, text) are
+    broadcast from a one-row template, then each numeric column is written
+    big-endian in one assignment.
+    """
+    n_rows = next(len(v) for v in columns.values() if not isinstance(v, str))
+    fields = [('n_fields', '>i2')]
+    for i, values in enumerate(columns.values()):
+        if isinstance(values, str):
+            fmt = f"S{len(values.encode())}"
+        else:
+            fmt = _BINARY_FORMATS[np.asarray(values).dtype]
+        fields += [(f"len_{i}", '>i4'), (f"val_{i}", fmt)]
+    row_type = np.dtype(fields)
+
+    template = np.zeros(1, dtype=row_type)
+    template['n_fields'] = len(columns)
+    for i, values in enumerate(columns.values()):
+        encoded = values.encode() if isinstance(values, str) else None
+        template[f"len_{i}"] = len(encoded) if encoded is not None else row_type[f"val_{i}"].itemsize
+        if encoded is not None:
+            template[f"val_{i}"] = encoded
+
+    header = b"PGCOPY\n\xff\r\n\x00" + struct.pack('>ii', 0, 0)
+    payload = np.empty(len(header) + n_rows * row_type.itemsize + 2, dtype=np.uint8)
+    payload[:len(header)] = np.frombuffer(header, dtype=np.uint8)
+    payload[-2:] = np.frombuffer(struct.pack('>h', -1), dtype=np.uint8)
+    body = payload[len(header):-2]
+    body.reshape(n_rows, row_type.itemsize)[:] = template.view(np.uint8)
+    rows = body.view(row_type)
+    for i, values in enumerate(columns.values()):
+        if not isinstance(values, str):
+            rows[f"val_{i}"] = values
+    return payload
+
+def copy_binary(conn, table_name, columns):
+    """
+    copy_dataframe for large numeric outputs: COPY ... (FORMAT binary) from
+    NumPy columns (see binary_copy_buffer). Column dtypes must match the
+    table's types exactly (int64 -> bigint, float64 -> double precision).
+    """
+    buf = io.BytesIO(binary_copy_buffer(columns).data)
+    column_list = ", ".join(f'"{c}"' for c in columns)
+    cur = conn.connection.cursor()
+    cur.copy_expert(f"COPY {table_name} ({column_list}) FROM STDIN WITH (FORMAT binary)", buf)
+    return cur.rowcount
+
+def ensure_index(engine, table_name, columns, method="btree"):
+    """CREATE INDEX IF NOT EXISTS on tables written by pandas (which never indexes)."""
+    index_name = f"{table_name}_{'_'.join(columns)}_idx"
+    with engine.begin() as conn:
+        conn.execute(sqlalchemy.text(
+            f"CREATE INDEX IF NOT EXISTS {index_name} ON {table_name} USING {method} ({', '.join(columns)})"
+        ))
+
+def table_version(engine, table_name):
+    """
+    Cheap change stamp for a (possibly partitioned) table.
+
+    relfilenode changes whenever dbt rebuilds or truncates the table and the
+    insert/update/delete counters move on incremental runs, so the stamp
+    changes with the data without scanning it.
+    """
+    with engine.connect() as conn:
+        return conn.execute(sqlalchemy.text("""
+            SELECT string_agg(
+                c.oid::text || ':' || c.relfilenode::text || ':' ||
+                COALESCE(s.n_tup_ins + s.n_tup_upd + s.n_tup_del, 0)::text,
+                ',' ORDER BY c.oid)
+            FROM pg_partition_tree(CAST(:t AS regclass)) pt
+            JOIN pg_class c ON c.oid = pt.relid
+            LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+        """), {"t": table_name}).scalar()
@@ -0,0 +1,38 @@
+"""
+The collapsed likelihood must be the row-level Gaussian likelihood, exactly:
+both models' log densities agree at arbitrary parameter values.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+pm = pytest.importorskip("pymc")
+from ml.elasticity.train_model import build_model
+
+
+def synthetic_panel(n_stores=4, n_upcs=5, n_weeks=30, seed=0):
+    rng = np.random.default_rng(seed)
+    rows = [(s, 100 + u, w) for s in range(n_stores) for u in range(n_upcs) for w in range(n_weeks)]
+    df = pd.DataFrame(rows, columns=['store_id', 'upc_id', 'week_id'])
+    # Drop some store-weeks so the pairs have different counts
+    df = df[rng.random(len(df)) > 0.2].reset_index(drop=True)
+    df['log_price'] = rng.normal(0.5, 0.2, len(df))
+    df['is_promo'] = (rng.random(len(df)) < 0.15).astype(int)
+    df['log_sales'] = 2.0 - 2.0 * df['log_price'] + 0.4 * df['is_promo'] + rng.normal(0, 0.3, len(df))
+    return df
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_collapsed_logp_matches_rows(seed):
+    df = synthetic_panel(seed=seed)
+    rows_model, _, _ = build_model(df, likelihood='rows')
+    collapsed_model, _, _ = build_model(df, likelihood='collapsed')
+
+    rng = np.random.default_rng(seed)
+    point = {name: value + rng.normal(0, 0.3, np.shape(value))
+             for name, value in rows_model.initial_point().items()}
+    assert set(point) == set(collapsed_model.initial_point())
+
+    logp_rows = rows_model.compile_logp()(point)
+    logp_collapsed = collapsed_model.compile_logp()(point)
+    np.testing.assert_allclose(logp_collapsed, logp_rows, rtol=1e-9, atol=1e-6)
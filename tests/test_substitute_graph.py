@@ -0,0 +1,32 @@
+"""Every stored substitute edge passes the screen: no self-pairs, enough overlap, positive partial correlation."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from ml.elasticity.substitute_graph import build_graph
+
+
+def synthetic_panel(seed=0, n_stores=4, n_weeks=40, upcs=range(100, 106), late_upc=105, late_from=30):
+    """Random log prices / sales; late_upc only sells from week late_from, so it overlaps little with the rest."""
+    rng = np.random.default_rng(seed)
+    rows = [(s, w, u) for s in range(n_stores) for w in range(n_weeks) for u in upcs
+            if not (u == late_upc and w < late_from)]
+    df = pd.DataFrame(rows, columns=['store_id', 'week_id', 'upc_id'])
+    df['log_price'] = rng.normal(size=len(df))
+    df['log_sales'] = rng.normal(size=len(df))
+    return df
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("min_overlap,min_corr", [(26, 0.0), (50, 0.0), (50, 0.05)])
+def test_edges_pass_the_screen(seed, min_overlap, min_corr):
+    graph = build_graph(synthetic_panel(seed), k=3, min_overlap=min_overlap, min_corr=min_corr)
+    assert not (graph['upc_id'] == graph['substitute_upc_id']).any()
+    assert (graph['partial_corr'] > min_corr).all()
+    assert (graph['n_obs'] >= min_overlap).all()
+
+
+def test_ranks_are_consecutive():
+    graph = build_graph(synthetic_panel(), k=3, min_overlap=26)
+    for _, ranks in graph.groupby('upc_id')['rank']:
+        assert list(ranks) == list(range(1, len(ranks) + 1))